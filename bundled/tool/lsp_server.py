@@ -66,6 +66,11 @@ LSP_SERVER = server.LanguageServer(name="Code Xray", version="0.0", max_workers=
 TOOL_MODULE = "xray"
 TOOL_DISPLAY = "Code Xray"
 
+# Tooltips of the last annotations (looked up when the user hovers over them).
+HOVERS: Optional[xray.Hovers] = None
+# Iterations of the last annotations that have not been sent yet.
+WINDOWS: Optional[xray.Windows] = None
+
 
 @LSP_SERVER.command(f"{TOOL_MODULE}.name")
 @utils.argument_wrapper
@@ -120,15 +125,96 @@ def annotate(filepath: str, lineno: int, test: str):
 
     dirname = os.path.dirname(filepath)
     test_name = os.path.abspath(os.path.join(dirname, test))
-    xray_config = xray.TracingConfig(file=file, node=function_node, test=test_name)
+    project_config = xray.ProjectConfig.from_pyproject(filepath)
+    target = xray.Target(file=file, node=function_node, project=project_config)
+    xray_config = xray.TracingConfig(
+        targets=[target], test=test_name, timeout=project_config.timeout
+    )
 
-    reload_modules(LSP_SERVER.lsp.workspace)
-    annotations = run_xray(xray_config)
-    serialized_annotations = Serializable.serialize(annotations)
+    with xray.Stats() as stats:
+        with stats.phase("reload_modules"):
+            reload_modules(LSP_SERVER.lsp.workspace)
+        annotations = run_xray(xray_config)
+        send_annotations(annotations, stats, project_config.window_size)
+    if project_config.stats_log is not None:
+        stats.log(project_config.stats_log, function=function_name, test=test_name)
+
+
+@LSP_SERVER.command(f"{TOOL_MODULE}.replay")
+@utils.argument_wrapper
+def replay(filepath: str, lineno: int, test: str):
+    """Show the annotations from the last run of `test` again (if `filepath` has not changed)."""
+    line_number = LineNumber[0](lineno)
+
+    document = workspace.text_document.TextDocument(filepath)
+    source = document.source
+    file = xray.File(filepath, source)
+
+    function_node = xray.FunctionFinder.find_function(source, line_number)
+    dirname = os.path.dirname(filepath)
+    test_name = os.path.abspath(os.path.join(dirname, test))
+    project_config = xray.ProjectConfig.from_pyproject(filepath)
+    target = xray.Target(file=file, node=function_node, project=project_config)
+
+    with xray.Stats() as stats:
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                result, annotations, metadata = xray.replay(target, test_name)
+        except (OSError, ValueError) as e:
+            # The test has to be run again.
+            log_warning(f"Unable to replay `{test}`: {e}")
+            return False
+        send_annotations(
+            {"result": result, "annotations": annotations, "metadata": metadata},
+            stats,
+            project_config.window_size,
+        )
+    return True
+
+
+def send_annotations(
+    annotations: dict[str, Any], stats: xray.Stats, window_size: Optional[int] = None
+) -> None:
+    """
+    Serialize the annotations and send them to the editor (replacing the tooltips).
+    Only the first iterations of each block are sent (the rest are fetched with `window`).
+    """
+    global HOVERS, WINDOWS
+    windows = xray.Windows(window_size)
+    with stats.phase("serialize"), xray.Hovers() as hovers:
+        skeleton = {**annotations, "annotations": windows.skeleton(annotations["annotations"])}
+        serialized_annotations = Serializable.serialize(skeleton)
+        payload = json.dumps(serialized_annotations)
+    stats.count("payload_bytes", len(payload))
+    stats.count("hovers", len(hovers))
+    stats.count("windows", len(windows))
+    HOVERS = hovers
+    WINDOWS = windows
+    serialized_annotations["metadata"]["stats"] = stats.to_json()
     log_to_output(str(serialized_annotations))
     LSP_SERVER.lsp.send_request("workspace/inset/refresh", serialized_annotations)
 
 
+@LSP_SERVER.command(f"{TOOL_MODULE}.hover")
+@utils.argument_wrapper
+def hover(handle: str, page: int = 0):
+    """Return a page of the tooltip with this handle (from the last annotations)."""
+    if HOVERS is None:
+        raise KeyError(f"Unknown hover {handle!r} (nothing has been annotated).")
+    return HOVERS.page(handle, page)
+
+
+@LSP_SERVER.command(f"{TOOL_MODULE}.window")
+@utils.argument_wrapper
+def window(handle: str, start: int, count: Optional[int] = None):
+    """Return the next `count` iterations of a block with this handle (from the last annotations)."""
+    if WINDOWS is None:
+        raise KeyError(f"Unknown block {handle!r} (nothing has been annotated).")
+    # Add the tooltips of these iterations to the tooltips of the annotations.
+    with HOVERS:
+        return Serializable.serialize(WINDOWS.fetch(handle, start, count))
+
+
 def reload_modules(workspace: workspace.Workspace):
     """Remove any imported modules that are in the workspace."""
     # File paths of all the folders in the workspace.
@@ -153,8 +239,8 @@ def reload_modules(workspace: workspace.Workspace):
 
 def run_xray(xray_config: xray.TracingConfig):
     with contextlib.redirect_stdout(sys.stderr):
-        result, annotations = xray.annotate(xray_config)
-        return {"result": result, "annotations": annotations}
+        result, (annotations,), (metadata,) = xray.annotate(xray_config)
+        return {"result": result, "annotations": annotations, "metadata": metadata}
 
 
 # **********************************************************
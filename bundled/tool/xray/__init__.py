@@ -1,31 +1,82 @@
 import contextlib
 import os.path
 import sys
+import time
 from typing import Optional
 
-from .annotation import Annotations
-from .config import File, TracingConfig
+from .annotation import Annotations, Metadata
+from .bdb_debugger import BdbDebugger
+from .capture import CaptureRegistry
+from .config import File, ProjectConfig, Target, TracingConfig
 from .control_index import ControlIndex, ControlIndexBuilder
-from .debugger import Debugger
+from .debugger import DeadlineExceeded, Debugger, Tracer
 from .function_finder import FunctionFinder, FunctionPosition
+from .hovers import Hover, Hovers
 from .indent_index import IndentIndex, IndentIndexBuilder
 from .line_index import LineIndex, LineIndexBuilder
+from .memory import MemoryBudget
+from .monitoring_debugger import MonitoringDebugger
+from .multi_debugger import MultiDebugger, MultiMonitoringDebugger, MultiTraceDebugger
 from .observations import Observations
+from .profiler import LineProfiler
+from .saved_trace import SavedTrace
+from .snapshot import Snapshot
+from .stats import Stats
 from .test_filter import TestFilter
+from .trace_debugger import TraceDebugger
 from .utils import LineNumber, Position
+from .windows import Windows
 
 
-def annotate(config: TracingConfig) -> tuple[bool, Annotations]:
-    file = config.file
-    test_name = config.test
-    node = config.node
+def annotate(config: TracingConfig) -> tuple[bool, list[Annotations], list[Metadata]]:
+    """
+    Run the test once and annotate each target (in order).
+    The metadata includes the stats of this run (and of the surrounding `Stats` context if any).
+    """
+    with Stats.current() as stats:
+        debuggers = [
+            Debugger(target.file, target.node, target.project) for target in config.targets
+        ]
+        debugger = MultiDebugger.create(debuggers)
+        if config.timeout is not None:
+            debugger.deadline = time.monotonic() + config.timeout
+        print("Pytest logs (running tests):")
+        with contextlib.redirect_stdout(sys.stderr), stats.phase("test"):
+            result = TestFilter.run_test(debugger=debugger, test_name=config.test)
+        annotations = debugger.get_annotations()
+        with stats.phase("metadata"):
+            metadata = debugger.get_metadata()
+        for target_metadata in metadata:
+            target_metadata["stats"] = stats.to_json()
+        with stats.phase("save_traces"):
+            for target, target_annotations, target_metadata in zip(
+                config.targets, annotations, metadata
+            ):
+                if target.project.save_traces:
+                    trace = SavedTrace.create(
+                        target, config.test, result, target_annotations, target_metadata
+                    )
+                    try:
+                        trace.save(SavedTrace.path(target, config.test))
+                    except OSError as e:
+                        # The annotations are still returned.
+                        print(f"Unable to save the trace: {e}", file=sys.stderr)
+    return result, annotations, metadata
 
-    debugger = Debugger(file, node)
-    print("Pytest logs (running tests):")
-    with contextlib.redirect_stdout(sys.stderr):
-        result, annotations = TestFilter.run_test(debugger=debugger, test_name=test_name)
 
-    return result, annotations
+def replay(target: Target, test: str) -> tuple[bool, Annotations, Metadata]:
+    """
+    Rebuild the annotations of a target from the last run of the test (without running it again).
+    Raises `FileNotFoundError` if there is no saved run, `PermissionError` if it belongs to another
+    user and `ValueError` if the source has changed.
+    """
+    with Stats.current() as stats:
+        with stats.phase("load_trace"):
+            trace = SavedTrace.load(SavedTrace.path(target, test), target.file.source)
+        # Keep the stats of the run that was saved.
+        replayed = {"time": trace.time, "stats": trace.metadata.get("stats")}
+        metadata = {**trace.metadata, "replayed": replayed, "stats": stats.to_json()}
+    return trace.result, trace.annotations, metadata
 
 
 def get_function(source: str, line_number: LineNumber) -> Optional[FunctionPosition]:
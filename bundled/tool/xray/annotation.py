@@ -2,6 +2,7 @@ import copy
 from dataclasses import dataclass
 from typing import Optional, TypeAlias, Union
 
+from .hovers import Hover, Hovers
 from .utils import Serializable
 
 
@@ -10,14 +11,21 @@ class AnnotationPart(Serializable):
     """Subpart of an annotation with text and a tooltip."""
 
     text: str
-    hover: Optional[str] = None
+    hover: Optional[str | Hover] = None
 
     def to_json(self) -> dict[str, any]:
         inset_copy = copy.copy(self)
         if self.hover is None:
             del inset_copy.hover
+        elif isinstance(self.hover, Hover):
+            hovers = Hovers.current()
+            if hovers is not None:
+                # Only send a preview and a handle to lookup the full tooltip.
+                return {"text": self.text, **hovers.add(self.hover)}
+            inset_copy.hover = self.hover.to_text()
         return super(type(self), inset_copy).to_json()
 
 
 Annotation: TypeAlias = list[AnnotationPart]
 Annotations: TypeAlias = dict[str, Union["Annotations", list[Annotation]]]
+Metadata: TypeAlias = dict[str, any]
@@ -0,0 +1,30 @@
+import ast
+import bdb
+import sys
+from typing import Optional
+
+from .config import File, ProjectConfig
+from .debugger import Debugger
+
+
+class BdbDebugger(Debugger, bdb.Bdb):
+    """Debugger that traces every frame with `bdb` (reference implementation)."""
+
+    def __init__(
+        self,
+        file: File,
+        node: ast.FunctionDef,
+        config: Optional[ProjectConfig] = None,
+        skip=None,
+    ) -> None:
+        bdb.Bdb.__init__(self, skip)
+        Debugger.__init__(self, file, node, config)
+        # Initialise the bdb state.
+        bdb.Bdb.run(self, "", {})
+
+    def set_trace(self) -> None:
+        # Start tracing from the caller (not this frame).
+        bdb.Bdb.set_trace(self, sys._getframe().f_back)
+
+    def set_quit(self) -> None:
+        bdb.Bdb.set_quit(self)
@@ -0,0 +1,82 @@
+"""Compare the speed of the tracing backends (run with `python -m xray.benchmark`)."""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import os.path
+import random
+import time
+from typing import Callable, Optional, Type
+
+from . import (
+    BdbDebugger,
+    Debugger,
+    File,
+    FunctionFinder,
+    MonitoringDebugger,
+    TraceDebugger,
+)
+from .utils import LineNumber
+
+FILEPATH = os.path.join(os.path.dirname(__file__), "tests", "quicksort.py")
+# Line numbers of `sort` and a function that is never called (to measure the tracing overhead).
+TARGETS = {"sort": LineNumber[1](4), "unused_fn1": LineNumber[1](1)}
+
+
+def load_sort() -> tuple[File, Callable[[list[int]], list[int]]]:
+    """Load `sort` from `tests/quicksort.py` as a fresh module."""
+    with open(FILEPATH) as f:
+        source = f.read()
+    spec = importlib.util.spec_from_file_location("quicksort", FILEPATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return File(FILEPATH, source), module.sort
+
+
+def time_sort(
+    debugger_class: Optional[Type[Debugger]], array: list[int], line_number: LineNumber
+) -> float:
+    """Time a single call to `sort` while tracing the function on `line_number`."""
+    file, sort = load_sort()
+    node = FunctionFinder.find_function(file.source, line_number)
+    debugger = None if debugger_class is None else debugger_class(file, node)
+
+    start = time.perf_counter()
+    if debugger is not None:
+        debugger.set_trace()
+    try:
+        sort(array)
+    finally:
+        if debugger is not None:
+            debugger.set_quit()
+    if debugger is not None:
+        debugger.get_annotations()
+    return time.perf_counter() - start
+
+
+def main(args: argparse.Namespace):
+    debugger_classes: dict[str, Optional[Type[Debugger]]] = {
+        "untraced": None,
+        "bdb": BdbDebugger,
+        "settrace": TraceDebugger,
+    }
+    if MonitoringDebugger.is_available():
+        debugger_classes["sys.monitoring"] = MonitoringDebugger
+
+    generator = random.Random(args.seed)
+    array = [generator.randint(0, args.size) for _ in range(args.size)]
+
+    for target, line_number in TARGETS.items():
+        print(f"Sorting {args.size} elements tracing `{target}` (best of {args.repeat}):")
+        for name, debugger_class in debugger_classes.items():
+            best = min(time_sort(debugger_class, array, line_number) for _ in range(args.repeat))
+            print(f"{name:>16}: {best * 1000:10.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1000, help="Number of elements to sort.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repetitions.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    main(parser.parse_args())
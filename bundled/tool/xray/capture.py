@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import array
+import builtins
+import copy
+import sys
+import types
+from typing import Callable, ClassVar, Optional, Self, TypeAlias
+
+from .difference import Original, Representation
+
+Capture: TypeAlias = Callable[[any], any]
+
+# Types whose instances cannot change.
+IMMUTABLE_TYPES: frozenset[type] = frozenset(
+    {int, float, complex, bool, str, bytes, range, types.NoneType}
+)
+
+
+def is_immutable(value: any) -> bool:
+    """Check whether a value (including nested tuples and frozensets) cannot change."""
+    if type(value) in IMMUTABLE_TYPES:
+        return True
+    if type(value) in (tuple, frozenset):
+        return all(is_immutable(item) for item in value)
+    return False
+
+
+class CaptureRegistry:
+    """Lookup the strategy for capturing (copying) a value based on its type."""
+
+    @staticmethod
+    def reference(value: any) -> any:
+        """Store the value itself (for values that never change)."""
+        return value
+
+    @staticmethod
+    def shallow(value: any) -> any:
+        return copy.copy(value)
+
+    @staticmethod
+    def deep(value: any) -> any:
+        try:
+            return copy.deepcopy(value)
+        except TypeError:
+            return Original(value)
+
+    @staticmethod
+    def repr(value: any) -> any:
+        """Only store the representation of the value."""
+        return Representation(repr(value))
+
+    @classmethod
+    def immutable(cls, value: any) -> any:
+        """Avoid copying tuples and frozensets that only contain immutable values."""
+        if is_immutable(value):
+            return value
+        return cls.deep(value)
+
+    @classmethod
+    def container(cls, value: any) -> any:
+        """Shallow copy containers of immutable values."""
+        if isinstance(value, dict):
+            immutable = all(map(is_immutable, value.keys())) and all(
+                map(is_immutable, value.values())
+            )
+        else:
+            immutable = all(map(is_immutable, value))
+        if immutable:
+            return cls.shallow(value)
+        return cls.deep(value)
+
+    @classmethod
+    def ndarray(cls, value: any) -> any:
+        """Copy the buffer of a NumPy array (unless it contains objects)."""
+        if value.dtype.hasobject:
+            return cls.deep(value)
+        return value.copy()
+
+    STRATEGIES: ClassVar[tuple[str, ...]] = (
+        "reference",
+        "shallow",
+        "deep",
+        "repr",
+        "immutable",
+        "container",
+        "ndarray",
+    )
+
+    # Types from optional dependencies are named so that they are only resolved once imported.
+    DEFAULTS: ClassVar[dict[type | str, str]] = {
+        **{type_: "reference" for type_ in IMMUTABLE_TYPES},
+        tuple: "immutable",
+        frozenset: "immutable",
+        list: "container",
+        set: "container",
+        dict: "container",
+        array.array: "shallow",
+        "numpy.ndarray": "ndarray",
+    }
+
+    def __init__(self, strategies: Optional[dict[str, str]] = None):
+        if strategies is None:
+            strategies = {}
+        self._strategies: dict[type, Capture] = {}
+        # Types that are not imported yet (resolved when needed).
+        self._pending: dict[str, Capture] = {}
+        self._cache: dict[type, Capture] = {}
+        for type_, strategy in {**self.DEFAULTS, **strategies}.items():
+            self.register(type_, strategy)
+
+    def register(self, type_: type | str, strategy: str | Capture) -> Self:
+        """Use a strategy (function or name) for a type (or qualified type name) and subtypes."""
+        if isinstance(strategy, str):
+            if strategy not in self.STRATEGIES:
+                raise ValueError(
+                    f"Unknown capture strategy {strategy!r} "
+                    f"(expected one of {', '.join(self.STRATEGIES)})."
+                )
+            strategy = getattr(self, strategy)
+        if isinstance(type_, str):
+            self._pending[type_] = strategy
+        else:
+            self._strategies[type_] = strategy
+        self._cache.clear()
+        return self
+
+    def resolve(self) -> bool:
+        """Resolve pending type names from imported modules (returns whether any were found)."""
+        resolved = False
+        for type_name in list(self._pending):
+            type_ = self.lookup_type(type_name)
+            if type_ is not None:
+                self._strategies[type_] = self._pending.pop(type_name)
+                resolved = True
+        return resolved
+
+    @staticmethod
+    def lookup_type(type_name: str) -> Optional[type]:
+        """Find a type from its qualified name without importing anything."""
+        module_name, _, attributes = type_name.rpartition(".")
+        if module_name == "":
+            module_name = builtins.__name__
+        while module_name not in sys.modules:
+            # Move a trailing part of the module name to the attributes (for nested classes).
+            module_name, _, attribute = module_name.rpartition(".")
+            if module_name == "":
+                return None
+            attributes = f"{attribute}.{attributes}"
+        type_ = sys.modules[module_name]
+        for attribute in attributes.split("."):
+            type_ = getattr(type_, attribute, None)
+        if isinstance(type_, type):
+            return type_
+        return None
+
+    def lookup(self, type_: type) -> Capture:
+        """Find the strategy for a type (based on the closest registered base class)."""
+        try:
+            return self._cache[type_]
+        except KeyError:
+            ...
+        if self.resolve():
+            self._cache.clear()
+        for base in type_.__mro__:
+            if base in self._strategies:
+                strategy = self._strategies[base]
+                break
+        else:
+            strategy = self.deep
+        self._cache[type_] = strategy
+        return strategy
+
+    def capture(self, value: any) -> any:
+        """Capture a value using the strategy for its type."""
+        return self.lookup(type(value))(value)
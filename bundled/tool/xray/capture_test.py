@@ -0,0 +1,88 @@
+import array
+import copy
+
+import pytest
+
+from . import CaptureRegistry
+from .conftest import GenericClass
+from .difference import Original, Representation
+
+
+class Uncopyable:
+    def __deepcopy__(self, memo: dict) -> None:
+        raise TypeError("Cannot copy.")
+
+
+@pytest.mark.parametrize("value", [1, 1.5, "string", b"bytes", None, True, (1, ("a", None))])
+def test_capture_immutable_is_not_copied(value: any):
+    assert CaptureRegistry().capture(value) is value
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        [1, 2, 3],
+        {"a": 1},
+        {1, 2},
+        [[1], [2]],
+        {"a": [1]},
+        (1, [2]),
+        GenericClass(a=[1]),
+        array.array("i", [1, 2, 3]),
+    ],
+)
+def test_capture_mutable_is_copied(value: any):
+    captured = CaptureRegistry().capture(value)
+    assert captured == value
+    assert captured is not value
+    assert copy.deepcopy(value) == captured
+
+
+def test_capture_nested_mutable_is_deep_copied():
+    value = [[1], [2]]
+    captured = CaptureRegistry().capture(value)
+    value[0].append(3)
+    assert captured == [[1], [2]]
+
+
+def test_capture_uncopyable():
+    value = Uncopyable()
+    assert CaptureRegistry().capture(value) == Original(value)
+
+
+def test_capture_repr_from_config():
+    type_name = f"{GenericClass.__module__}.{GenericClass.__qualname__}"
+    registry = CaptureRegistry({type_name: "repr"})
+    value = GenericClass(a=1)
+    assert registry.capture(value) == Representation(repr(value))
+
+
+def test_capture_register_type():
+    registry = CaptureRegistry().register(GenericClass, "reference")
+    value = GenericClass(a=1)
+    assert registry.capture(value) is value
+
+
+def test_capture_subclass_uses_base_strategy():
+    class Subclass(GenericClass): ...
+
+    registry = CaptureRegistry().register(GenericClass, "repr")
+    assert isinstance(registry.capture(Subclass(a=1)), Representation)
+
+
+def test_capture_unknown_strategy():
+    with pytest.raises(ValueError):
+        CaptureRegistry({"builtins.list": "unknown"})
+
+
+def test_capture_unimported_type():
+    registry = CaptureRegistry({"not_a_module.Type": "repr"})
+    assert registry.capture([1]) == [1]
+
+
+def test_capture_numpy():
+    np = pytest.importorskip("numpy")
+    value = np.arange(5)
+    captured = CaptureRegistry().capture(value)
+    value[0] = 10
+    assert captured.tolist() == [0, 1, 2, 3, 4]
@@ -1,5 +1,10 @@
+from __future__ import annotations
+
 import ast
-from dataclasses import dataclass
+import os.path
+import tomllib
+from dataclasses import dataclass, field, fields
+from typing import ClassVar, Optional, Self
 
 from .utils import Config
 
@@ -11,7 +16,77 @@ class File:
 
 
 @dataclass
-class TracingConfig(Config):
+class ProjectConfig(Config):
+    """Settings from the `[tool.xray]` table of the nearest `pyproject.toml`."""
+
+    # Map from (qualified) type names to capture strategies.
+    capture: dict[str, str] = field(default_factory=dict)
+    # Size (in bytes) above which values are summarized instead of copied.
+    max_value_size: Optional[int] = None
+    # Total size (in bytes) of captured values above which old values are summarized.
+    max_memory: Optional[int] = None
+    # Number of observations kept in memory above which they are moved to a temporary file.
+    max_observations_in_memory: Optional[int] = None
+    # Time limit (in seconds) for running the test.
+    timeout: Optional[float] = None
+    # Number of iterations to show at the start and end of each loop (all are shown if unset).
+    loop_samples: Optional[int] = None
+    # Whether to time each line (shown next to the differences).
+    profile: bool = False
+    # Whether to measure the memory allocated by each line (shown next to the differences).
+    track_allocations: bool = False
+    # Maximum number of calls to record (all calls are recorded if unset).
+    max_calls: Optional[int] = None
+    # Maximum depth of (recursive) calls to record, where the outermost call has depth 0.
+    max_call_depth: Optional[int] = None
+    # Only record every nth call.
+    call_interval: Optional[int] = None
+    # File to append the stats of each run to (as JSON lines), which also enables the detailed stats.
+    stats_log: Optional[str] = None
+    # Number of iterations of each block sent to the editor at once (the rest are fetched later).
+    window_size: Optional[int] = None
+    # Whether to save the annotations of each run (so they can be shown again later).
+    save_traces: bool = False
+    # Folder for the saved traces (a folder in the user's cache directory if unset).
+    trace_directory: Optional[str] = None
+
+    # Settings that are paths (relative to the folder containing `pyproject.toml`).
+    PATHS: ClassVar[tuple[str, ...]] = ("stats_log", "trace_directory")
+
+    @classmethod
+    def from_pyproject(cls, filepath: str) -> Self:
+        """Load the settings for a file by searching the parent directories for `pyproject.toml`."""
+        directory = os.path.dirname(os.path.abspath(filepath))
+        while True:
+            pyproject = os.path.join(directory, "pyproject.toml")
+            if os.path.isfile(pyproject):
+                with open(pyproject, "rb") as f:
+                    settings = tomllib.load(f).get("tool", {}).get("xray", {})
+                keys = {attribute.name for attribute in fields(cls)}
+                settings = {key: value for key, value in settings.items() if key in keys}
+                for key in cls.PATHS:
+                    if key in settings:
+                        settings[key] = os.path.join(directory, os.path.expanduser(settings[key]))
+                return cls(**settings)
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return cls()
+            directory = parent
+
+
+@dataclass
+class Target(Config):
+    """A function to annotate."""
+
     file: File
     node: ast.FunctionDef
+    project: ProjectConfig = field(default_factory=ProjectConfig)
+
+
+@dataclass
+class TracingConfig(Config):
+    # Functions to annotate from a single run of the test.
+    targets: list[Target]
     test: str
+    # Time limit (in seconds) after which the test is aborted and partial annotations returned.
+    timeout: Optional[float] = None
@@ -0,0 +1,27 @@
+import os.path
+
+from . import ProjectConfig
+
+
+def test_project_config_from_pyproject(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(
+        '[tool.xray.capture]\n"pandas.DataFrame" = "repr"\n\n[tool.other]\nkey = 1\n'
+    )
+    os.makedirs(tmp_path / "package")
+    config = ProjectConfig.from_pyproject(str(tmp_path / "package" / "module.py"))
+    assert config.capture == {"pandas.DataFrame": "repr"}
+
+
+def test_project_config_without_table(tmp_path):
+    (tmp_path / "pyproject.toml").write_text("[tool.other]\nkey = 1\n")
+    config = ProjectConfig.from_pyproject(str(tmp_path / "module.py"))
+    assert config == ProjectConfig()
+
+
+def test_project_config_paths(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(
+        '[tool.xray]\ntrace_directory = "traces"\nstats_log = "stats.jsonl"\n'
+    )
+    config = ProjectConfig.from_pyproject(str(tmp_path / "module.py"))
+    assert config.trace_directory == str(tmp_path / "traces")
+    assert config.stats_log == str(tmp_path / "stats.jsonl")
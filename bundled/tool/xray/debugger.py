@@ -1,46 +1,168 @@
 import ast
-import bdb
-import copy
-import enum
-from typing import Union
+import dis
+import inspect
+import os.path
+import time
+from dataclasses import dataclass, field
+from typing import Callable, ClassVar, Optional, Protocol
 
-from .config import File
+from .annotation import Metadata
+from .capture import CaptureRegistry
+from .config import File, ProjectConfig
 from .control_index import ControlIndexBuilder
 from .difference import *
 from .indent_index import IndentIndex, IndentIndexBuilder
 from .line_index import LineIndex, LineIndexBuilder
+from .memory import MemoryBudget
 from .observations import Observations
+from .profiler import AllocationProfiler, LineProfiler, Profiled, Profilers
+from .snapshot import Snapshot
+from .stats import Stats
 from .utils import LineNumber, Position
+from .watchdog import Watchdog
 
+GENERATOR_AND_COROUTINE_FLAGS = (
+    inspect.CO_GENERATOR | inspect.CO_COROUTINE | inspect.CO_ASYNC_GENERATOR
+)
+# Instruction that suspends a generator or coroutine (for `yield` and `await`).
+YIELD_VALUE = dis.opmap["YIELD_VALUE"]
 
-class FrameState(enum.Enum):
-    UNINITIALIZED = enum.auto()
-    RETURNED = enum.auto()
 
+class DeadlineExceeded(BaseException):
+    """Raised inside the traced code to abort it when the time budget runs out."""
 
-class Debugger(bdb.Bdb):
-    def __init__(self, file: File, node: ast.FunctionDef, skip=None) -> None:
-        super().__init__(skip)
+    # Subclass `BaseException` so that the traced code does not catch it by accident.
+
+
+class Tracer(Protocol):
+    """
+    Tracing backend (such as `TraceDebugger`) that calls the events of a debugger.
+    Debuggers without a backend only record observations (such as those in `MultiDebugger`).
+    """
+
+    def set_trace(self) -> None:
+        """Start tracing (called before the test runs)."""
+
+    def set_quit(self) -> None:
+        """Stop tracing (called after the test runs)."""
+
+
+@dataclass
+class Call:
+    """A single invocation of the function being traced."""
+
+    id: int
+    depth: int
+    frame: "frame"
+    # Whether observations are recorded for this call (calls can be skipped by the limits).
+    recorded: bool
+    snapshot: Optional[Snapshot]
+    previous_position: Optional[Position] = None
+    locals: dict[str, any] = field(default_factory=dict)
+    # Readings of the profilers when the current line started.
+    line_start: Optional[list[any]] = None
+    # Whether an exception is leaving the frame (so a return finishes a suspended generator).
+    unwinding: bool = False
+
+
+class Debugger:
+    """Record observations of a single function (independent of the tracing backend)."""
+
+    # Number of recorded calls that are listed in the metadata.
+    MAX_LISTED_CALLS: ClassVar[int] = 100
+
+    def __init__(
+        self, file: File, node: ast.FunctionDef, config: Optional[ProjectConfig] = None
+    ) -> None:
+        if config is None:
+            config = ProjectConfig()
         # Canonicalize filename.
         self._filename = self.canonic(file.filepath)
         self._source = file.source
         self._line_number = LineNumber[1](node.lineno)
         self._end_line_number = LineNumber[1](node.end_lineno)
 
-        # Initialise differences and previous lines.
-        self.previous_position: Position
-        self.observations = Observations()
-
-        self.frame: Union[FrameState, "frame"] = FrameState.UNINITIALIZED
-
         # Build indices.
         self._line_index = self.precompute_line_index(node)
         self._indent_index = self.precompute_indent_index(file)
         self._control_index = self.precompute_control_index(node)
 
+        # Initialise observations (grouped and sampled as they are added).
+        self.observations = Observations(
+            self._control_index,
+            samples=config.loop_samples,
+            release=None if config.max_memory is None else self.release_observation,
+        )
+
+        # Initialise call limits.
+        self._max_calls = config.max_calls
+        self._max_call_depth = config.max_call_depth
+        self._call_interval = config.call_interval or 1
+        # Active invocations of the target (innermost last).
+        self._calls: list[Call] = []
+        # Number of invocations seen and recorded (and the ids and depths of the first recorded).
+        self._call_count = 0
+        self._recorded_count = 0
+        self._recorded_calls: list[tuple[int, int]] = []
+        self._active_recorded_calls = 0
+        # Calls of generators that have yielded (by frame id), which continue when they resume.
+        self._suspended_calls: dict[int, Call] = {}
+
+        # Time (from `time.monotonic`) after which tracing is aborted.
+        self.deadline: Optional[float] = None
+        self.timed_out = False
+        self._watchdog: Optional[Watchdog] = None
+
         # Initialise locals.
-        self._locals = {}
-        super().run("", self._locals)
+        self._capture = CaptureRegistry(config.capture)
+        self._budget = MemoryBudget(config.max_value_size, config.max_memory)
+        self._max_observations_in_memory = config.max_observations_in_memory
+        profilers = []
+        # Read memory first so that the other profilers do not allocate before it.
+        if config.track_allocations:
+            profilers.append(AllocationProfiler())
+        if config.profile:
+            profilers.append(LineProfiler())
+        self._profilers = Profilers(profilers) if profilers else None
+        # Count the work done (for finding regressions).
+        self._stats = Stats.current()
+        # Whether to time each copy and difference and count the bytes copied (which slows tracing).
+        self._detailed_stats = config.stats_log is not None
+
+    @staticmethod
+    def canonic(filename: str) -> str:
+        """Canonicalize a filename (in the same way as `bdb.Bdb.canonic`)."""
+        if filename.startswith("<") and filename.endswith(">"):
+            return filename
+        return os.path.normcase(os.path.abspath(filename))
+
+    def is_target_call(self, code) -> bool:
+        """Check whether the code is the function being traced (from its definition)."""
+        return (
+            code.co_filename == self._filename
+            and LineNumber[1](code.co_firstlineno) == self._line_number
+            and code.co_qualname != "<module>"
+        )
+
+    def is_target_line(self, frame) -> bool:
+        """Check whether the frame is executing a line inside the function being traced."""
+        code = frame.f_code
+        return (
+            code.co_filename == self._filename
+            and self._line_number <= LineNumber[1](frame.f_lineno) <= self._end_line_number
+            and code.co_qualname != "<module>"
+        )
+
+    def may_contain_target(self, code) -> bool:
+        """Check whether frames of this code need to be traced at all."""
+        if self.is_target_call(code):
+            return True
+        if code.co_filename != self._filename or code.co_qualname == "<module>":
+            return False
+        return any(
+            line is not None and self._line_number.one <= line <= self._end_line_number.one
+            for _, _, line in code.co_lines()
+        )
 
     def precompute_line_index(self, node: ast.FunctionDef) -> LineIndex:
         return LineIndexBuilder.build_index(node)
@@ -61,104 +183,287 @@ class Debugger(bdb.Bdb):
         line_number = self._line_index[line_number]
         return Position(line_number, indent)
 
+    @property
+    def finished(self) -> bool:
+        """Check whether no more calls will be recorded."""
+        return (
+            self._max_calls is not None
+            and self._recorded_count >= self._max_calls
+            and self._active_recorded_calls == 0
+            and not any(call.recorded for call in self._suspended_calls.values())
+        )
+
+    def check_deadline(self) -> None:
+        """Abort the traced code if the deadline has passed."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.time_out()
+            raise DeadlineExceeded("Tracing did not finish within the time limit.")
+
+    def time_out(self) -> None:
+        """Mark the observations as partial (the deadline is cleared so the code can clean up)."""
+        self.timed_out = True
+        self.deadline = None
+
+    def start_watchdog(self, interrupt: Callable[["frame"], None]) -> None:
+        """
+        Call `interrupt` (from another thread) with the frame that runs at the deadline (if any).
+        The backend makes that frame check the deadline, which also stops code that is not traced
+        (such as a loop after the target returns).
+        """
+        if self.deadline is not None:
+            self._watchdog = Watchdog(self.deadline, interrupt)
+            self._watchdog.start()
+
+    def stop_watchdog(self) -> None:
+        if self._watchdog is not None:
+            self._watchdog.stop()
+            self._watchdog = None
+
+    def current_call(self, frame) -> Optional[Call]:
+        """Find the call that is executing in this frame (if it is being recorded)."""
+        if self._calls and self._calls[-1].frame is frame and self._calls[-1].recorded:
+            return self._calls[-1]
+        return None
+
+    def should_record(self, call_id: int, depth: int) -> bool:
+        """Check whether the limits allow recording a call."""
+        return (
+            (self._max_calls is None or self._recorded_count < self._max_calls)
+            and (self._max_call_depth is None or depth <= self._max_call_depth)
+            and (call_id - 1) % self._call_interval == 0
+        )
+
+    def start_call(self, frame) -> Call:
+        """Start tracking a new invocation of the target."""
+        self._call_count += 1
+        depth = len(self._calls)
+        call = Call(
+            id=self._call_count,
+            depth=depth,
+            frame=frame,
+            recorded=self.should_record(self._call_count, depth),
+            snapshot=Snapshot(self.copy),
+        )
+        if call.recorded:
+            self._recorded_count += 1
+            if len(self._recorded_calls) < self.MAX_LISTED_CALLS:
+                self._recorded_calls.append((call.id, call.depth))
+        self.enter_call(call)
+        return call
+
+    def enter_call(self, call: Call) -> None:
+        """Make a call the innermost active call (when it starts or resumes)."""
+        self._calls.append(call)
+        if call.recorded:
+            if self._profilers is not None and self._active_recorded_calls == 0:
+                self._profilers.start()
+            self._active_recorded_calls += 1
+
+    @staticmethod
+    def is_suspended(frame, call: Call) -> bool:
+        """Check whether a frame that is returning will be resumed (after a `yield` or `await`)."""
+        return (
+            bool(frame.f_code.co_flags & GENERATOR_AND_COROUTINE_FLAGS)
+            and not call.unwinding
+            and frame.f_code.co_code[frame.f_lasti] == YIELD_VALUE
+        )
+
     def user_line(self, frame) -> None:
+        self.check_deadline()
+        now = None if self._profilers is None else self._profilers.enter()
         # Potentially enter if call is not noticed.
-        if self.frame is FrameState.UNINITIALIZED:
-            line_number = LineNumber[1](frame.f_lineno)
-            code = frame.f_code
-            if (
-                code.co_filename == self._filename
-                and self._line_number <= line_number <= self._end_line_number
-                and code.co_qualname != "<module>"
-            ):
-                # Store the frame if it matches.
-                self.frame = frame
+        if self._call_count == 0 and self.is_target_line(frame):
+            call = self.start_call(frame)
+            if call.recorded:
                 # Use the function definition as the previous position.
-                self.previous_position = Position(
+                call.previous_position = Position(
                     self._line_number, self._indent_index[self._line_number]
                 )
+                self.update_locals(call, call.previous_position)
 
-                locals = {k: self.copy(v) for k, v in frame.f_locals.items()}
-                self.annotate_difference(self.previous_position, locals, self._locals)
-                self._locals = locals
-
-        if frame is self.frame:
+        if self._calls and self._calls[-1].frame is frame:
+            # Any exception has been handled.
+            self._calls[-1].unwinding = False
+        call = self.current_call(frame)
+        if call is not None:
             # Line number is the entering line, not the exiting one.
-            locals = {k: self.copy(v) for k, v in frame.f_locals.items()}
-            self.annotate_difference(self.previous_position, locals, self._locals)
-            self._locals = locals
+            self.update_locals(call, call.previous_position, self.profile_line(call, now))
 
             # Update to the next line number.
-            self.previous_position = self.frame_position(frame)
-        return super().user_line(frame)
+            call.previous_position = self.frame_position(frame)
+        if self._profilers is not None:
+            self._profilers.exit()
+
+    def update_locals(
+        self, call: Call, position: Position, measurements: Optional[list[Observation]] = None
+    ) -> None:
+        """Record the changes to the locals of a call since they were last seen."""
+        locals = call.snapshot.update(call.frame.f_locals)
+        self._stats.count("snapshots")
+        self.annotate_difference(position, locals, call.locals, call.id, measurements)
+        call.locals = locals
+
+    def profile_line(self, call: Call, now: Optional[list[any]]) -> Optional[list[Observation]]:
+        """Record the measurements of the line that the call just finished (when profiling)."""
+        if now is None:
+            return None
+        if call.line_start is None:
+            # Start measuring from this line.
+            call.line_start = now
+            return None
+        measurements = self._profilers.record(call.previous_position, call.line_start, now)
+        call.line_start = now
+        return measurements
 
     def copy(self, v: any) -> any:
-        try:
-            return copy.deepcopy(v)
-        except TypeError:
-            return Original(v)
+        if self._detailed_stats:
+            start = time.perf_counter()
+            copy = self._budget.capture(v, self._capture.capture)
+            self._stats.add_time("copy", time.perf_counter() - start)
+            self._stats.count("copied_bytes", self._budget.estimate_size(copy))
+        else:
+            copy = self._budget.capture(v, self._capture.capture)
+        self._stats.count("copies")
+        if self._budget.excess > 0:
+            # Degrade the oldest observations to stay within budget.
+            freed = self.observations.summarize(self._budget.excess, self._budget.estimate_size)
+            self._budget.release(freed)
+        return copy
 
     def user_call(self, frame, argument_list) -> None:
-        # Code must not have been called yet (avoid recursion).
-        if self.frame is FrameState.UNINITIALIZED:
-            code = frame.f_code
-            if (
-                code.co_filename == self._filename
-                and LineNumber[1](code.co_firstlineno) == self._line_number
-                and code.co_qualname != "<module>"
-            ):
-                # Store the frame if it matches.
-                self.frame = frame
-                self.previous_position = self.frame_position(frame)
-
-                locals = {k: self.copy(v) for k, v in frame.f_locals.items()}
-                self.annotate_difference(self.previous_position, locals, self._locals)
-                self._locals = locals
-
-        return super().user_call(frame, argument_list)
-
-    def user_return(self, frame, return_value) -> None:
-        if frame is self.frame:
+        self.check_deadline()
+        if not self.is_target_call(frame.f_code):
+            return
+        now = None if self._profilers is None else self._profilers.enter()
+        call = self._suspended_calls.pop(id(frame), None)
+        if call is not None:
+            # Resuming a generator continues its call (from the line that yielded).
+            self.enter_call(call)
+            call.line_start = now
+        else:
+            call = self.start_call(frame)
+            if call.recorded:
+                call.previous_position = self.frame_position(frame)
+                call.line_start = now
+                self.update_locals(call, call.previous_position)
+        if self._profilers is not None:
+            self._profilers.exit()
+
+    def user_return(self, frame, return_value, suspended: Optional[bool] = None) -> None:
+        """
+        Finish or suspend a call.
+        Whether a generator is suspended is found from the frame unless the backend knows it.
+        """
+        self.check_deadline()
+        if not self._calls or self._calls[-1].frame is not frame:
+            return
+        now = None if self._profilers is None else self._profilers.enter()
+        call = self._calls.pop()
+        if suspended is None:
+            suspended = self.is_suspended(frame, call)
+        if suspended:
+            self._suspended_calls[id(frame)] = call
+        if call.recorded:
             position = self.frame_position(frame)
             source_lines = self._source.splitlines()
 
-            locals = {k: self.copy(v) for k, v in frame.f_locals.items()}
-            self.annotate_difference(position, locals, self._locals)
+            self.update_locals(call, position, self.profile_line(call, now))
 
             # Check if the list instruction was a return.
             if source_lines[position.line.zero][position.character :].startswith("return"):
                 observation = Return(return_value)
-                self.log_observation(observation, position)
+                self.log_observation(observation, position, call.id)
 
-            # Mark as returned.
-            self.frame = FrameState.RETURNED
-        return super().user_return(frame, return_value)
+            if not suspended:
+                # Release the frame and the copies of its locals.
+                call.frame = call.snapshot = call.locals = None
+            self._active_recorded_calls -= 1
+        if self._profilers is not None:
+            self._profilers.exit()
+            if self._active_recorded_calls == 0:
+                self._profilers.stop()
 
     def user_exception(self, frame, exc_info) -> None:
-        if frame is self.frame:
+        self.check_deadline()
+        if self._calls and self._calls[-1].frame is frame:
+            # The exception leaves the frame unless a line handles it.
+            self._calls[-1].unwinding = True
+        call = self.current_call(frame)
+        if call is not None:
+            if self._profilers is not None:
+                self._profilers.enter()
             position = self.frame_position(frame)
 
             # Find the exception value.
             exception, value, traceback = exc_info
             observation = Exception_(value)
-            self.log_observation(observation, position)
-        return super().user_exception(frame, exc_info)
+            self.log_observation(observation, position, call.id)
+            if self._profilers is not None:
+                self._profilers.exit()
 
     def annotate_difference(
         self,
         position: Position,
         new_variables: dict[str, any],
         old_variables: dict[str, any],
+        call_id: int = 1,
+        measurements: Optional[list[Observation]] = None,
     ):
         """Log the change of state in the variables."""
-        difference = Difference.dict_difference(old_variables, new_variables, collect=False).rename(
-            r"^\['([a-zA-Z0-9_]+)'\]", r"\1"
-        )
-        self.log_observation(difference, position)
+        if self._detailed_stats:
+            start = time.perf_counter()
+        difference = Difference.dict_difference(
+            old_variables, new_variables, collect=False
+        ).with_root(Name)
+        if self._detailed_stats:
+            self._stats.add_time("difference", time.perf_counter() - start)
+        if measurements is not None:
+            difference = Profiled(difference, measurements)
+        self.log_observation(difference, position, call_id)
 
-    def log_observation(self, observation: Observation, position: Position):
+    def log_observation(self, observation: Observation, position: Position, call_id: int = 1):
         """Store the observation and its position."""
-        self.observations.add(position, observation)
+        self.observations.add(position, observation, call_id)
+        if (
+            self._max_observations_in_memory is not None
+            and self.observations.in_memory >= self._max_observations_in_memory
+        ):
+            # Move the observations to disk (they are read back when building the annotations).
+            with self._stats.phase("spill"):
+                self._budget.release(self.observations.spill(self._budget.estimate_size))
+
+    def release_observation(self, observation: Observation):
+        """Return the memory of the values of a dropped observation to the budget."""
+        self._budget.release(sum(map(self._budget.estimate_size, observation.values())))
 
     def get_annotations(self):
-        return self.observations.to_annotations(self._control_index)
+        self._stats.count("observations", len(self.observations))
+        with self._stats.phase("annotations"):
+            annotations = self.observations.to_annotations()
+        Observation.clear_reprs()
+        return annotations
+
+    def get_metadata(self) -> Metadata:
+        """Information about the trace to return with the annotations."""
+        if self._profilers is not None:
+            self._profilers.stop()
+        return {
+            **({} if self._profilers is None else self._profilers.get_metadata()),
+            # Whether tracing was aborted by the time limit.
+            "partial": self.timed_out,
+            "memory": {
+                "process_peak_rss": self._budget.peak_rss(),
+                "peak_rss_increase": self._budget.peak_rss_increase(),
+                "peak_captured": self._budget.peak,
+                "summarized_values": self._budget.summarized,
+                "summarized_observations": self.observations.summarized,
+                "spilled_observations": self.observations.spilled,
+                "dropped_iterations": self.observations.dropped,
+            },
+            "calls": {
+                "count": self._call_count,
+                "recorded_count": self._recorded_count,
+                # Only the first recorded calls are listed.
+                "recorded": [{"id": id, "depth": depth} for id, depth in self._recorded_calls],
+            },
+        }
@@ -0,0 +1,186 @@
+import importlib.util
+import os.path
+import re
+import time
+from typing import Optional, Type
+
+import pytest
+
+from . import (
+    BdbDebugger,
+    DeadlineExceeded,
+    Debugger,
+    File,
+    FunctionFinder,
+    MonitoringDebugger,
+    ProjectConfig,
+    TraceDebugger,
+)
+from .utils import LineNumber
+
+
+def trace(
+    debugger_class: Type[Debugger],
+    filename: str,
+    lineno: int,
+    name: str,
+    *args,
+    config: Optional[ProjectConfig] = None,
+    timeout: Optional[float] = None,
+):
+    """Run the function defined in `filename` on line `lineno` with a debugger attached."""
+    filepath = os.path.join(os.path.dirname(__file__), filename)
+    with open(filepath) as f:
+        source = f.read()
+    node = FunctionFinder.find_function(source, LineNumber[1](lineno))
+
+    spec = importlib.util.spec_from_file_location(os.path.basename(filename)[:-3], filepath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    function = module
+    for attribute in name.split("."):
+        function = getattr(function, attribute)
+
+    debugger = debugger_class(File(filepath, source), node, config)
+    if timeout is not None:
+        debugger.deadline = time.monotonic() + timeout
+    debugger.set_trace()
+    try:
+        function(*args)
+    except (Exception, DeadlineExceeded):
+        ...
+    finally:
+        debugger.set_quit()
+    return debugger
+
+
+def normalize(debugger: Debugger) -> str:
+    """Represent the annotations without memory addresses (which differ between runs)."""
+    return re.sub(r" at 0x[0-9a-f]+", "", repr(debugger.get_annotations()))
+
+
+functions = [
+    ("tests/quicksort.py", 4, "sort", [3, 1, 4, 1, 5, 9, 2, 6]),
+    ("tests/quicksort.py", 4, "sort", []),
+    ("tests/edge_cases.py", 1, "main"),
+    ("tests/classes.py", 3, "TestClass.static", 1),
+    ("tests/classes.py", 18, "external", "x"),
+    ("tests/generators.py", 1, "run_steps", 3),
+    ("tests/generators.py", 1, "close_steps", 3),
+]
+
+
+@pytest.mark.parametrize("function", functions)
+def test_bdb_debugger_annotates(function: tuple):
+    debugger = trace(BdbDebugger, *function)
+    assert debugger.get_annotations() != {}
+
+
+@pytest.mark.skipif(not MonitoringDebugger.is_available(), reason="sys.monitoring not available")
+@pytest.mark.parametrize("function", functions)
+def test_monitoring_debugger_matches_bdb(function: tuple):
+    expected = trace(BdbDebugger, *function)
+    debugger = trace(MonitoringDebugger, *function)
+    assert normalize(debugger) == normalize(expected)
+
+
+@pytest.mark.parametrize("function", functions)
+def test_trace_debugger_matches_bdb(function: tuple):
+    expected = trace(BdbDebugger, *function)
+    debugger = trace(TraceDebugger, *function)
+    assert normalize(debugger) == normalize(expected)
+
+
+debugger_classes = [BdbDebugger, TraceDebugger]
+if MonitoringDebugger.is_available():
+    debugger_classes.append(MonitoringDebugger)
+
+
+@pytest.mark.parametrize("debugger_class", debugger_classes)
+@pytest.mark.parametrize(
+    "config,expected_calls",
+    [
+        # [3, 1, 4, 1, 5] recurses on [1, 1] and [4, 5] then [] and [5].
+        (ProjectConfig(), [(1, 0), (2, 1), (3, 2), (4, 2), (5, 1), (6, 2), (7, 2)]),
+        (ProjectConfig(max_calls=1), [(1, 0)]),
+        (ProjectConfig(max_calls=3), [(1, 0), (2, 1), (3, 2)]),
+        (ProjectConfig(max_call_depth=1), [(1, 0), (2, 1), (5, 1)]),
+        (ProjectConfig(call_interval=3), [(1, 0), (4, 2), (7, 2)]),
+        (ProjectConfig(max_call_depth=1, call_interval=2), [(1, 0), (5, 1)]),
+    ],
+)
+def test_debugger_records_recursive_calls(
+    debugger_class: Type[Debugger], config: ProjectConfig, expected_calls: list[tuple[int, int]]
+):
+    debugger = trace(
+        debugger_class, "tests/quicksort.py", 4, "sort", [3, 1, 4, 1, 5], config=config
+    )
+    calls = debugger.get_metadata()["calls"]["recorded"]
+    assert [(call["id"], call["depth"]) for call in calls] == expected_calls
+
+    annotations = debugger.get_annotations()
+    if len(expected_calls) == 1:
+        assert "block_calls" not in annotations
+    else:
+        assert list(annotations["block_calls"].keys()) == [
+            f"call_{call_id}" for call_id, _ in expected_calls
+        ]
+
+
+def test_debugger_lists_first_recorded_calls(monkeypatch):
+    monkeypatch.setattr(Debugger, "MAX_LISTED_CALLS", 2)
+    debugger = trace(TraceDebugger, "tests/quicksort.py", 4, "sort", [3, 1, 4, 1, 5])
+    calls = debugger.get_metadata()["calls"]
+    assert calls["recorded_count"] == 7
+    assert [(call["id"], call["depth"]) for call in calls["recorded"]] == [(1, 0), (2, 1)]
+
+
+@pytest.mark.skipif(not MonitoringDebugger.is_available(), reason="sys.monitoring not available")
+def test_monitoring_debugger_stops_events_when_finished():
+    lines_after_finished = []
+
+    class CountingDebugger(MonitoringDebugger):
+        def monitor_line(self, code, line_number: int) -> None:
+            if self.finished:
+                lines_after_finished.append(line_number)
+            super().monitor_line(code, line_number)
+
+    debugger = trace(
+        CountingDebugger, "tests/loops.py", 7, "call_steps", 10, config=ProjectConfig(max_calls=1)
+    )
+    assert debugger.get_metadata()["calls"]["count"] == 1
+    assert lines_after_finished == []
+
+
+@pytest.mark.parametrize("debugger_class", debugger_classes)
+@pytest.mark.parametrize("name,iterations", [("run_steps", 4), ("close_steps", 1)])
+def test_debugger_resumes_generators(debugger_class: Type[Debugger], name: str, iterations: int):
+    debugger = trace(debugger_class, "tests/generators.py", 1, name, 3)
+    # Resuming the generator continues the same call.
+    assert debugger.get_metadata()["calls"]["count"] == 1
+    annotations = debugger.get_annotations()
+    assert len(annotations["block_1"]) == iterations
+    assert ("line_5" in annotations) == (name == "run_steps")
+    # Finished generators are released.
+    assert debugger._suspended_calls == {}
+
+
+@pytest.mark.parametrize("debugger_class", debugger_classes)
+def test_debugger_stops_at_deadline(debugger_class: Type[Debugger]):
+    debugger = trace(debugger_class, "tests/loops.py", 1, "spin", timeout=0.1)
+    assert debugger.get_metadata()["partial"]
+    assert debugger.get_annotations() != {}
+
+
+@pytest.mark.parametrize("debugger_class", debugger_classes)
+@pytest.mark.parametrize("name", ["spin_after_step", "spin_calling_step"])
+def test_debugger_stops_untraced_code_at_deadline(debugger_class: Type[Debugger], name: str):
+    # The loop runs after the target returns (so no events reach the debugger).
+    debugger = trace(debugger_class, "tests/loops.py", 7, name, timeout=0.1)
+    assert debugger.get_metadata()["partial"]
+    assert "line_7" in debugger.get_annotations()
+
+
+def test_debugger_without_deadline_is_complete():
+    debugger = trace(TraceDebugger, "tests/quicksort.py", 4, "sort", [3, 1, 4])
+    assert not debugger.get_metadata()["partial"]
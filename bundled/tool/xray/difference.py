@@ -1,15 +1,70 @@
 from __future__ import annotations
 
 import itertools
-import re
+import reprlib
+import sys
 from dataclasses import dataclass
-from typing import ClassVar, Iterable, Optional, Self, TypeAlias
+from typing import Callable, ClassVar, Iterable, Iterator, Optional, Self, TypeAlias
 
 from renamable import renamable
 
 from .annotation import Annotation, AnnotationPart
+from .hovers import Hover
+from .utils import BoundedRepr
 
-History: TypeAlias = list[tuple[str, any]]
+History: TypeAlias = tuple[any, ...]  # Values of the containers (innermost first).
+
+
+@dataclass(frozen=True, slots=True)
+class Name:
+    """Segment of a path that is shown as it is (eg a variable name)."""
+
+    name: str
+
+    def __str__(self) -> str:
+        return self.name
+
+
+@dataclass(frozen=True, slots=True)
+class Key:
+    """Segment of a path that looks up a key in a dictionary."""
+
+    key: any
+
+    def __str__(self) -> str:
+        return f"[{self.key!r}]"
+
+
+@dataclass(frozen=True, slots=True)
+class Index:
+    """Segment of a path that indexes a list or array (with an index, slice or tuple of them)."""
+
+    index: int | slice | tuple[int | slice, ...]
+
+    @staticmethod
+    def format(index: int | slice) -> str:
+        if isinstance(index, slice):
+            return f"{index.start}:{index.stop}"
+        return str(index)
+
+    def __str__(self) -> str:
+        if isinstance(self.index, tuple):
+            return f"[{', '.join(map(self.format, self.index))}]"
+        return f"[{self.format(self.index)}]"
+
+
+@dataclass(frozen=True, slots=True)
+class Attribute:
+    """Segment of a path that looks up an attribute."""
+
+    name: str
+
+    def __str__(self) -> str:
+        return f".{self.name}"
+
+
+PathSegment: TypeAlias = Name | Key | Index | Attribute
+Path: TypeAlias = tuple[PathSegment, ...]
 
 
 @dataclass
@@ -27,13 +82,49 @@ class Original:
         )
 
 
+class SummaryRepr(reprlib.Repr):
+    """Bounded representation for summarizing large values."""
+
+    def __init__(self):
+        super().__init__()
+        self.maxlevel = 3
+        self.maxtuple = self.maxlist = self.maxarray = self.maxdeque = 20
+        self.maxset = self.maxfrozenset = self.maxdict = 20
+        self.maxstring = self.maxother = 200
+        self.maxlong = 100
+
+
+@dataclass
+class Representation:
+    """Marks an object that is only stored as its representation."""
+
+    text: str
+    # Distinguishes values with the same (bounded) representation.
+    fingerprint: Optional[tuple] = None
+
+    SUMMARY_REPR: ClassVar[reprlib.Repr] = SummaryRepr()
+
+    def __repr__(self) -> str:
+        return self.text
+
+    @classmethod
+    def summarize(cls, value: any) -> Representation:
+        """Store a bounded representation of the value (and its type and length)."""
+        if isinstance(value, Representation):
+            return value
+        try:
+            length = len(value)
+        except Exception:
+            length = None
+        return cls(cls.SUMMARY_REPR.repr(value), (type(value).__qualname__, length))
+
+
 class Observation:
     """Class to store observations from the debugger."""
 
     MAX_LEN: ClassVar[int] = 50  # Maximum length of represented value.
-
-    def rename(self, pattern: str, replacement: str) -> Self:
-        return self
+    TEXT_REPR: ClassVar[BoundedRepr] = BoundedRepr(MAX_LEN)
+    VALUES: ClassVar[tuple[str, ...]] = ()  # Attributes that store captured values.
 
     def __iter__(self) -> Iterable[Difference]:
         yield self
@@ -52,6 +143,26 @@ class Observation:
     def replace(self, **kwargs: any) -> Self:
         return (type(self))(**{k: kwargs.get(k, getattr(self, k)) for k in vars(self).keys()})
 
+    def values(self) -> Iterable[any]:
+        """Iterate over the captured values stored in the observation."""
+        for key in self.VALUES:
+            yield getattr(self, key)
+
+    def map_values(self, f: Callable[[any], any]) -> Self:
+        """Apply a function to all the captured values (eg to summarize them)."""
+        return self.replace(**{key: f(getattr(self, key)) for key in self.VALUES})
+
+    def with_values(self, values: Iterator[any]) -> Self:
+        """Copy with the next captured values (in the same order as `values`)."""
+        return self.map_values(lambda _: next(values))
+
+    def shape(self) -> tuple:
+        """
+        Everything but the captured values (observations with the same shape only differ in their
+        values, but shapes with unhashable attributes cannot be compared).
+        """
+        return type(self), *[v for k, v in vars(self).items() if k not in self.VALUES]
+
     def to_annotations(self) -> Iterable[Annotation]:
         """Convert to a list of annotations."""
         for observation in self:
@@ -63,6 +174,12 @@ class Observation:
         """Convert to an annotation."""
         return []
 
+    @classmethod
+    def clear_reprs(cls) -> None:
+        """Free the cached representations (after the observations are converted)."""
+        cls.TEXT_REPR.clear()
+        Hover.REPR.clear()
+
     def limit(self, name: str) -> str:
         """Restrict text to a certain length."""
         if len(name) > self.MAX_LEN:
@@ -71,38 +188,77 @@ class Observation:
 
 
 class Difference(Observation):
+    # Number of changes to a list above which the whole list is shown as edited.
+    MAX_LIST_EDITS: ClassVar[int] = 8
+
     def __init__(self, history: Optional[History] = None):
         if history is None:
-            history = []
-        self.history = history
+            history = ()
+        self.history = tuple(history)
 
     def __add__(self, other: Difference) -> Difference:
-        match self, other:
-            case NoDifference(), NoDifference():
-                return NoDifference()
-            case (NoDifference(), x) | (x, NoDifference()):
-                return x
-            case CompoundDifference(), CompoundDifference():
-                return CompoundDifference(self.differences + other.differences)
-            case (CompoundDifference(d), x) | (x, CompoundDifference(d)):
-                return CompoundDifference(d + [x])
-            case x, y:
-                return CompoundDifference([x, y])
-
-    def add_prefix(self, prefix: str, value: Optional[any] = None) -> Self:
-        return self.rename(r"^", prefix)
+        return Difference.combine([self, other])
+
+    def shape(self) -> tuple:
+        # The values of the containers are captured values (only their number is part of the shape).
+        return (
+            type(self),
+            len(self.history),
+            *[v for k, v in vars(self).items() if k != "history" and k not in self.VALUES],
+        )
+
+    @staticmethod
+    def combine(differences: Iterable[Difference]) -> Difference:
+        """Combine differences in linear time (flattening compound differences)."""
+        combined: list[Difference] = []
+        compound = False
+        for difference in differences:
+            match difference:
+                case NoDifference():
+                    continue
+                case CompoundDifference():
+                    combined.extend(difference.differences)
+                    compound = True
+                case _:
+                    combined.append(difference)
+        if compound or len(combined) > 1:
+            return CompoundDifference(combined)
+        elif combined:
+            return combined[0]
+        else:
+            return NoDifference()
+
+    def add_prefix(self, prefix: str | PathSegment, value: Optional[any] = None) -> Self:
+        """Add a segment to the start of the path (with the value of the container)."""
+        return self
+
+    def with_root(self, segment: type[Name | Attribute]) -> Self:
+        """Change the type of the first segment of the path if it is a key (eg into a variable)."""
+        return self
 
     @classmethod
     def repr(cls, obj: any) -> str:
         """Display a truncated version of the object."""
-        representation = repr(obj)
+        representation = cls.TEXT_REPR.repr(obj)
         if len(representation) > cls.MAX_LEN:
             representation = representation[: cls.MAX_LEN - 2] + ".."
         return representation
 
+    @staticmethod
+    def equal(a: any, b: any) -> bool:
+        """Check whether two objects are the same (treating errors as different)."""
+        try:
+            return bool(a is b or a == b)
+        except Exception:
+            return False
+
     @classmethod
     def difference(cls, a: any, b: any) -> Difference:
         """Calculate the difference between two objects of (almost) any type."""
+        # NumPy arrays can only exist if NumPy has been imported.
+        numpy = sys.modules.get("numpy")
+        if numpy is not None and isinstance(a, numpy.ndarray) and isinstance(b, numpy.ndarray):
+            return cls.ndarray_difference(a, b)
         try:
             # Two objects are identical.
             if a is b or a == b:
@@ -123,7 +279,7 @@ class Difference(Observation):
                 return Edit("", a, b)
             else:
                 return difference
-        elif isinstance(a, Original):
+        elif isinstance(a, (Original, Representation)):
             return Edit("", a, b)
         elif isinstance(a, dict):
             return cls.dict_difference(a, b)
@@ -131,56 +287,172 @@ class Difference(Observation):
             return cls.object_difference(a, b)
 
     @classmethod
-    def list_difference(cls, a: list[any], b: list[any]):
-        """Calculate the difference between two lists."""
-        # Return an edit distance (up to 1) or Edit.
-        if abs(len(a) - len(b)) >= 2:
+    def list_difference(cls, a: list[any], b: list[any], max_edits: Optional[int] = None):
+        """
+        Calculate the difference between two lists as index-level changes (or an Edit of the whole
+        list if there are more than `max_edits` changes).
+        Deletions are indexed by the old list and additions and edits by the new list.
+        """
+        if max_edits is None:
+            max_edits = cls.MAX_LIST_EDITS
+        # Skip the unchanged start and end of the lists.
+        prefix = 0
+        while prefix < min(len(a), len(b)) and cls.equal(a[prefix], b[prefix]):
+            prefix += 1
+        suffix = 0
+        while suffix < min(len(a), len(b)) - prefix and cls.equal(a[-suffix - 1], b[-suffix - 1]):
+            suffix += 1
+
+        # Each edit is at most one deletion and one addition.
+        changes = cls.list_changes(
+            a[prefix : len(a) - suffix], b[prefix : len(b) - suffix], 2 * max_edits
+        )
+        if changes is None:
+            return Edit("", a, b)
+
+        differences = []
+        for deletions, additions in changes:
+            # Pair up deletions and additions as edits (that may only change part of the item).
+            for i, j in zip(deletions, additions):
+                i, j = i + prefix, j + prefix
+                differences.append(cls.difference(a[i], b[j]).add_prefix(Index(j), b[j]))
+            for i in deletions[len(additions) :]:
+                differences.append(Delete((Index(i + prefix),), a[i + prefix]))
+            for j in additions[len(deletions) :]:
+                differences.append(Add((Index(j + prefix),), b[j + prefix]))
+        difference = cls.combine(differences)
+        if sum(1 for _ in difference) > max_edits:
             return Edit("", a, b)
-        # ? Not sure it needs to be this complicated.
-        # Use 1-based indexing for table.
-        difference_table = {(0, 0): NoDifference()}
-        if len(b) > 0:
-            difference_table[0, 1] = Add("[0]", b[0])
-        if len(a) > 0:
-            difference_table[1, 0] = Delete("[0]", a[0])
-
-        for i in range(1, len(a) + 1):
-            for j in range(max(i - 1, 1), min(i + 2, len(b) + 1)):
-                difference = Difference.difference(a[i - 1], b[j - 1])
-                if isinstance(difference, NoDifference):
-                    difference_table[i, j] = difference_table[i - 1, j - 1]
+        return difference
+
+    @classmethod
+    def list_changes(
+        cls, a: list[any], b: list[any], max_distance: int
+    ) -> Optional[list[tuple[list[int], list[int]]]]:
+        """
+        Find a shortest sequence of deletions from `a` and additions from `b` that turns `a` into
+        `b` (Myers' O(ND) algorithm) or None if it needs more than `max_distance` of them.
+        The changes are grouped into the indices deleted and added between unchanged items.
+        """
+        n, m = len(a), len(b)
+        # Furthest index in `a` reached on each diagonal (`x - y`) after each number of changes.
+        furthest = {1: 0}
+        history = []
+        for distance in range(max_distance + 1):
+            history.append(furthest.copy())
+            for k in range(-distance, distance + 1, 2):
+                if k == -distance or (k != distance and furthest[k - 1] < furthest[k + 1]):
+                    # Add from `b`.
+                    x = furthest[k + 1]
                 else:
-                    edition = difference_table[i - 1, j - 1] + difference.add_prefix(
-                        f"[{i-1}]", b[j - 1]
-                    )
-                    editions = [edition]
-                    if (i, j - 1) in difference_table:
-                        addition = difference_table[i, j - 1] + Add(f"[{j-1}]", b[j - 1])
-                        editions.append(addition)
-                    if (i - 1, j) in difference_table:
-                        deletion = difference_table[i - 1, j] + Delete(f"[{i-1}]", a[i - 1])
-                        editions.append(deletion)
-                    short_editions = [
-                        edit for edit in editions if not isinstance(edit, CompoundDifference)
-                    ]
-                    if len(short_editions) > 0:
-                        difference_table[i, j] = short_editions[0]
-                    else:
-                        difference_table[i, j] = editions[0]
-        if isinstance(difference_table[len(a), len(b)], CompoundDifference):
+                    # Delete from `a`.
+                    x = furthest[k - 1] + 1
+                y = x - k
+                while x < n and y < m and cls.equal(a[x], b[y]):
+                    x, y = x + 1, y + 1
+                furthest[k] = x
+                if x >= n and y >= m:
+                    return cls.backtrack_changes(history, n, m)
+        return None
+
+    @staticmethod
+    def backtrack_changes(
+        history: list[dict[int, int]], n: int, m: int
+    ) -> list[tuple[list[int], list[int]]]:
+        """Recover the changes from the furthest points reached by Myers' algorithm."""
+        changes: list[tuple[list[int], list[int]]] = []
+        deletions: list[int] = []
+        additions: list[int] = []
+        x, y = n, m
+        for distance in reversed(range(len(history))):
+            furthest = history[distance]
+            k = x - y
+            if distance == 0:
+                # Only unchanged items are left.
+                start_x = 0
+            elif k == -distance or (k != distance and furthest[k - 1] < furthest[k + 1]):
+                # Added an item of `b` (moving from diagonal `k + 1`).
+                start_x = previous_x = furthest[k + 1]
+                previous_y = previous_x - k - 1
+            else:
+                # Deleted an item of `a` (moving from diagonal `k - 1`).
+                previous_x = furthest[k - 1]
+                start_x = previous_x + 1
+                previous_y = previous_x - k + 1
+            if x > start_x and (deletions or additions):
+                # Unchanged items separate the changes.
+                changes.append((deletions[::-1], additions[::-1]))
+                deletions, additions = [], []
+            if distance == 0:
+                break
+            if start_x == previous_x:
+                additions.append(previous_y)
+            else:
+                deletions.append(previous_x)
+            x, y = previous_x, previous_y
+        if deletions or additions:
+            changes.append((deletions[::-1], additions[::-1]))
+        return changes[::-1]
+
+    @classmethod
+    def ndarray_difference(cls, a: "numpy.ndarray", b: "numpy.ndarray") -> Difference:
+        """
+        Calculate the difference between two NumPy arrays (without looping over the elements).
+        A few changed elements are shown individually, otherwise the smallest slice that contains
+        all the changes is shown (with the number of elements that changed).
+        """
+        if a is b:
+            return NoDifference()
+        numpy = sys.modules["numpy"]
+        if a.shape != b.shape or a.dtype != b.dtype:
+            differences = [
+                Edit((Attribute(attribute),), getattr(a, attribute), getattr(b, attribute))
+                for attribute in ("shape", "dtype")
+                if getattr(a, attribute) != getattr(b, attribute)
+            ]
+            return cls.combine(differences)
+        try:
+            changed = a != b
+            if a.dtype.kind in "fc":
+                # NaN is unchanged.
+                changed &= ~(numpy.isnan(a) & numpy.isnan(b))
+        except Exception:
             return Edit("", a, b)
-        else:
-            return difference_table[len(a), len(b)]
+        if getattr(changed, "shape", None) != a.shape:
+            # Elements cannot be compared.
+            return Edit("", a, b)
+        count = int(numpy.count_nonzero(changed))
+        if count == 0:
+            return NoDifference()
+        if a.ndim == 0:
+            return Edit("", a, b)
+
+        indices = numpy.argwhere(changed)
+        if count <= cls.MAX_LIST_EDITS:
+            differences = []
+            for index in map(tuple, indices.tolist()):
+                differences.append(Edit((Index(index),), a.item(index), b.item(index)))
+            return cls.combine(differences)
+
+        # Find the bounds of the changes along each axis.
+        slices = tuple(
+            slice(start, stop + 1)
+            for start, stop in zip(indices.min(axis=0).tolist(), indices.max(axis=0).tolist())
+        )
+        if all(s.stop - s.start == length for s, length in zip(slices, a.shape)):
+            return ArrayEdit("", a, b, count)
+        return ArrayEdit((Index(slices),), a[slices], b[slices], count)
 
     @classmethod
     def set_difference(cls, a: set[any], b: set[any]) -> Difference:
         """Calculate the difference between two sets."""
         left_difference = a.difference(b)
         right_difference = b.difference(a)
-        differences = [Delete(".item", x) for x in left_difference] + [
-            Add(".item", x) for x in right_difference
+        path = (Attribute("item"),)
+        differences = [Delete(path, x) for x in left_difference] + [
+            Add(path, x) for x in right_difference
         ]
-        return sum(differences, start=NoDifference())
+        return cls.combine(differences)
 
     @classmethod
     def dict_difference(
@@ -195,15 +467,14 @@ class Difference(Observation):
             key = difference.value
             match difference:
                 case Add():
-                    differences.append(Add(name=f"[{key!r}]", value=b[key]))
+                    differences.append(Add(path=(Key(key),), value=b[key]))
                 case Delete():
-                    differences.append(Delete(name=f"[{key!r}]", value=a[key]))
+                    differences.append(Delete(path=(Key(key),), value=a[key]))
 
         for key in a_keys.intersection(b_keys):
-            differences.append(
-                cls.difference(a[key], b[key]).add_prefix(f"[{key!r}]", value=b[key])
-            )
-        difference = sum(differences, start=NoDifference())
+            difference = cls.difference(a[key], b[key])
+            differences.append(difference.add_prefix(Key(key), value=b[key]))
+        difference = cls.combine(differences)
         if collect and isinstance(difference, CompoundDifference):
             return Edit("", a, b)
         return difference
@@ -219,49 +490,93 @@ class Difference(Observation):
                 return Edit("", a, b)
         if isinstance(difference, CompoundDifference):
             return Edit("", a, b)
-        return difference.rename(r"^\['([a-z0-9_]+)'\]", r".\1")
+        return difference.with_root(Attribute)
 
 
 class VariableDifference(Difference):
     """Specific difference for variables."""
 
-    name: str
+    path: Path
     value: any
 
-    def add_prefix(self, prefix: str, value: any) -> Self:
+    def __init__(self, path: str | Path = (), history: Optional[History] = None):
+        self.path = self.to_path(path)
+        super().__init__(history)
+
+    @staticmethod
+    def to_path(path: str | Path) -> Path:
+        """Convert text into a single segment path (an empty string is no path to the object)."""
+        if isinstance(path, str):
+            return (Name(path),) if path else ()
+        return tuple(path)
+
+    @property
+    def name(self) -> str:
+        """Render the path as text."""
+        return "".join(map(str, self.path))
+
+    def add_prefix(self, prefix: str | PathSegment, value: any) -> Self:
         """Store the prefix and its value in the history."""
-        self.history.append(("", value))
-        return super().add_prefix(prefix)
+        if isinstance(prefix, str):
+            prefix = Name(prefix)
+        return self.replace(path=(prefix, *self.path), history=(*self.history, value))
+
+    def with_root(self, segment: type[Name | Attribute]) -> Self:
+        match self.path:
+            case (Key(key=str(key)), *path):
+                return self.replace(path=(segment(key), *path))
+        return self
+
+    def values(self) -> Iterable[any]:
+        yield from super().values()
+        yield from self.history
 
-    def rename(self, pattern: str, replacement: str) -> Self:
-        """Rename this and all the itmes in the history."""
+    def map_values(self, f: Callable[[any], any]) -> Self:
         return self.replace(
-            name=re.sub(pattern, replacement, self.name),
-            history=[(re.sub(pattern, replacement, k), v) for k, v in self.history],
+            **{key: f(getattr(self, key)) for key in self.VALUES},
+            history=tuple(map(f, self.history)),
         )
 
-    def __hash__(self) -> int:
-        """Hash without including the history (lists are messy)."""
-        return hash(
-            (
-                type(self),
-                ((k, v) for k, v in vars(self.replace(history=None)).items()),
-            )
+    def with_values(self, values: Iterator[any]) -> Self:
+        # Copy the attributes directly (the path does not need to be converted again).
+        copy = object.__new__(type(self))
+        copy.__dict__.update(vars(self))
+        for key in self.VALUES:
+            setattr(copy, key, next(values))
+        copy.history = tuple(itertools.islice(values, len(self.history)))
+        return copy
+
+    def __eq__(self, other: object) -> bool:
+        """Compare the rendered paths (so that paths can be written as text)."""
+        if type(self) != type(other):
+            return False
+        return self.name == other.name and vars(self.replace(path=(), history=None)) == vars(
+            other.replace(path=(), history=None)
         )
 
+    def __hash__(self) -> int:
+        """Hash without including the values (which may not be hashable)."""
+        return hash((type(self), self.name))
+
+    def parts(self) -> Iterable[tuple[str, str, any]]:
+        """Iterate over the path, the last segment and the value of each container then the value."""
+        containers = reversed(self.history)
+        key = ""
+        for segment, value in zip(self.path, containers):
+            subkey = str(segment)
+            key += subkey
+            yield key, subkey, value
+        subkey = "".join(map(str, self.path[len(self.history) :]))
+        yield key + subkey, subkey, self.value
+
     def to_annotation(self) -> Annotation:
         """Convert to annotation."""
-        name_prefix = ""
-        name: Annotation = []
-        for key, value in itertools.chain(reversed(self.history), [(self.name, self.value)]):
-            assert key.startswith(name_prefix)
-            # Lookup the subkey based on the prefix.
-            subkey = key[len(name_prefix) :]
-            # Annotate each part.
-            name.append(AnnotationPart(text=subkey, hover=f"{key} = {repr(value)}"))
-            name_prefix = key
+        name: Annotation = [
+            AnnotationPart(text=subkey, hover=Hover(value, prefix=f"{key} = "))
+            for key, subkey, value in self.parts()
+        ]
         equals = AnnotationPart(" = ")
-        value = AnnotationPart(self.limit(repr(self.value)), repr(self.value))
+        value = AnnotationPart(self.limit(self.TEXT_REPR.repr(self.value)), Hover(self.value))
         return name + [equals, value]
 
 
@@ -269,7 +584,7 @@ class NoDifference(VariableDifference):
     """Record no change."""
 
     def __init__(self, history: Optional[History] = None):
-        super().__init__(history)
+        Difference.__init__(self, history)
 
     def __iter__(self) -> Iterable[Difference]:
         yield from []
@@ -277,12 +592,15 @@ class NoDifference(VariableDifference):
     def __bool__(self) -> bool:
         return False
 
-    def rename(self, pattern: str, replacement: str) -> Self:
+    def add_prefix(self, prefix: str | PathSegment, value: any) -> Self:
+        return self
+
+    def with_root(self, segment: type[Name | Attribute]) -> Self:
         return self
 
     @property
-    def name(self) -> str:
-        return ""
+    def path(self) -> Path:
+        return ()
 
     @property
     def value(self) -> any:
@@ -292,15 +610,12 @@ class NoDifference(VariableDifference):
 class Edit(VariableDifference):
     """Observe a variable changing value."""
 
-    def __init__(self, name: str, old: any, new: any, history: Optional[History] = None):
-        self.name = name
+    VALUES: ClassVar[tuple[str, ...]] = ("old", "new")
+
+    def __init__(self, path: str | Path, old: any, new: any, history: Optional[History] = None):
         self.old = old
         self.new = new
-        super().__init__(history)
-
-    @property
-    def value(self) -> any:
-        return self.new
+        super().__init__(path, history)
 
     @property
     def value(self) -> any:
@@ -310,13 +625,35 @@ class Edit(VariableDifference):
         return f"{self.name} = {self.repr(self.new)}"
 
 
+class ArrayEdit(Edit):
+    """Observe some of the elements of an array changing value."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        old: any,
+        new: any,
+        changed: int,
+        history: Optional[History] = None,
+    ):
+        # Number of elements that changed.
+        self.changed = changed
+        super().__init__(path, old, new, history)
+
+    def to_annotation(self) -> Annotation:
+        annotation = super().to_annotation()
+        annotation[-1].hover.suffix = f" ({self.changed} elements changed)"
+        return annotation
+
+
 class Add(VariableDifference):
     """Observe the introduction of a new variable."""
 
-    def __init__(self, name: str, value: any, history: Optional[History] = None):
-        self.name = name
+    VALUES: ClassVar[tuple[str, ...]] = ("value",)
+
+    def __init__(self, path: str | Path, value: any, history: Optional[History] = None):
         self.value = value
-        super().__init__(history)
+        super().__init__(path, history)
 
     def __repr__(self) -> str:
         return f"{self.name} = {self.repr(self.value)}"
@@ -325,10 +662,11 @@ class Add(VariableDifference):
 class Delete(VariableDifference):
     """Observe the deletion of a variable."""
 
-    def __init__(self, name: str, value: any, history: Optional[History] = None):
-        self.name = name
+    VALUES: ClassVar[tuple[str, ...]] = ("value",)
+
+    def __init__(self, path: str | Path, value: any, history: Optional[History] = None):
         self.value = value
-        super().__init__(history)
+        super().__init__(path, history)
 
     def __repr__(self) -> str:
         return f"del {self.name}"
@@ -337,16 +675,10 @@ class Delete(VariableDifference):
         """Convert to annotation."""
         if len(self.history) <= 1:
             return []
-        name_prefix = ""
-        name: Annotation = []
-        for key, value in itertools.chain(reversed(self.history), [(self.name, self.value)]):
-            assert key.startswith(name_prefix)
-            # Lookup the subkey based on the prefix.
-            subkey = key[len(name_prefix) :]
-            # Annotate each part.
-            name.append(AnnotationPart(text=f"~{subkey}~", hover=f"~{repr(value)}~"))
-            name_prefix = key
-        return name
+        return [
+            AnnotationPart(text=f"~{subkey}~", hover=Hover(value, prefix="~", suffix="~"))
+            for _, subkey, value in self.parts()
+        ]
 
 
 @dataclass
@@ -362,19 +694,34 @@ class CompoundDifference(Difference):
             other.differences
         )
 
-    def add_prefix(self, prefix: str, value: any) -> Self:
+    def add_prefix(self, prefix: str | PathSegment, value: any) -> Self:
         return CompoundDifference(
             [difference.add_prefix(prefix, value) for difference in self.differences]
         )
 
+    def with_root(self, segment: type[Name | Attribute]) -> Self:
+        return CompoundDifference(
+            [difference.with_root(segment) for difference in self.differences]
+        )
+
     def __iter__(self) -> Iterable[Difference]:
         yield from itertools.chain(*self.differences)
 
-    def rename(self, pattern: str, replacement: str) -> Self:
+    def values(self) -> Iterable[any]:
+        for difference in self.differences:
+            yield from difference.values()
+
+    def map_values(self, f: Callable[[any], any]) -> Self:
+        return CompoundDifference([difference.map_values(f) for difference in self.differences])
+
+    def with_values(self, values: Iterator[any]) -> Self:
         return CompoundDifference(
-            [difference.rename(pattern, replacement) for difference in self.differences]
+            [difference.with_values(values) for difference in self.differences]
         )
 
+    def shape(self) -> tuple:
+        return type(self), *(difference.shape() for difference in self.differences)
+
     def __repr__(self) -> str:
         return ", ".join(repr(difference) for difference in self.differences if repr(difference))
 
@@ -392,8 +739,9 @@ class KeywordObservation(Observation):
     def to_annotation(self) -> Annotation:
         return [
             AnnotationPart(
-                f"{self.KeywordObservation.keyword} {self.limit(repr(self.KeywordObservation.value))}",
-                f"{self.KeywordObservation.keyword} {repr(self.KeywordObservation.value)}",
+                f"{self.KeywordObservation.keyword} "
+                f"{self.limit(self.TEXT_REPR.repr(self.KeywordObservation.value))}",
+                Hover(self.KeywordObservation.value, prefix=f"{self.KeywordObservation.keyword} "),
             )
         ]
 
@@ -404,6 +752,8 @@ class Return(KeywordObservation[dict(keyword='"return"')]):
 
     value: any
 
+    VALUES: ClassVar[tuple[str, ...]] = ("value",)
+
     def __repr__(self) -> str:
         return f"return {self.repr(self.value)}"
 
@@ -1,9 +1,10 @@
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Optional, Set
 
 import pytest
 
 from .conftest import GenericClass
 from .difference import *
+from .hovers import Hover
 
 
 @pytest.mark.parametrize(
@@ -112,6 +113,40 @@ def test_difference_add(a, b, expected):
     assert a + b == expected
 
 
+@pytest.mark.parametrize(
+    "differences, expected",
+    [
+        ([], NoDifference()),
+        ([NoDifference(), NoDifference()], NoDifference()),
+        ([NoDifference(), Edit("name", "old", "new")], Edit("name", "old", "new")),
+        (
+            [
+                Add("name1", "value1"),
+                NoDifference(),
+                CompoundDifference([Edit("name2", "old2", "new2"), Delete("name3", "value3")]),
+            ],
+            CompoundDifference(
+                [
+                    Add("name1", "value1"),
+                    Edit("name2", "old2", "new2"),
+                    Delete("name3", "value3"),
+                ]
+            ),
+        ),
+    ],
+)
+def test_combine(differences: List[Difference], expected: Difference):
+    assert Difference.combine(differences) == expected
+
+
+def test_large_dict_difference():
+    a = {i: i for i in range(10_000)}
+    b = {i: -i for i in range(10_000)}
+    difference = Difference.dict_difference(a, b, collect=False)
+    assert len(difference.differences) == 9_999
+    assert all(isinstance(edit, Edit) for edit in difference.differences)
+
+
 @pytest.mark.parametrize(
     "prefix, difference, expected",
     [
@@ -132,6 +167,22 @@ def test_add_prefix(prefix: str, difference: Difference, expected: Difference):
     assert difference.add_prefix(prefix, None) == expected
 
 
+def test_path_segments():
+    difference = Difference.difference({"a": [GenericClass(x=1)]}, {"a": [GenericClass(x=2)]})
+    assert difference.path == (Key("a"), Index(0), Attribute("x"))
+    assert difference.with_root(Name).name == "a[0].x"
+    assert [part.text for part in difference.with_root(Name).to_annotation()] == [
+        "a",
+        "[0]",
+        ".x",
+        "",
+        " = ",
+        "2",
+    ]
+    assert str(Index((1, slice(2, 4)))) == "[1, 2:4]"
+    assert Edit((Index(0),), 1, 2).with_root(Name) == Edit("[0]", 1, 2)
+
+
 @pytest.mark.parametrize(
     "difference, expected",
     [
@@ -226,7 +277,6 @@ def test_non_recursive_object_difference(a: Any, b: Any, difference: Difference)
     [
         ([], [], NoDifference()),
         ([1, 2, 3], [1, 2, 3], NoDifference()),
-        ([1, 2, 3], [1, 3, 2], Edit("", [1, 2, 3], [1, 3, 2])),
         ([], [1], Add("[0]", 1)),
         ([1, 2, 3], [5, 1, 2, 3], Add("[0]", 5)),
         ([1, 2, 3], [1, 5, 2, 3], Add("[1]", 5)),
@@ -239,8 +289,6 @@ def test_non_recursive_object_difference(a: Any, b: Any, difference: Difference)
         ([1, 2, 3], [5, 2, 3], Edit("[0]", 1, 5)),
         ([1, 2, 3], [1, 5, 3], Edit("[1]", 2, 5)),
         ([1, 2, 3], [1, 2, 5], Edit("[2]", 3, 5)),
-        ([5, 2, 3], [1, 2, 5], Edit("", [5, 2, 3], [1, 2, 5])),
-        ([1, 1, 2, 3], [1, 2, 5], Edit("", [1, 1, 2, 3], [1, 2, 5])),
         ([1, 1, 1, 1], [1, 2, 1, 1], Edit("[1]", 1, 2)),
     ],
 )
@@ -248,6 +296,39 @@ def test_non_recursive_list_difference(a: Any, b: Any, difference: Difference):
     assert Difference.list_difference(a, b) == difference
 
 
+@pytest.mark.parametrize(
+    "a,b,expected",
+    [
+        ([1, 2, 3], [1, 3, 2], [Delete("[1]", 2), Add("[2]", 2)]),
+        ([5, 2, 3], [1, 2, 5], [Edit("[0]", 5, 1), Edit("[2]", 3, 5)]),
+        ([1, 1, 2, 3], [1, 2, 5], [Delete("[1]", 1), Edit("[2]", 3, 5)]),
+        ([1, 2, 3], [1, 2, 3, 4, 5], [Add("[3]", 4), Add("[4]", 5)]),
+        ([1, 2, 3, 4, 5], [3, 4, 5], [Delete("[0]", 1), Delete("[1]", 2)]),
+        ([[1, 2], 3, [4]], [[1, 5], 3, [4, 6]], [Edit("[0][1]", 2, 5), Add("[2][1]", 6)]),
+        (
+            list(range(1000)),
+            [-1] + list(range(500)) + [-2] + list(range(501, 1000)) + [-3],
+            [Add("[0]", -1), Edit("[501]", 500, -2), Add("[1001]", -3)],
+        ),
+    ],
+)
+def test_multiple_list_difference(a: List[Any], b: List[Any], expected: List[Difference]):
+    assert list(Difference.list_difference(a, b)) == expected
+
+
+@pytest.mark.parametrize(
+    "a,b,max_edits",
+    [
+        (list(range(20)), list(range(20))[::-1], None),
+        ([1, 2, 3], [4, 5, 6], 2),
+        ([1, 2, 3], [1, 2, 3, 4, 5], 1),
+        ([1, [2, 3]], [4, [5, 6]], 2),
+    ],
+)
+def test_list_difference_edit_limit(a: List[Any], b: List[Any], max_edits: Optional[int]):
+    assert Difference.list_difference(a, b, max_edits) == Edit("", a, b)
+
+
 @pytest.mark.parametrize(
     "a,b,difference",
     [
@@ -320,3 +401,68 @@ def test_recursive_differences(a: Any, b: Any, difference: Difference):
 )
 def test_bool_conversion(difference: Difference, expected: bool):
     assert bool(difference) == expected
+
+
+def test_ndarray_difference():
+    np = pytest.importorskip("numpy")
+    a = np.arange(10.0)
+    b = a.copy()
+    assert Difference.difference(a, b) == NoDifference()
+    a[4] = b[4] = np.nan
+    assert Difference.difference(a, b) == NoDifference()
+    b[3] = -1
+    b[7] = -2
+    assert list(Difference.difference(a, b)) == [Edit("[3]", 3.0, -1.0), Edit("[7]", 7.0, -2.0)]
+
+    a = np.zeros((100, 100))
+    b = a.copy()
+    b[10:20, 30:35] = 1
+    difference = Difference.difference(a, b)
+    assert isinstance(difference, ArrayEdit)
+    assert difference.name == "[10:20, 30:35]"
+    assert difference.changed == 50
+    assert difference.new.tolist() == np.ones((10, 5)).tolist()
+
+    difference = Difference.difference(a, np.ones((100, 100)))
+    assert difference.name == ""
+    assert difference.changed == 10_000
+
+
+def test_ndarray_shape_and_dtype_difference():
+    np = pytest.importorskip("numpy")
+    assert Difference.difference(np.zeros(3), np.zeros(4)) == Edit(".shape", (3,), (4,))
+    assert list(Difference.difference(np.zeros(3), np.zeros(4, dtype=int))) == [
+        Edit(".shape", (3,), (4,)),
+        Edit(".dtype", np.dtype(float), np.dtype(int)),
+    ]
+
+
+def test_hover_is_bounded():
+    value = list(range(1_000_000))
+    [*_, part] = Add("x", value).to_annotation()
+    hover = str(part.hover)
+    assert len(part.text) <= Observation.MAX_LEN
+    assert len(hover) <= Hover.MAX_LEN
+    assert repr(value).startswith(hover[:-3])
+
+
+@pytest.mark.parametrize(
+    "observation",
+    [
+        NoDifference(),
+        Edit("name", "old", "new"),
+        ArrayEdit("name", [1, 2], [1, 3], 1),
+        Add("name", [1], history=([[1]],)).add_prefix(Index(0), [[[1]]]),
+        CompoundDifference([Edit("name1", 1, 2), Delete("name2", 3)]),
+        Return(4),
+    ],
+)
+def test_observation_shape(observation: Observation):
+    values = list(observation.values())
+    template = observation.map_values(lambda _: None)
+    assert template.shape() == observation.shape()
+    hash(observation.shape())
+    copy = template.with_values(iter(values))
+    assert copy == observation
+    assert list(copy.values()) == values
+    assert list(template.values()) == [None] * len(values)
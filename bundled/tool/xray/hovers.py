@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import contextvars
+import itertools
+from dataclasses import dataclass
+from typing import ClassVar, Optional, Self
+
+from .utils import BoundedRepr
+
+
+@dataclass
+class Hover:
+    """Tooltip for a captured value (only represented when it is shown)."""
+
+    value: any
+    prefix: str = ""
+    suffix: str = ""
+
+    MAX_LEN: ClassVar[int] = 2_000  # Maximum length of the represented value.
+    REPR: ClassVar[BoundedRepr] = BoundedRepr(MAX_LEN)
+
+    def to_text(self, bounded_repr: Optional[BoundedRepr] = None) -> str:
+        """Represent the value (with at most `bounded_repr.max_length` characters)."""
+        if bounded_repr is None:
+            bounded_repr = self.REPR
+        representation = bounded_repr.repr(self.value)
+        if len(representation) > bounded_repr.max_length:
+            representation = representation[: bounded_repr.max_length - 3] + "..."
+        return f"{self.prefix}{representation}{self.suffix}"
+
+    def __str__(self) -> str:
+        return self.to_text()
+
+
+class Hovers:
+    """
+    Tooltips of the last annotations, which are sent as a short preview and a handle.
+    The full tooltip is only represented (a page at a time) when the user hovers over it.
+    """
+
+    PREVIEW_LEN: ClassVar[int] = 50  # Maximum length of the preview.
+    MAX_LEN: ClassVar[int] = 100_000  # Maximum length of the full tooltip.
+    PAGE_SIZE: ClassVar[int] = 2_000
+
+    _current: ClassVar[contextvars.ContextVar[Optional[Hovers]]] = contextvars.ContextVar(
+        "hovers", default=None
+    )
+    # Distinguishes handles from different annotations.
+    _generations: ClassVar[itertools.count] = itertools.count()
+
+    def __init__(self):
+        self._generation = next(self._generations)
+        self._hovers: list[Hover] = []
+        self._preview_repr = BoundedRepr(self.PREVIEW_LEN)
+        self._repr = BoundedRepr(self.MAX_LEN)
+        self._tokens: list[contextvars.Token] = []
+
+    @classmethod
+    def current(cls) -> Optional[Hovers]:
+        """The tooltips being collected (if any)."""
+        return cls._current.get()
+
+    def __enter__(self) -> Self:
+        """Store the tooltips that are serialized in this context (and thread)."""
+        self._tokens.append(self._current.set(self))
+        return self
+
+    def __exit__(self, *exc_info: any) -> None:
+        self._current.reset(self._tokens.pop())
+
+    def __len__(self) -> int:
+        return len(self._hovers)
+
+    def add(self, hover: Hover) -> dict[str, str]:
+        """Store a tooltip and return its preview and handle."""
+        handle = f"{self._generation}:{len(self._hovers)}"
+        self._hovers.append(hover)
+        return {"hover": hover.to_text(self._preview_repr), "handle": handle}
+
+    def page(self, handle: str, page: int = 0) -> dict[str, any]:
+        """Represent a page of the tooltip with this handle."""
+        generation, _, index = handle.partition(":")
+        try:
+            if int(generation) != self._generation:
+                raise ValueError()
+            hover = self._hovers[int(index)]
+        except (ValueError, IndexError):
+            raise KeyError(f"Unknown hover {handle!r} (the annotations may have been replaced).")
+        text = hover.to_text(self._repr)
+        pages = max((len(text) + self.PAGE_SIZE - 1) // self.PAGE_SIZE, 1)
+        if not 0 <= page < pages:
+            raise ValueError(f"Page {page} does not exist (there are {pages} pages).")
+        return {
+            "text": text[page * self.PAGE_SIZE : (page + 1) * self.PAGE_SIZE],
+            "page": page,
+            "pages": pages,
+        }
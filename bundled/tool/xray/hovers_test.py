@@ -0,0 +1,63 @@
+import pytest
+
+from .annotation import AnnotationPart
+from .hovers import Hover, Hovers
+from .utils import Serializable
+
+
+def test_hover_text():
+    assert Hover([1, 2, 3], prefix="x = ", suffix="!").to_text() == "x = [1, 2, 3]!"
+    value = list(range(1_000_000))
+    text = str(Hover(value))
+    assert len(text) == Hover.MAX_LEN
+    assert text.endswith("...")
+
+
+def test_serialize_without_hovers():
+    part = AnnotationPart("x", Hover([1, 2], prefix="x = "))
+    assert Serializable.serialize(part) == {"text": "x", "hover": "x = [1, 2]"}
+
+
+def test_serialize_with_hovers():
+    value = list(range(100_000))
+    parts = {
+        "name": AnnotationPart("x", Hover(value, prefix="x = ")),
+        "equals": AnnotationPart(" = "),
+    }
+    with Hovers() as hovers:
+        serialized = Serializable.serialize(parts)
+    assert Hovers.current() is None
+    assert len(hovers) == 1
+
+    part, equals = serialized["name"], serialized["equals"]
+    assert equals == {"text": " = "}
+    assert len(part["hover"]) == len("x = ") + Hovers.PREVIEW_LEN
+    assert part["hover"].startswith("x = [0, 1, 2")
+
+    text = "x = " + repr(value)
+    first_page = hovers.page(part["handle"])
+    assert first_page["text"] == text[: Hovers.PAGE_SIZE]
+    assert first_page["pages"] == Hovers.MAX_LEN // Hovers.PAGE_SIZE + 1
+    second_page = hovers.page(part["handle"], page=1)
+    assert second_page["text"] == text[Hovers.PAGE_SIZE : 2 * Hovers.PAGE_SIZE]
+    assert second_page["page"] == 1
+
+    with pytest.raises(ValueError):
+        hovers.page(part["handle"], page=first_page["pages"])
+
+
+@pytest.mark.parametrize("handle", ["", "x", "0", "0:0:0"])
+def test_unknown_handles(handle: str):
+    hovers = Hovers()
+    with pytest.raises(KeyError):
+        hovers.page(handle)
+
+
+def test_stale_handles():
+    with Hovers() as old_hovers:
+        handle = old_hovers.add(Hover(1))["handle"]
+    new_hovers = Hovers()
+    new_hovers.add(Hover(2))
+    assert old_hovers.page(handle)["text"] == "1"
+    with pytest.raises(KeyError):
+        new_hovers.page(handle)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import itertools
+import sys
+from typing import ClassVar, Optional
+
+from .capture import Capture
+from .difference import Representation
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+
+class MemoryBudget:
+    """Track (and limit) the estimated memory used by captured values."""
+
+    SAMPLES: ClassVar[int] = 8  # Number of items to sample when estimating the size of a container.
+
+    def __init__(self, max_value_size: Optional[int] = None, max_memory: Optional[int] = None):
+        self.max_value_size = max_value_size
+        self.max_memory = max_memory
+        self.used = 0
+        self.peak = 0
+        self.summarized = 0
+        # Peak resident set size of the process before any values were captured.
+        self._start_peak_rss = self.peak_rss()
+
+    def capture(self, value: any, capture: Capture) -> any:
+        """Capture a value (or a summary if it is too large) and record its size."""
+        if self.max_value_size is None and self.max_memory is None:
+            return capture(value)
+        size = self.estimate_size(value)
+        if self.max_value_size is not None and size > self.max_value_size:
+            self.summarized += 1
+            return Representation.summarize(value)
+        self.used += size
+        self.peak = max(self.peak, self.used)
+        return capture(value)
+
+    @property
+    def excess(self) -> int:
+        """Number of bytes over the total limit."""
+        if self.max_memory is None:
+            return 0
+        return max(self.used - self.max_memory, 0)
+
+    def release(self, size: int):
+        """Record that captured values have been freed."""
+        self.used = max(self.used - size, 0)
+
+    @classmethod
+    def estimate_size(cls, value: any, depth: int = 2) -> int:
+        """Estimate the deep size of a value in bytes (by sampling the items of containers)."""
+        try:
+            size = sys.getsizeof(value)
+        except TypeError:
+            return 0
+        nbytes = getattr(value, "nbytes", None)
+        if isinstance(nbytes, int):
+            # NumPy arrays and memoryviews know the size of their buffer.
+            return max(size, nbytes)
+        if depth == 0 or isinstance(value, (str, bytes, bytearray)):
+            return size
+        if isinstance(value, dict):
+            items = itertools.chain.from_iterable(itertools.islice(value.items(), cls.SAMPLES))
+            length = 2 * len(value)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            items = itertools.islice(value, cls.SAMPLES)
+            length = len(value)
+        else:
+            try:
+                return size + cls.estimate_size(vars(value), depth - 1)
+            except TypeError:
+                return size
+        sizes = [cls.estimate_size(item, depth - 1) for item in items]
+        if len(sizes) == 0:
+            return size
+        return size + sum(sizes) * length // len(sizes)
+
+    @staticmethod
+    def peak_rss() -> Optional[int]:
+        """Peak resident set size of this process (since it started) in bytes (if available)."""
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes but macOS reports bytes.
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    def peak_rss_increase(self) -> Optional[int]:
+        """
+        Bytes by which the peak resident set size of the process grew since the budget was created
+        (0 if the run used less memory than the process had already used at some point).
+        """
+        peak = self.peak_rss()
+        if peak is None or self._start_peak_rss is None:
+            return None
+        return peak - self._start_peak_rss
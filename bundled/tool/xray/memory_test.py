@@ -0,0 +1,126 @@
+import copy
+import sys
+
+import pytest
+
+from . import MemoryBudget, Observations, ProjectConfig, TraceDebugger
+from .control_index import ControlNode
+from .debugger_test import trace
+from .difference import Add, CompoundDifference, Edit, Representation, Return
+from .observations_test import timeline
+from .utils import LineNumber, Position
+
+
+@pytest.mark.parametrize(
+    "value,minimum",
+    [
+        (1, sys.getsizeof(1)),
+        ("a" * 1000, 1000),
+        (list(range(1000)), 1000 * sys.getsizeof(1000)),
+        ({i: str(i) for i in range(1000)}, 1000 * sys.getsizeof(1000)),
+        ([[0] * 100] * 100, 100 * 100 * 8),
+    ],
+)
+def test_estimate_size(value: any, minimum: int):
+    assert MemoryBudget.estimate_size(value) >= minimum
+
+
+def test_budget_summarizes_large_values():
+    budget = MemoryBudget(max_value_size=1000)
+    small = [1, 2, 3]
+    large = list(range(1000))
+    assert budget.capture(small, copy.deepcopy) == small
+    summary = budget.capture(large, copy.deepcopy)
+    assert isinstance(summary, Representation)
+    assert summary.fingerprint == ("list", 1000)
+    assert len(repr(summary)) < 200
+    assert budget.summarized == 1
+
+
+def test_budget_excess():
+    budget = MemoryBudget(max_memory=1000)
+    budget.capture("a" * 600, copy.deepcopy)
+    assert budget.excess == 0
+    budget.capture("b" * 600, copy.deepcopy)
+    assert budget.excess > 0
+    budget.release(budget.used)
+    assert budget.excess == 0
+
+
+def test_observations_summarize_oldest_first():
+    position = Position(LineNumber[1](1), 0)
+    observations = Observations({position.line: ControlNode(None, position.line)})
+    observations.add(position, Add("x", list(range(100))))
+    observations.add(position, CompoundDifference([Edit("y", [1], [1, 2]), Add("z", "z" * 100)]))
+    observations.add(position, Return(list(range(100))))
+
+    freed = observations.summarize(1, MemoryBudget.estimate_size)
+    assert freed > 0
+    assert observations.summarized == 1
+    values = [list(observation.values()) for _, _, observation in timeline(observations)]
+    assert all(isinstance(value, Representation) for value in values[0])
+    assert not any(isinstance(value, Representation) for value in values[1] + values[2])
+
+    observations.summarize(sys.maxsize, MemoryBudget.estimate_size)
+    assert observations.summarized == 3
+
+
+def test_debugger_memory_budget():
+    debugger = trace(
+        TraceDebugger,
+        "tests/quicksort.py",
+        4,
+        "sort",
+        [3, 1, 4, 1, 5, 9, 2, 6],
+        config=ProjectConfig(max_memory=1),
+    )
+    assert debugger.get_annotations() != {}
+    assert debugger.get_metadata()["memory"]["summarized_observations"] > 0
+
+
+def test_observations_spill_to_disk():
+    position = Position(LineNumber[1](1), 0)
+    observations = Observations({position.line: ControlNode(None, position.line)})
+    observations.add(position, Add("x", list(range(100))))
+    observations.summarize(1, MemoryBudget.estimate_size)
+    observations.add(position, Edit("y", [1], [1, 2]))
+    expected = timeline(observations)
+
+    freed = observations.spill(MemoryBudget.estimate_size)
+    assert freed > 0
+    assert (observations.spilled, observations.in_memory, len(observations)) == (2, 0, 2)
+    observations.add(position, Return(list(range(100))))
+    observations.summarize(sys.maxsize, MemoryBudget.estimate_size)
+    assert observations.summarized == 2
+    assert timeline(observations)[:2] == expected
+
+
+@pytest.mark.parametrize("max_observations_in_memory", [1, 5])
+def test_debugger_spill_to_disk(max_observations_in_memory):
+    args = ("tests/quicksort.py", 4, "sort", [3, 1, 4, 1, 5, 9, 2, 6])
+    expected = trace(TraceDebugger, *args).get_annotations()
+    debugger = trace(
+        TraceDebugger,
+        *args,
+        config=ProjectConfig(max_observations_in_memory=max_observations_in_memory),
+    )
+    assert debugger.get_annotations() == expected
+    assert debugger.get_metadata()["memory"]["spilled_observations"] > 0
+
+
+def test_debugger_drops_sampled_iterations():
+    args = ("tests/quicksort.py", 4, "sort", list(range(30, 0, -1)))
+    unsampled = trace(TraceDebugger, *args, config=ProjectConfig(max_memory=10**9))
+    sampled = trace(TraceDebugger, *args, config=ProjectConfig(max_memory=10**9, loop_samples=1))
+    assert sampled.get_metadata()["memory"]["dropped_iterations"] > 0
+    # The values of the dropped iterations are released from the budget while tracing.
+    assert sampled._budget.used < unsampled._budget.used
+
+
+def test_budget_peak_rss_increase():
+    budget = MemoryBudget()
+    if budget.peak_rss() is None:
+        pytest.skip("resource is not available")
+    # The peak of the process includes everything before the budget (and can only grow).
+    assert budget.peak_rss() > 0
+    assert 0 <= budget.peak_rss_increase() <= budget.peak_rss()
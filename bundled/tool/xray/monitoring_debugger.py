@@ -0,0 +1,125 @@
+import sys
+from typing import Callable, ClassVar, Optional
+
+from .debugger import Debugger
+
+
+class MonitoringDebugger(Debugger):
+    """Debugger that uses `sys.monitoring` (PEP 669) to only trace the target function."""
+
+    TOOL_NAME: ClassVar[str] = "xray"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """Check whether `sys.monitoring` exists and the debugger tool id is free."""
+        return (
+            hasattr(sys, "monitoring")
+            and sys.monitoring.get_tool(sys.monitoring.DEBUGGER_ID) is None
+        )
+
+    def callbacks(self) -> dict[int, Callable]:
+        events = sys.monitoring.events
+        return {
+            events.PY_START: self.monitor_start,
+            events.PY_RESUME: self.monitor_resume,
+            events.PY_THROW: self.monitor_throw,
+            events.LINE: self.monitor_line,
+            events.PY_RETURN: self.monitor_return,
+            events.PY_YIELD: self.monitor_yield,
+            events.PY_UNWIND: self.monitor_unwind,
+            events.RAISE: self.monitor_raise,
+        }
+
+    def set_trace(self) -> None:
+        monitoring = sys.monitoring
+        events = monitoring.events
+        self._tool_id = monitoring.DEBUGGER_ID
+        # Code objects with local events enabled (keyed by id as code equality ignores filenames).
+        self._traced_code: dict[int, "code"] = {}
+        # Code objects of the frames that were running at the deadline (with line events enabled).
+        self._interrupted_code: dict[int, "code"] = {}
+        monitoring.use_tool_id(self._tool_id, self.TOOL_NAME)
+        # Re-enable any locations that were disabled by a previous run.
+        monitoring.restart_events()
+        for event, callback in self.callbacks().items():
+            monitoring.register_callback(self._tool_id, event, callback)
+        # Unwinding, raising and throwing cannot be enabled per code object.
+        monitoring.set_events(
+            self._tool_id, events.PY_START | events.PY_UNWIND | events.RAISE | events.PY_THROW
+        )
+        self.start_watchdog(self.interrupt)
+
+    def set_quit(self) -> None:
+        monitoring = sys.monitoring
+        events = monitoring.events
+        monitoring.set_events(self._tool_id, events.NO_EVENTS)
+        self.stop_local_events()
+        for event in self.callbacks():
+            monitoring.register_callback(self._tool_id, event, None)
+        monitoring.free_tool_id(self._tool_id)
+        self.stop_watchdog()
+
+    def stop_local_events(self) -> None:
+        """Disable the events of the code objects that were traced."""
+        for code in (*self._traced_code.values(), *self._interrupted_code.values()):
+            sys.monitoring.set_local_events(self._tool_id, code, sys.monitoring.events.NO_EVENTS)
+        self._traced_code.clear()
+        self._interrupted_code.clear()
+
+    def interrupt(self, frame) -> None:
+        """Monitor the lines of the running frames (called by the watchdog at the deadline)."""
+        monitoring = sys.monitoring
+        while frame is not None:
+            code = frame.f_code
+            events = monitoring.get_local_events(self._tool_id, code) | monitoring.events.LINE
+            monitoring.set_local_events(self._tool_id, code, events)
+            self._interrupted_code[id(code)] = code
+            frame = frame.f_back
+
+    def monitor_start(self, code, instruction_offset: int) -> Optional[object]:
+        if self.finished:
+            # All calls have been recorded so no code is relevant.
+            return sys.monitoring.DISABLE
+        if id(code) not in self._traced_code:
+            if not self.may_contain_target(code):
+                # Never hear from this code again.
+                return sys.monitoring.DISABLE
+            events = sys.monitoring.events
+            sys.monitoring.set_local_events(
+                self._tool_id,
+                code,
+                events.LINE | events.PY_RETURN | events.PY_YIELD | events.PY_RESUME,
+            )
+            self._traced_code[id(code)] = code
+        self.user_call(sys._getframe(1), None)
+
+    def monitor_resume(self, code, instruction_offset: int) -> None:
+        self.user_call(sys._getframe(1), None)
+
+    def monitor_throw(self, code, instruction_offset: int, exception: BaseException) -> None:
+        if id(code) in self._traced_code:
+            # Throwing into a generator (eg closing it) resumes it.
+            self.user_call(sys._getframe(1), None)
+
+    def monitor_line(self, code, line_number: int) -> None:
+        self.user_line(sys._getframe(1))
+
+    def monitor_return(self, code, instruction_offset: int, return_value: any) -> None:
+        self.user_return(sys._getframe(1), return_value, suspended=False)
+        if self.finished:
+            self.stop_local_events()
+
+    def monitor_yield(self, code, instruction_offset: int, value: any) -> None:
+        self.user_return(sys._getframe(1), value, suspended=True)
+
+    def monitor_unwind(self, code, instruction_offset: int, exception: BaseException) -> None:
+        if id(code) in self._traced_code:
+            # Unwinding returns `None` (like the "return" event from `sys.settrace`).
+            self.user_return(sys._getframe(1), None, suspended=False)
+            if self.finished:
+                self.stop_local_events()
+
+    def monitor_raise(self, code, instruction_offset: int, exception: BaseException) -> None:
+        if id(code) in self._traced_code:
+            exc_info = (type(exception), exception, exception.__traceback__)
+            self.user_exception(sys._getframe(1), exc_info)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from typing import Optional, Type
+
+from .annotation import Annotations, Metadata
+from .debugger import DeadlineExceeded, Debugger
+from .monitoring_debugger import MonitoringDebugger
+from .trace_debugger import TraceDebugger
+from .watchdog import Watchdog
+
+
+class MultiDebugger:
+    """
+    Record observations of several functions in one run by sharing a tracing backend.
+    Each function is recorded by its own debugger and every event is passed to all of them.
+    Combine with a backend to use (eg `MultiTraceDebugger`).
+    """
+
+    def __init__(self, debuggers: list[Debugger]) -> None:
+        self.debuggers = debuggers
+        # Started by the backend (`Debugger.start_watchdog`) for the shared deadline.
+        self._watchdog: Optional[Watchdog] = None
+
+    @property
+    def deadline(self) -> Optional[float]:
+        return self.debuggers[0].deadline if self.debuggers else None
+
+    @deadline.setter
+    def deadline(self, deadline: Optional[float]) -> None:
+        for debugger in self.debuggers:
+            debugger.deadline = deadline
+
+    def check_deadline(self) -> None:
+        try:
+            for debugger in self.debuggers:
+                debugger.check_deadline()
+        except DeadlineExceeded:
+            self.time_out()
+            raise
+
+    def time_out(self) -> None:
+        # Every function is only partially recorded.
+        for debugger in self.debuggers:
+            debugger.time_out()
+
+    def may_contain_target(self, code) -> bool:
+        return any(debugger.may_contain_target(code) for debugger in self.debuggers)
+
+    @property
+    def finished(self) -> bool:
+        return all(debugger.finished for debugger in self.debuggers)
+
+    def user_call(self, frame, argument_list) -> None:
+        self.check_deadline()
+        for debugger in self.debuggers:
+            debugger.user_call(frame, argument_list)
+
+    def user_line(self, frame) -> None:
+        self.check_deadline()
+        for debugger in self.debuggers:
+            debugger.user_line(frame)
+
+    def user_return(self, frame, return_value, suspended: Optional[bool] = None) -> None:
+        self.check_deadline()
+        for debugger in self.debuggers:
+            debugger.user_return(frame, return_value, suspended)
+
+    def user_exception(self, frame, exc_info) -> None:
+        self.check_deadline()
+        for debugger in self.debuggers:
+            debugger.user_exception(frame, exc_info)
+
+    def get_annotations(self) -> list[Annotations]:
+        """Annotations for each function (in the same order as the debuggers)."""
+        return [debugger.get_annotations() for debugger in self.debuggers]
+
+    def get_metadata(self) -> list[Metadata]:
+        """Metadata for each function (in the same order as the debuggers)."""
+        return [debugger.get_metadata() for debugger in self.debuggers]
+
+    @classmethod
+    def create(cls, debuggers: list[Debugger]) -> MultiDebugger:
+        """Create a debugger with the fastest tracing backend available."""
+        backend: Type[MultiDebugger] = MultiTraceDebugger
+        if MonitoringDebugger.is_available():
+            backend = MultiMonitoringDebugger
+        return backend(debuggers)
+
+
+class MultiMonitoringDebugger(MultiDebugger, MonitoringDebugger):
+    """Trace several functions with `sys.monitoring`."""
+
+
+class MultiTraceDebugger(MultiDebugger, TraceDebugger):
+    """Trace several functions with `sys.settrace`."""
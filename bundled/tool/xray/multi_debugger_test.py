@@ -0,0 +1,83 @@
+import importlib.util
+import os.path
+import re
+from typing import Type
+
+import pytest
+
+from . import (
+    Debugger,
+    File,
+    FunctionFinder,
+    MonitoringDebugger,
+    MultiDebugger,
+    MultiMonitoringDebugger,
+    MultiTraceDebugger,
+    TraceDebugger,
+)
+from .utils import LineNumber
+
+targets = [
+    ("tests/quicksort.py", 4, "sort", [3, 1, 4, 1, 5, 9, 2, 6]),
+    ("tests/classes.py", 18, "external", "x"),
+    ("tests/classes.py", 3, "TestClass.static", 1),
+]
+
+
+def load(filename: str, lineno: int, name: str) -> tuple[File, object, callable]:
+    """Load the function defined in `filename` on line `lineno` from a fresh module."""
+    filepath = os.path.join(os.path.dirname(__file__), filename)
+    with open(filepath) as f:
+        source = f.read()
+    node = FunctionFinder.find_function(source, LineNumber[1](lineno))
+
+    spec = importlib.util.spec_from_file_location(os.path.basename(filename)[:-3], filepath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    function = module
+    for attribute in name.split("."):
+        function = getattr(function, attribute)
+    return File(filepath, source), node, function
+
+
+def normalize(annotations) -> str:
+    """Represent the annotations without memory addresses (which differ between runs)."""
+    return re.sub(r" at 0x[0-9a-f]+", "", repr(annotations))
+
+
+def run(debugger: Debugger | MultiDebugger, calls: list[tuple[callable, list]]):
+    debugger.set_trace()
+    try:
+        for function, args in calls:
+            function(*args)
+    finally:
+        debugger.set_quit()
+
+
+multi_debugger_classes = [(MultiTraceDebugger, TraceDebugger)]
+if MonitoringDebugger.is_available():
+    multi_debugger_classes.append((MultiMonitoringDebugger, MonitoringDebugger))
+
+
+@pytest.mark.parametrize("multi_debugger_class,debugger_class", multi_debugger_classes)
+def test_multi_debugger_matches_single_debuggers(
+    multi_debugger_class: Type[MultiDebugger], debugger_class: Type[Debugger]
+):
+    expected = []
+    for filename, lineno, name, *args in targets:
+        file, node, function = load(filename, lineno, name)
+        debugger = debugger_class(file, node)
+        run(debugger, [(function, args)])
+        expected.append(normalize(debugger.get_annotations()))
+
+    debuggers = []
+    calls = []
+    for filename, lineno, name, *args in targets:
+        file, node, function = load(filename, lineno, name)
+        debuggers.append(Debugger(file, node))
+        calls.append((function, args))
+    multi_debugger = multi_debugger_class(debuggers)
+    run(multi_debugger, calls)
+
+    assert [normalize(annotations) for annotations in multi_debugger.get_annotations()] == expected
+    assert len(multi_debugger.get_metadata()) == len(targets)
@@ -1,17 +1,19 @@
 from __future__ import annotations
 
+import array
 import itertools
-from collections import defaultdict
+from collections import deque
 from dataclasses import dataclass, field
-from typing import ClassVar, Iterable, Optional, Self, TypeAlias
+from typing import Callable, ClassVar, Iterable, Optional, Self, TypeAlias
 
 from .annotation import AnnotationPart, Annotations
 from .control_index import ControlIndex, ControlNode
-from .difference import Observation
-from .utils import LineNumber, Position, Serializable, recursive_defaultdict
+from .difference import KeywordObservation, NoDifference, Observation, Representation
+from .spill import SpillFile
+from .stats import Stats
+from .utils import LineNumber, Position, Serializable
 
 Timestamp: TypeAlias = Iterable[tuple[int, int]]
-GroupedAnnotations: TypeAlias = dict[Timestamp, dict[Position, list[AnnotationPart]]]
 
 
 @dataclass
@@ -20,117 +22,455 @@ class LineAnnotation(Serializable):
     annotations: list[list[AnnotationPart]]
 
 
-class Observations(Serializable):
-    """Utility for grouping observations."""
+@dataclass(eq=False)
+class Block:
+    """Block of code that repeats (such as a loop) and its current iteration."""
+
+    control_node: ControlNode
+    id: int
+    parent: Optional[Block] = None
+    time: int = 0
+    children: list[Block] = field(default_factory=list)
+    # Block and iteration ids of this block and the blocks around it (kept up to date).
+    timestamp: Timestamp = ()
+
+    @property
+    def line_number(self) -> LineNumber:
+        return self.control_node.line_number
+
+    @property
+    def is_root(self) -> bool:
+        return self.control_node.parent is None
+
+    def next(self):
+        """Move to the next timestep."""
+        self.time += 1
+        self.update()
+
+    def reset(self):
+        """Set the time to 0 for this block and all child blocks."""
+        self.time = 0
+        self.update()
+
+    def update(self):
+        """Update the timestamp of this block and reset the child blocks."""
+        if not self.is_root:
+            self.timestamp = self.parent.timestamp + ((self.id, self.time),)
+        for child in self.children:
+            child.reset()
+
+
+class Timeline:
+    """Timestamps of the observations of a call (kept up to date as the observations are added)."""
+
+    def __init__(self, control_index: ControlIndex):
+        self._control_index = control_index
+        self._ids = itertools.count()
+        # Blocks by the line number that starts them and by every line number in them.
+        self._blocks: dict[LineNumber, Block] = {}
+        self._line_blocks: dict[LineNumber, Block] = {}
+
+    def block(self, line_number: LineNumber) -> Block:
+        """Lookup a block based on the line number."""
+        try:
+            return self._line_blocks[line_number]
+        except KeyError:
+            ...
+        # Lookup the line number from the control information.
+        control_node = self._control_index[line_number]
+        block = self._blocks.get(control_node.line_number)
+        if block is None:
+            # Create the block if it does not exist.
+            block = Block(control_node=control_node, id=next(self._ids))
+            self._blocks[control_node.line_number] = block
+            if not block.is_root:
+                # Add a double-link to the tree (parent is decided by the control information).
+                block.parent = self.block(control_node.parent.line_number)
+                block.parent.children.append(block)
+                block.update()
+        self._line_blocks[line_number] = block
+        return block
+
+    def timestamp(self, line_number: LineNumber) -> Timestamp:
+        """Timestamp of an observation on this line (which is the next observation of the call)."""
+        block = self.block(line_number)
+        if block.line_number == line_number and not block.is_root:
+            # If we reach a line again, increment the timestamp.
+            block.next()
+        return block.timestamp
+
+
+class Table:
+    """Values that are stored once and referenced by their index."""
 
     def __init__(self):
-        self._observations: list[tuple[Position, Observation]] = []
+        self._values: list[any] = []
+        self._indices: dict[any, int] = {}
+
+    def __getitem__(self, index: int) -> any:
+        return self._values[index]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, value: any) -> int:
+        """Lookup the index of a value (storing it if it is new)."""
+        try:
+            return self._indices[value]
+        except KeyError:
+            self._indices[value] = len(self._values)
+            self._values.append(value)
+            return len(self._values) - 1
+
+
+class Iterations:
+    """
+    Iterations of a block (within an iteration of the blocks around it) by their id.
+    If `samples` is given, only the first and last `samples` iterations and any iterations that
+    return or raise are kept (the rest are only counted).
+    """
+
+    __slots__ = ("times", "ids", "last", "count")
+
+    def __init__(self, samples: Optional[int] = None):
+        # First iterations (or all of them without samples) and later ones that return or raise.
+        self.times = array.array("I")
+        self.ids = array.array("q")
+        # Last iterations (the oldest is dropped or kept when another is added).
+        self.last: Optional[deque[tuple[int, int]]] = (
+            None if samples is None else deque(maxlen=samples)
+        )
+        # Number of iterations (the time of the last iteration).
+        self.count = 0
+
+    def get(self, time: int) -> Optional[int]:
+        """Lookup the latest iteration (the only one that can still be reached)."""
+        if self.last:
+            latest_time, latest = self.last[-1]
+        elif self.times:
+            latest_time, latest = self.times[-1], self.ids[-1]
+        else:
+            return None
+        return latest if latest_time == time else None
+
+    def add(self, time: int, iteration: int) -> Optional[tuple[int, int]]:
+        """Add an iteration and return the oldest of the last iterations if it no longer fits."""
+        self.count = max(self.count, time)
+        if self.last is None or time <= self.last.maxlen:
+            self.keep(time, iteration)
+            return None
+        oldest = self.last.popleft() if len(self.last) == self.last.maxlen else None
+        self.last.append((time, iteration))
+        return oldest
+
+    def keep(self, time: int, iteration: int) -> None:
+        self.times.append(time)
+        self.ids.append(iteration)
 
-    def add(self, position: Position, observation: Observation) -> Self:
+    def __iter__(self) -> Iterable[tuple[int, int]]:
+        """Times and ids of the iterations that were kept (in order)."""
+        yield from zip(self.times, self.ids)
+        yield from self.last or ()
+
+
+class Observations(Serializable):
+    """
+    Utility for grouping observations (grouped by iteration as they are added).
+    Observations are stored as columns: the position and template of each observation (the
+    observation without its values, shared by the observations with the same shape) and the
+    offset of its values (the values of all the observations are stored in a single list).
+    """
+
+    # Shared by the observations of lines that do not change anything (which are most lines).
+    NO_DIFFERENCE: ClassVar[NoDifference] = NoDifference()
+    # Templates of the observations of the iterations that were dropped and of `NO_DIFFERENCE`.
+    DROPPED: ClassVar[int] = 0
+    UNCHANGED: ClassVar[int] = 1
+
+    def __init__(
+        self,
+        control_index: ControlIndex,
+        samples: Optional[int] = None,
+        release: Optional[Callable[[Observation], None]] = None,
+    ):
+        if samples is not None and samples < 1:
+            raise ValueError(f"Number of samples must be positive (not {samples}).")
+        self._control_index = control_index
+        self._samples = samples
+        # Called with the observations (in memory) of the iterations that are dropped.
+        self._release = release
+        self._timelines: dict[int, Timeline] = {}
+        # Iteration of each call (iterations are referred to by their id).
+        self._calls: dict[int, int] = {}
+        # Last timestamp of each call and its iterations (from the call to the innermost block).
+        self._paths: dict[int, tuple[Timestamp, list[int]]] = {}
+        # Columns of the iterations: their first and last observations (-1 if there are none) and
+        # whether anything in them returns or raises.
+        self._first = array.array("q")
+        self._last = array.array("q")
+        self._flagged = bytearray()
+        # Iterations of the blocks in each iteration (in the order the blocks are first reached).
+        self._blocks: dict[int, dict[int, Iterations]] = {}
+        # Columns of the observations (positions and templates are indices in the tables).
+        self._positions = array.array("I")
+        self._templates = array.array("I")
+        # Offsets of the values of each observation (followed by the total number of values).
+        self._offsets = array.array("Q", [0])
+        # Next observation of the same iteration (0 after the last one).
+        self._next = array.array("q")
+        self._position_table = Table()
+        self._template_table: list[Optional[Observation]] = [None, self.NO_DIFFERENCE]
+        self._shapes: dict[tuple, int] = {self.NO_DIFFERENCE.shape(): self.UNCHANGED}
+        # Values of the observations in memory (and the offset of the first one).
+        self._values: list[any] = []
+        self._values_start = 0
+        self._count = 0
+        self._dropped = 0
+        # Number of (oldest) observations that only store summaries.
+        self._summarized = 0
+        self._summarized_in_memory = 0
+        # Oldest observations that were moved to disk (the columns stay in memory).
+        self._spill: Optional[SpillFile] = None
+
+    def add(self, position: Position, observation: Observation, call_id: int = 1) -> Self:
         """Add another observation (in place)."""
-        self._observations.append((position, observation))
+        if call_id not in self._timelines:
+            self._timelines[call_id] = Timeline(self._control_index)
+            self._calls[call_id] = self.add_iteration()
+        timestamp = self._timelines[call_id].timestamp(position.line)
+        path = self.path(call_id, timestamp)
+        if type(observation) is NoDifference:
+            observation = self.NO_DIFFERENCE
+        elif isinstance(observation, KeywordObservation):
+            for iteration in path:
+                self._flagged[iteration] = True
+        iteration = path[-1]
+        if self._last[iteration] < 0:
+            self._first[iteration] = self._count
+        else:
+            self._next[self._last[iteration]] = self._count
+        self._last[iteration] = self._count
+        if observation is self.NO_DIFFERENCE:
+            template = self.UNCHANGED
+        else:
+            count = len(self._values)
+            self._values.extend(observation.values())
+            template = self.template(observation, len(self._values) - count)
+        self._positions.append(self._position_table.add(position))
+        self._templates.append(template)
+        self._offsets.append(self._values_start + len(self._values))
+        self._next.append(0)
+        self._count += 1
         return self
 
-    def to_annotations(self, control_index: ControlIndex) -> Annotations:
-        groups = self.group(control_index)
-        annotations = recursive_defaultdict()
-        for timestamp, timestep_annotations in groups.items():
-            # Create a slot based on the block and timestamps that contain this structure.
-            slot = annotations
-            for block_id, timestamp_id in timestamp:
-                slot = slot[f"block_{block_id}"]
-                slot = slot[f"timestamp_{timestamp_id}"]
-            for position, line_annotations in timestep_annotations.items():
-                # Store an annotation for the specific line.
-                slot[f"line_{position.line.zero}"] = LineAnnotation(
-                    position=position,
-                    annotations=list(line_annotations),
-                )
-        return annotations.to_non_empty_dict()
-
-    def group(self, control_index: ControlIndex) -> GroupedAnnotations:
-        """Group annotation based on where they appear in the control flow."""
-
-        @dataclass
-        class Block:
-            """Utility for storing blocks of code."""
-
-            control_node: ControlNode
-            time: int = 0
-            id: int = field(default_factory=itertools.count().__next__, init=False)
-            children: list[Block] = field(default_factory=list)
-
-            @property
-            def line_number(self) -> LineNumber:
-                return self.control_node.line_number
-
-            @property
-            def parent(self) -> Optional[Block]:
-                if self.is_root:
-                    return None
-                # Parent is decided by the control information.
-                return Block[self.control_node.parent.line_number]
-
-            def next(self):
-                """Move to the next timestep."""
-                self.time += 1
-                for child in self.children:
-                    child.reset()
-
-            def reset(self):
-                """Set the time to 0 for this block and all child blocks."""
-                self.time = 0
-                for child in self.children:
-                    child.reset()
-
-            @property
-            def timestamp(self) -> tuple[tuple[int, int], ...]:
-                """Recursively get the current timestamp as block and timestamp ids."""
-                if self.is_root:
-                    return ()
-                return self.parent.timestamp + ((self.id, self.time),)
-
-            @property
-            def is_root(self) -> bool:
-                return self.control_node.parent is None
-
-            _blocks: ClassVar[dict[LineNumber, Block]] = {}
-
-            def __class_getitem__(cls, line_number: LineNumber) -> Block:
-                """Lookup a block based on the line number."""
-                # Lookup the line number from the control information.
-                line_number = control_index[line_number].line_number
-                if line_number not in cls._blocks:
-                    # Create the block if it does not exist.
-                    parent = control_index[line_number]
-                    block = Block(control_node=parent)
-
-                    cls._blocks[line_number] = block
-                    if block.parent:
-                        # Add a double-link to the tree.
-                        block.parent.children.append(block)
-                return cls._blocks[line_number]
-
-        annotations: GroupedAnnotations = defaultdict(dict)
-
-        for position, observation in self._observations:
-            line_number = position.line
-            block = Block[line_number]
-
-            if block.line_number == line_number and not block.is_root:
-                # If we reach a line again, increment the timestamp.
-                block.next()
-
-            if (
-                block.is_root
-                and block.timestamp in annotations
-                and position in annotations[block.timestamp]
-            ):
-                # Handle special case where a root line is repeated.
-                annotations[block.timestamp][position] = itertools.chain(
-                    annotations[block.timestamp][position], observation.to_annotations()
-                )
-            else:
-                annotations[block.timestamp][position] = observation.to_annotations()
+    def add_iteration(self) -> int:
+        """Add an (empty) iteration and return its id."""
+        self._first.append(-1)
+        self._last.append(-1)
+        self._flagged.append(False)
+        return len(self._flagged) - 1
+
+    def template(self, observation: Observation, count: int) -> int:
+        """Index of the template of an observation with `count` values (added if it is new)."""
+        try:
+            shape = observation.shape()
+            index = self._shapes.get(shape)
+        except TypeError:
+            # Observations with unhashable attributes get their own template.
+            shape = index = None
+        if index is None:
+            index = len(self._template_table)
+            # Observations without values are their own template.
+            template = observation if count == 0 else observation.map_values(lambda _: None)
+            self._template_table.append(template)
+            if shape is not None:
+                self._shapes[shape] = index
+        return index
+
+    def path(self, call_id: int, timestamp: Timestamp) -> list[int]:
+        """Iterations from the call to the innermost block of a timestamp (added if they are new)."""
+        last_timestamp, path = self._paths.get(call_id, (None, None))
+        if timestamp is last_timestamp:
+            return path
+        path = [self._calls[call_id]]
+        for block_id, time in timestamp:
+            blocks = self._blocks.setdefault(path[-1], {})
+            iterations = blocks.get(block_id)
+            if iterations is None:
+                iterations = blocks[block_id] = Iterations(self._samples)
+            iteration = iterations.get(time)
+            if iteration is None:
+                iteration = self.add_iteration()
+                oldest = iterations.add(time, iteration)
+                if oldest is not None:
+                    if self._flagged[oldest[1]]:
+                        iterations.keep(*oldest)
+                    else:
+                        self.drop(oldest[1])
+            path.append(iteration)
+        self._paths[call_id] = (timestamp, path)
+        return path
+
+    def drop(self, iteration: int) -> None:
+        """Free the values of an iteration that is not kept (only its count is kept)."""
+        self._dropped += 1
+        start = self.spilled
+        for _, child in list(self.walk(iteration)):
+            self._blocks.pop(child, None)
+            for index in self.indices(child):
+                # Observations on disk stay there (they are never read back).
+                if index < start:
+                    continue
+                if self._release is not None and index - start >= self._summarized_in_memory:
+                    self._release(self.observation(index))
+                begin, end = self.value_range(index)
+                self._values[begin:end] = [None] * (end - begin)
+                self._templates[index] = self.DROPPED
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def dropped(self) -> int:
+        """Number of iterations that were not kept."""
+        return self._dropped
+
+    @property
+    def spilled(self) -> int:
+        return len(self._spill) if self._spill is not None else 0
+
+    @property
+    def in_memory(self) -> int:
+        return self._count - self.spilled
+
+    def value_range(self, index: int) -> tuple[int, int]:
+        """Range of the values of an observation in memory (in the list of values)."""
+        return (
+            self._offsets[index] - self._values_start,
+            self._offsets[index + 1] - self._values_start,
+        )
+
+    def observation(self, index: int) -> Observation:
+        """Rebuild an observation in memory from its template and values."""
+        template = self._template_table[self._templates[index]]
+        begin, end = self.value_range(index)
+        if begin == end:
+            return template
+        return template.with_values(iter(self._values[begin:end]))
+
+    def read(self, wanted: Callable[[int], bool]) -> Iterable[tuple[int, Observation]]:
+        """Read the wanted observations in order (one at a time, in a single pass over the file)."""
+        if self._spill is not None:
+            yield from self._spill.read(wanted)
+        for index in range(self.spilled, self._count):
+            if self._templates[index] != self.DROPPED and wanted(index):
+                yield index, self.observation(index)
+
+    def indices(self, iteration: int) -> Iterable[int]:
+        """Indices of the observations of an iteration (not in the blocks in it)."""
+        index = self._first[iteration]
+        while index >= 0:
+            yield index
+            # The first observation is never the next one (so 0 marks the end).
+            index = self._next[index] or -1
+
+    def lines(self, iteration: int) -> dict[Position, list[int]]:
+        """Indices of the observations of each line (in the order the lines are first reached)."""
+        lines = {}
+        for index in self.indices(iteration):
+            lines.setdefault(self._position_table[self._positions[index]], []).append(index)
+        return lines
+
+    def walk(self, iteration: int, timestamp: Timestamp = ()) -> Iterable[tuple[Timestamp, int]]:
+        """Iterate over an iteration and the (kept) iterations of the blocks in it."""
+        yield timestamp, iteration
+        for block_id, iterations in self._blocks.get(iteration, {}).items():
+            for time, child in iterations:
+                yield from self.walk(child, timestamp + ((block_id, time),))
+
+    @property
+    def summarized(self) -> int:
+        return self._summarized
+
+    def summarize(self, size: int, estimate_size: Callable[[any], int]) -> int:
+        """Summarize the values of the oldest observations to free (approximately) `size` bytes."""
+        freed = 0
+        start = self.spilled
+        while freed < size and self._summarized_in_memory < self._count - start:
+            index = start + self._summarized_in_memory
+            self._summarized_in_memory += 1
+            if self._templates[index] == self.DROPPED:
+                continue
+            begin, end = self.value_range(index)
+            for value_index in range(begin, end):
+                value = self._values[value_index]
+                freed += estimate_size(value)
+                self._values[value_index] = Representation.summarize(value)
+            self._summarized += 1
+        return freed
+
+    def spill(self, estimate_size: Callable[[any], int]) -> int:
+        """Move the observations in memory to disk and return the (approximate) bytes freed."""
+        start = self.spilled
+        freed = sum(
+            estimate_size(value)
+            for index in range(start + self._summarized_in_memory, self._count)
+            if self._templates[index] != self.DROPPED
+            for value in self._values[slice(*self.value_range(index))]
+        )
+        if self._spill is None:
+            self._spill = SpillFile()
+        self._spill.write(
+            None if self._templates[index] == self.DROPPED else self.observation(index)
+            for index in range(start, self._count)
+        )
+        self._values_start += len(self._values)
+        self._values = []
+        self._summarized_in_memory = 0
+        return freed
+
+    def to_annotations(self) -> Annotations:
+        # Annotations of the lines that are shown (filled in as the observations are read).
+        line_annotations: list[LineAnnotation] = []
+        # Line annotation of each observation (0 if it is not shown, or 1 + its index).
+        slots = array.array("I", [0]) * self._count
+        calls = {
+            f"call_{call_id}": self.annotate(call, line_annotations, slots)
+            for call_id, call in self._calls.items()
+        }
+        with Stats.current().phase("read"):
+            # Only the observations that are shown are read (and converted as they are read).
+            for index, observation in self.read(slots.__getitem__):
+                line_annotations[slots[index] - 1].annotations.extend(observation.to_annotations())
+        if len(calls) > 1:
+            # Show each call as a separate timeslice.
+            return {"block_calls": calls}
+        for annotations in calls.values():
+            return annotations
+        return {}
 
+    def annotate(
+        self, iteration: int, line_annotations: list[LineAnnotation], slots: array.array
+    ) -> Annotations:
+        """
+        Build the annotations of an iteration (and the kept iterations of the blocks in it) without
+        the observations (recording the line annotation of each observation in `slots`).
+        """
+        annotations = {}
+        for position, indices in self.lines(iteration).items():
+            # Store an annotation for the specific line.
+            line_annotation = LineAnnotation(position=position, annotations=[])
+            annotations[f"line_{position.line.zero}"] = line_annotation
+            line_annotations.append(line_annotation)
+            for index in indices:
+                slots[index] = len(line_annotations)
+        for block_id, iterations in self._blocks.get(iteration, {}).items():
+            block = annotations[f"block_{block_id}"] = {}
+            previous = 0
+            for time, child in iterations:
+                if time - previous > 1:
+                    # Record the iterations that were skipped before this one.
+                    block[f"elided_{previous + 1}"] = time - previous - 1
+                block[f"timestamp_{time}"] = self.annotate(child, line_annotations, slots)
+                previous = time
         return annotations
@@ -1,13 +1,43 @@
 import itertools
+import sys
+import tracemalloc
 
 import pytest
 
 from . import ControlIndex, Observations
 from .control_index import ControlNode
-from .difference import NoDifference
+from .difference import Add, Edit, NoDifference, Observation, Return
+from .observations import Timestamp
+from .spill import SpillFile
 from .utils import LineNumber, Position
 
 
+def timeline(observations: Observations) -> list[tuple[Timestamp, Position, Observation]]:
+    """Label each observation with the timestamp of its iteration (in the order they are shown)."""
+    read = dict(observations.read(lambda index: True))
+    return [
+        (timestamp, position, read[index])
+        for call in observations._calls.values()
+        for timestamp, iteration in observations.walk(call)
+        for position, indices in observations.lines(iteration).items()
+        for index in indices
+    ]
+
+
+def build_index(control_index: dict[int, int]) -> ControlIndex:
+    """Build a control index from a map of line numbers to the line that starts their block."""
+    node = None
+    index = {}
+    for line, target in itertools.chain([(0, None)], control_index.items()):
+        line_number = LineNumber[1](line)
+        if target is None:
+            node = ControlNode(None, line_number=line_number)
+        elif line == target:
+            node = ControlNode(node, line_number=line_number)
+        index[line_number] = node
+    return index
+
+
 @pytest.mark.parametrize(
     "positions,expected_timestamps,control_index",
     [
@@ -63,27 +93,180 @@ def test_difference_groups(positions, expected_timestamps, control_index: Contro
     Positions contains (lineno, character) for the order of visited lines.
     Expected_timestamps contains timestamps (tuple of (block, timestamp_id)) that we expect to see.
     """
-    observations = Observations()
+    observations = Observations(build_index(control_index))
     for lineno, character in positions:
         position = Position(LineNumber[1](lineno), character)
         observations.add(position, NoDifference())
 
-    node = None
-    index = {}
-    for line, target in itertools.chain([(0, None)], control_index.items()):
-        line_number = LineNumber[1](line)
-        if target is None:
-            node = ControlNode(None, line_number=line_number)
-        elif line == target:
-            node = ControlNode(node, line_number=line_number)
-        index[line_number] = node
-
-    groups = observations.group(index)
+    entries = timeline(observations)
 
     # Check the timestamps match.
-    assert set([tuple(time for group, time in k) for k in groups.keys()]) == set(
+    assert set([tuple(time for group, time in k) for k, _, _ in entries]) == set(
         expected_timestamps
     )
 
     # Check all the positions are there.
-    assert sum([len(group) for group in groups.values()]) == len(positions)
+    assert len(entries) == len(positions)
+
+
+@pytest.mark.parametrize(
+    "positions,returns,samples,expected_keys",
+    [
+        (
+            [(1, 4), (2, 4)] * 10,
+            set(),
+            2,
+            [
+                "timestamp_1",
+                "timestamp_2",
+                "elided_3",
+                "timestamp_9",
+                "timestamp_10",
+            ],
+        ),
+        (
+            [(1, 4), (2, 4)] * 10,
+            {11},
+            2,
+            [
+                "timestamp_1",
+                "timestamp_2",
+                "elided_3",
+                "timestamp_6",
+                "elided_7",
+                "timestamp_9",
+                "timestamp_10",
+            ],
+        ),
+        (
+            [(1, 4), (2, 4)] * 4,
+            set(),
+            2,
+            ["timestamp_1", "timestamp_2", "timestamp_3", "timestamp_4"],
+        ),
+    ],
+)
+def test_loop_sampling(positions, returns, samples, expected_keys):
+    """
+    for i in range(n):
+        ...
+    Returns contains the indices of positions that are `return` observations.
+    """
+    observations = Observations(build_index({1: 1, 2: 1}), samples=samples)
+    for i, (lineno, character) in enumerate(positions):
+        position = Position(LineNumber[1](lineno), character)
+        observations.add(position, Return(None) if i in returns else NoDifference())
+
+    annotations = observations.to_annotations()
+
+    (block,) = annotations.values()
+    assert list(block.keys()) == expected_keys
+    elided = sum(value for key, value in block.items() if key.startswith("elided_"))
+    shown = sum(key.startswith("timestamp_") for key in block.keys())
+    assert elided + shown == len(positions) // 2
+
+
+def test_nested_loop_sampling():
+    """
+    for i in range(5):
+        for j in range(5):
+            ...
+    """
+    observations = Observations(build_index({1: 1, 2: 2, 3: 2}), samples=1)
+    for _ in range(5):
+        observations.add(Position(LineNumber[1](1), 4), NoDifference())
+        for _ in range(5):
+            observations.add(Position(LineNumber[1](2), 8), NoDifference())
+            observations.add(Position(LineNumber[1](3), 8), NoDifference())
+
+    annotations = observations.to_annotations()
+
+    (outer,) = annotations.values()
+    assert list(outer.keys()) == ["timestamp_1", "elided_2", "timestamp_5"]
+    for key in ("timestamp_1", "timestamp_5"):
+        (inner,) = (value for key, value in outer[key].items() if key.startswith("block_"))
+        assert list(inner.keys()) == ["timestamp_1", "elided_2", "timestamp_5"]
+        assert inner["elided_2"] == 3
+    assert outer["elided_2"] == 3
+
+
+def test_observations_share_positions():
+    observations = Observations(build_index({1: 1, 2: 1}))
+    for _ in range(3):
+        for line in (1, 2, 2):
+            observations.add(Position(LineNumber[1](line), 4), NoDifference())
+
+    assert len(observations) == 9
+    entries = timeline(observations)
+    assert len({id(position) for _, position, _ in entries}) == 2
+    assert [position.line.one for _, position, _ in entries] == [1, 2, 2] * 3
+    assert all(observation is Observations.NO_DIFFERENCE for _, _, observation in entries)
+
+
+def test_loop_sampling_drops_iterations():
+    """
+    for i in range(10):
+        ...
+    """
+    released = []
+    observations = Observations(build_index({1: 1}), samples=2, release=released.append)
+    for i in range(10):
+        observations.add(Position(LineNumber[1](1), 4), Add("i", i))
+
+    # Only the first and last 2 iterations keep their observations.
+    assert observations.dropped == 6
+    assert [observation.value for observation in released] == [2, 3, 4, 5, 6, 7]
+    assert [
+        value for _, _, observation in timeline(observations) for value in observation.values()
+    ] == [0, 1, 8, 9]
+    (block,) = observations.to_annotations().values()
+    assert block["elided_3"] == 6
+
+
+def test_observations_are_stored_as_columns():
+    """
+    for i in range(n):
+        x = i
+    """
+    values = list(range(10_001))
+    observations = Observations(build_index({1: 1, 2: 1}))
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(10_000):
+            observations.add(Position(LineNumber[1](1), 4), NoDifference())
+            observations.add(Position(LineNumber[1](2), 8), Edit("x", values[i], values[i + 1]))
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    # Only the columns and the values are stored for each observation (not the observation).
+    assert size / len(observations) < 64
+    assert [observation.new for _, _, observation in timeline(observations)[1:6:2]] == [1, 2, 3]
+
+
+def test_annotations_only_read_shown_observations(monkeypatch):
+    """
+    for i in range(10):
+        ...
+    """
+    observations = Observations(build_index({1: 1}), samples=2)
+    for i in range(10):
+        observations.add(Position(LineNumber[1](1), 4), Add("i", i))
+        if i == 5:
+            observations.spill(sys.getsizeof)
+    loaded = []
+    monkeypatch.setattr(
+        SpillFile, "loads", staticmethod(lambda data: loaded.append(data) or Add("i", 0))
+    )
+
+    (block,) = observations.to_annotations().values()
+    # Iterations 1 and 2 are read from disk and 9 and 10 from memory.
+    assert len(loaded) == 2
+    assert list(block.keys()) == [
+        "timestamp_1",
+        "timestamp_2",
+        "elided_3",
+        "timestamp_9",
+        "timestamp_10",
+    ]
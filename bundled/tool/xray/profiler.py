@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import abc
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, ClassVar, Generic, Iterable, Optional, Self, TypeVar
+
+from .annotation import Annotation, AnnotationPart, Metadata
+from .difference import Observation
+from .utils import Position
+
+Reading = TypeVar("Reading")
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration with a sensible unit."""
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g}{unit}"
+    return f"{seconds / 1e-9:.3g}ns"
+
+
+def format_size(size: float) -> str:
+    """Format a number of bytes with a sensible unit."""
+    for unit, scale in (("GiB", 2**30), ("MiB", 2**20), ("KiB", 2**10)):
+        if abs(size) >= scale:
+            return f"{size / scale:.3g}{unit}"
+    return f"{size:.3g}B"
+
+
+@dataclass
+class LineProfile:
+    """Total time spent on a line."""
+
+    hits: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+
+    def add(self, wall: float, cpu: float) -> Self:
+        """Record another hit (in place)."""
+        self.hits += 1
+        self.wall += wall
+        self.cpu += cpu
+        return self
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.hits} {'hit' if self.hits == 1 else 'hits'}, "
+            f"{format_duration(self.wall)} wall ({format_duration(self.wall / self.hits)}/hit), "
+            f"{format_duration(self.cpu)} CPU ({format_duration(self.cpu / self.hits)}/hit)"
+        )
+
+
+@dataclass
+class AllocationProfile:
+    """Total memory allocated by a line."""
+
+    hits: int = 0
+    net: int = 0
+    peak: int = 0
+    blocks: int = 0
+
+    def add(self, net: int, peak: int, blocks: int) -> Self:
+        """Record another hit (in place)."""
+        self.hits += 1
+        self.net += net
+        self.peak = max(self.peak, peak)
+        self.blocks += blocks
+        return self
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.hits} {'hit' if self.hits == 1 else 'hits'}, "
+            f"{format_size(self.net)} net, {format_size(self.peak)} peak, "
+            f"{self.blocks} blocks"
+        )
+
+
+@dataclass
+class Timing(Observation):
+    """Observe the time taken by a single hit of a line."""
+
+    wall: float
+    cpu: float
+    # Totals for the line (shared between all hits).
+    profile: LineProfile
+
+    def to_annotation(self) -> Annotation:
+        return [AnnotationPart(f"⏱{format_duration(self.wall)}", repr(self.profile))]
+
+    def __repr__(self) -> str:
+        return f"⏱{format_duration(self.wall)}"
+
+
+@dataclass
+class Allocation(Observation):
+    """Observe the memory allocated by a single hit of a line."""
+
+    net: int
+    peak: int
+    blocks: int
+    # Totals for the line (shared between all hits).
+    profile: AllocationProfile
+
+    def to_annotation(self) -> Annotation:
+        return [
+            AnnotationPart(
+                f"Δ{format_size(self.net)}",
+                f"{format_size(self.net)} net, {format_size(self.peak)} peak, "
+                f"{self.blocks} blocks (total: {self.profile!r})",
+            )
+        ]
+
+    def __repr__(self) -> str:
+        return f"Δ{format_size(self.net)}"
+
+
+@dataclass
+class Profiled(Observation):
+    """Observation with the measurements of the line it was made on."""
+
+    observation: Observation
+    measurements: list[Observation]
+
+    def __iter__(self) -> Iterable[Observation]:
+        yield from self.observation
+        yield from self.measurements
+
+    def values(self) -> Iterable[any]:
+        return self.observation.values()
+
+    def map_values(self, f: Callable[[any], any]) -> Self:
+        return Profiled(self.observation.map_values(f), self.measurements)
+
+    def __repr__(self) -> str:
+        return ", ".join(filter(None, map(repr, (self.observation, *self.measurements))))
+
+
+class Profiler(abc.ABC, Generic[Reading]):
+    """
+    Measure each line of the target without counting the work done by the debugger.
+    Call `enter` when an event starts being handled and `exit` when it is finished.
+    """
+
+    NAME: ClassVar[str]  # Key in the metadata.
+
+    def start(self) -> None:
+        """Start measuring (before any calls are recorded)."""
+
+    def stop(self) -> None:
+        """Stop measuring (after the calls are recorded)."""
+
+    @abc.abstractmethod
+    def enter(self) -> Reading:
+        """Pause measuring and return the current reading (excluding the debugger)."""
+
+    @abc.abstractmethod
+    def exit(self) -> None:
+        """Resume measuring."""
+
+    @abc.abstractmethod
+    def record(self, position: Position, start: Reading, end: Reading) -> Observation:
+        """Record a hit of the line at `position` that ran between two readings."""
+
+    @abc.abstractmethod
+    def get_metadata(self) -> Metadata:
+        """Totals for each line."""
+
+
+class LineProfiler(Profiler[tuple[float, float]]):
+    """Time each line with a (wall and CPU) clock that stops while the debugger handles events."""
+
+    NAME: ClassVar[str] = "profile"
+
+    def __init__(self):
+        self.profiles: dict[Position, LineProfile] = {}
+        # Total time spent in the debugger.
+        self._overhead: tuple[float, float] = (0.0, 0.0)
+        self._entered: Optional[tuple[float, float]] = None
+
+    @staticmethod
+    def clock() -> tuple[float, float]:
+        return time.perf_counter(), time.thread_time()
+
+    def enter(self) -> tuple[float, float]:
+        self._entered = wall, cpu = self.clock()
+        overhead_wall, overhead_cpu = self._overhead
+        return wall - overhead_wall, cpu - overhead_cpu
+
+    def exit(self) -> None:
+        (wall, cpu), (entered_wall, entered_cpu) = self.clock(), self._entered
+        overhead_wall, overhead_cpu = self._overhead
+        self._overhead = (overhead_wall + wall - entered_wall, overhead_cpu + cpu - entered_cpu)
+
+    def record(
+        self, position: Position, start: tuple[float, float], end: tuple[float, float]
+    ) -> Timing:
+        wall, cpu = end[0] - start[0], end[1] - start[1]
+        profile = self.profiles.setdefault(position, LineProfile())
+        profile.add(wall, cpu)
+        return Timing(wall, cpu, profile)
+
+    def get_metadata(self) -> Metadata:
+        return {
+            f"line_{position.line.zero}": {
+                "hits": profile.hits,
+                "wall": profile.wall,
+                "cpu": profile.cpu,
+            }
+            for position, profile in sorted(self.profiles.items())
+        }
+
+
+class AllocationProfiler(Profiler[tuple[int, int, int]]):
+    """
+    Measure the memory allocated by each line with `tracemalloc` (ignoring allocations by the debugger).
+    Readings are the current traced bytes, the peak since measuring resumed and the number of
+    allocated blocks.
+    """
+
+    NAME: ClassVar[str] = "allocations"
+
+    def __init__(self):
+        self.profiles: dict[Position, AllocationProfile] = {}
+        # Bytes and blocks allocated (and still in use) by the debugger.
+        self._overhead: tuple[int, int] = (0, 0)
+        self._entered: Optional[tuple[int, int]] = None
+        self._resumed_size = 0
+        self._started = False
+
+    def start(self) -> None:
+        # Leave `tracemalloc` alone if something else is using it.
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        tracemalloc.reset_peak()
+
+    def stop(self) -> None:
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def enter(self) -> tuple[int, int, int]:
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sys.getallocatedblocks()
+        self._entered = current, blocks
+        overhead_size, overhead_blocks = self._overhead
+        # The peak is relative to the size when measuring resumed.
+        return current - overhead_size, peak - self._resumed_size, blocks - overhead_blocks
+
+    def exit(self) -> None:
+        current, _ = tracemalloc.get_traced_memory()
+        blocks = sys.getallocatedblocks()
+        entered_size, entered_blocks = self._entered
+        overhead_size, overhead_blocks = self._overhead
+        self._overhead = (
+            overhead_size + current - entered_size,
+            overhead_blocks + blocks - entered_blocks,
+        )
+        # Only measure the peak of the code being traced.
+        tracemalloc.reset_peak()
+        self._resumed_size = current
+
+    def record(
+        self, position: Position, start: tuple[int, int, int], end: tuple[int, int, int]
+    ) -> Allocation:
+        (start_size, _, start_blocks), (end_size, peak, end_blocks) = start, end
+        net, blocks = end_size - start_size, end_blocks - start_blocks
+        profile = self.profiles.setdefault(position, AllocationProfile())
+        profile.add(net, peak, blocks)
+        return Allocation(net, peak, blocks, profile)
+
+    def get_metadata(self) -> Metadata:
+        return {
+            f"line_{position.line.zero}": {
+                "hits": profile.hits,
+                "net": profile.net,
+                "peak": profile.peak,
+                "blocks": profile.blocks,
+            }
+            for position, profile in sorted(self.profiles.items())
+        }
+
+
+class Profilers:
+    """Use several profilers together (innermost last)."""
+
+    def __init__(self, profilers: list[Profiler]):
+        self.profilers = profilers
+        self._reversed_profilers = profilers[::-1]
+
+    def start(self) -> None:
+        for profiler in self.profilers:
+            profiler.start()
+
+    def stop(self) -> None:
+        for profiler in self.profilers:
+            profiler.stop()
+
+    def enter(self) -> list[any]:
+        # Avoid comprehensions (which allocate a function) so the readings are not disturbed.
+        readings = []
+        for profiler in self.profilers:
+            readings.append(profiler.enter())
+        return readings
+
+    def exit(self) -> None:
+        # Exit in reverse so each profiler also ignores the work of the profilers inside it.
+        for profiler in self._reversed_profilers:
+            profiler.exit()
+
+    def record(self, position: Position, start: list[any], end: list[any]) -> list[Observation]:
+        return [
+            profiler.record(position, profiler_start, profiler_end)
+            for profiler, profiler_start, profiler_end in zip(self.profilers, start, end)
+        ]
+
+    def get_metadata(self) -> Metadata:
+        return {profiler.NAME: profiler.get_metadata() for profiler in self.profilers}
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+from . import ProjectConfig, TraceDebugger
+from .debugger_test import trace
+from .profiler import (
+    AllocationProfiler,
+    LineProfile,
+    LineProfiler,
+    Profiler,
+    format_duration,
+    format_size,
+)
+from .utils import LineNumber, Position
+
+
+@pytest.mark.parametrize(
+    "seconds,expected",
+    [(2.5, "2.5s"), (0.0125, "12.5ms"), (3e-6, "3µs"), (4e-8, "40ns"), (0.0, "0ns")],
+)
+def test_format_duration(seconds: float, expected: str):
+    assert format_duration(seconds) == expected
+
+
+@pytest.mark.parametrize(
+    "size,expected", [(12, "12B"), (2048, "2KiB"), (-3 * 2**20, "-3MiB"), (2**31, "2GiB")]
+)
+def test_format_size(size: int, expected: str):
+    assert format_size(size) == expected
+
+
+def test_line_profiler_excludes_overhead():
+    profiler = LineProfiler()
+    position = Position(LineNumber[1](1), 0)
+    start = profiler.enter()
+    # Time spent handling an event is not counted.
+    time.sleep(0.05)
+    profiler.exit()
+    timing = profiler.record(position, start, profiler.enter())
+    profiler.exit()
+    assert timing.wall < 0.05
+    assert profiler.profiles[position] == LineProfile(1, timing.wall, timing.cpu)
+
+
+def test_debugger_profiles_lines():
+    debugger = trace(
+        TraceDebugger,
+        "tests/quicksort.py",
+        4,
+        "sort",
+        [3, 1, 4],
+        config=ProjectConfig(profile=True, max_calls=1),
+    )
+    profile = debugger.get_metadata()["profile"]
+    # `if x < pivot:` runs once for each element.
+    assert profile["line_15"]["hits"] == 3
+    assert all(line["wall"] >= 0 and line["cpu"] >= 0 for line in profile.values())
+    assert "⏱" in repr(debugger.get_annotations())
+
+
+def test_debugger_does_not_profile_by_default():
+    debugger = trace(TraceDebugger, "tests/quicksort.py", 4, "sort", [3, 1, 4])
+    metadata = debugger.get_metadata()
+    assert "profile" not in metadata and "allocations" not in metadata
+    assert "⏱" not in repr(debugger.get_annotations())
+
+
+def test_allocation_profiler_excludes_overhead():
+    profiler = AllocationProfiler()
+    position = Position(LineNumber[1](1), 0)
+    profiler.start()
+    try:
+        start = profiler.enter()
+        # Memory allocated while handling an event is not counted.
+        overhead = bytearray(1_000_000)
+        profiler.exit()
+        allocated = bytearray(100_000)
+        allocation = profiler.record(position, start, profiler.enter())
+        profiler.exit()
+    finally:
+        profiler.stop()
+    assert 100_000 <= allocation.net < 200_000
+    assert allocation.peak >= allocation.net
+    del overhead, allocated
+
+
+def test_debugger_tracks_allocations():
+    debugger = trace(
+        TraceDebugger,
+        "tests/quicksort.py",
+        4,
+        "sort",
+        list(range(20, 0, -1)),
+        config=ProjectConfig(track_allocations=True, max_calls=1),
+    )
+    allocations = debugger.get_metadata()["allocations"]
+    # `less.append(x)` grows the list for every element after the pivot.
+    assert allocations["line_16"]["hits"] == 19
+    assert allocations["line_16"]["net"] > 0
+    assert "Δ" in repr(debugger.get_annotations())
+
+
+def test_profiler_requires_measurements():
+    with pytest.raises(TypeError):
+        Profiler()
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import contextlib
+import gc
+import hashlib
+import json
+import os.path
+import stat
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import ClassVar, Iterator, Optional, Self
+
+from .annotation import AnnotationPart, Annotations, Metadata
+from .config import Target
+from .difference import Representation
+from .function_finder import FunctionFinder
+from .hovers import Hover
+from .observations import LineAnnotation
+from .utils import LineNumber, Position, Serializable
+
+
+@contextlib.contextmanager
+def paused_collection() -> Iterator[None]:
+    """
+    Pause the garbage collector (while encoding or decoding annotations, which creates many
+    containers without cycles that would otherwise trigger many collections).
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+@dataclass
+class SavedTrace:
+    """
+    Annotations from a run of a test (saved so that they can be shown again later).
+    Traces are saved as JSON with only summaries of the values in the tooltips (so loading a
+    trace never runs any code).
+    """
+
+    # Increased when the format changes (traces in older formats are not loaded).
+    VERSION: ClassVar[int] = 5
+    # Folder for the traces of projects that do not set `trace_directory` (only for this user).
+    DEFAULT_DIRECTORY: ClassVar[str] = os.path.join(
+        (
+            os.environ.get("LOCALAPPDATA")
+            if sys.platform == "win32"
+            else os.environ.get("XDG_CACHE_HOME")
+        )
+        or os.path.join(os.path.expanduser("~"), ".cache"),
+        "xray",
+        "traces",
+    )
+
+    filepath: str
+    # Qualified name of the annotated function.
+    function: str
+    test: str
+    # Hash of the source of the file when the test was run.
+    source_hash: str
+    result: bool
+    annotations: Annotations
+    metadata: Metadata
+    # Time (from `time.time`) when the test was run.
+    time: float = field(default_factory=time.time)
+    version: int = VERSION
+
+    @classmethod
+    def create(
+        cls, target: Target, test: str, result: bool, annotations: Annotations, metadata: Metadata
+    ) -> Self:
+        return cls(
+            filepath=os.path.abspath(target.file.filepath),
+            function=cls.function_name(target),
+            test=test,
+            source_hash=cls.hash_source(target.file.source),
+            result=result,
+            annotations=annotations,
+            metadata=metadata,
+        )
+
+    def to_json(self) -> dict[str, any]:
+        """Store the annotations compactly (tooltips refer to the representations of their values)."""
+        texts: list[str] = []
+        return {
+            **vars(self),
+            "metadata": Serializable.serialize(self.metadata),
+            "annotations": self.encode(self.annotations, {}, texts),
+            "texts": texts,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, any]) -> Self:
+        texts = [Representation(text) for text in data.pop("texts")]
+        return cls(**{**data, "annotations": cls.decode(data["annotations"], texts, {})})
+
+    @classmethod
+    def encode(cls, annotations: Annotations, ids: dict[int, int], texts: list[str]) -> dict:
+        """Encode the annotations with lists (of the texts of the parts followed by their tooltips)."""
+        encoded = {}
+        for key, value in annotations.items():
+            if isinstance(value, dict):
+                value = cls.encode(value, ids, texts)
+            elif isinstance(value, LineAnnotation):
+                value = [
+                    value.position.line.zero,
+                    value.position.character,
+                    [
+                        [item for part in parts for item in cls.encode_part(part, ids, texts)]
+                        for parts in value.annotations
+                    ],
+                ]
+            encoded[key] = value
+        return encoded
+
+    @staticmethod
+    def encode_part(part: AnnotationPart, ids: dict[int, int], texts: list[str]) -> tuple:
+        """Encode a part (a tooltip for a value refers to the representation of the value by index)."""
+        if not isinstance(part.hover, Hover):
+            return part.text, part.hover
+        index = ids.get(id(part.hover.value))
+        if index is None:
+            # The annotations keep the value alive (so the id is not reused).
+            index = ids[id(part.hover.value)] = len(texts)
+            texts.append(Representation.summarize(part.hover.value).text)
+        if part.hover.prefix or part.hover.suffix:
+            return part.text, [index, part.hover.prefix, part.hover.suffix]
+        return part.text, index
+
+    @classmethod
+    def decode(
+        cls, encoded: dict, texts: list[Representation], positions: dict[tuple, Position]
+    ) -> Annotations:
+        annotations = {}
+        for key, value in encoded.items():
+            if isinstance(value, dict):
+                value = cls.decode(value, texts, positions)
+            elif isinstance(value, list):
+                line, character, parts = value
+                position = positions.get((line, character))
+                if position is None:
+                    position = positions[line, character] = Position(LineNumber[0](line), character)
+                value = LineAnnotation(
+                    position,
+                    [
+                        [
+                            AnnotationPart(text, cls.decode_hover(hover, texts))
+                            for text, hover in zip(items[::2], items[1::2])
+                        ]
+                        for items in parts
+                    ],
+                )
+            annotations[key] = value
+        return annotations
+
+    @staticmethod
+    def decode_hover(
+        hover: Optional[int | str | list], texts: list[Representation]
+    ) -> Optional[str | Hover]:
+        if isinstance(hover, int):
+            return Hover(texts[hover])
+        if isinstance(hover, list):
+            index, prefix, suffix = hover
+            return Hover(texts[index], prefix, suffix)
+        return hover
+
+    @staticmethod
+    def function_name(target: Target) -> str:
+        position = FunctionFinder.get_function(
+            target.file.source, LineNumber[1](target.node.lineno)
+        )
+        return target.node.name if position is None else position.name
+
+    @staticmethod
+    def hash_source(source: str) -> str:
+        return hashlib.sha256(source.encode()).hexdigest()
+
+    @staticmethod
+    def check_owner(status: os.stat_result, path: str) -> None:
+        """Refuse files that belong to another user (which could contain misleading annotations)."""
+        if hasattr(os, "getuid") and status.st_uid != os.getuid():
+            raise PermissionError(f"{path!r} belongs to another user.")
+
+    @classmethod
+    def check_directory(cls, directory: str) -> None:
+        """Refuse folders that other users could add traces to."""
+        status = os.stat(directory)
+        cls.check_owner(status, directory)
+        if status.st_mode & stat.S_IWOTH:
+            raise PermissionError(f"{directory!r} can be written to by other users.")
+
+    @classmethod
+    def path(cls, target: Target, test: str) -> str:
+        """Location of the trace of a function and test (the latest run replaces older ones)."""
+        directory = target.project.trace_directory or cls.DEFAULT_DIRECTORY
+        filepath = os.path.abspath(target.file.filepath)
+        function = cls.function_name(target)
+        key = hashlib.sha256(f"{filepath}\0{function}\0{test}".encode()).hexdigest()[:16]
+        return os.path.join(directory, f"{os.path.basename(filepath)}-{function}-{key}.trace")
+
+    def is_stale(self, source: str) -> bool:
+        """Whether the source has changed since the test was run."""
+        return self.hash_source(source) != self.source_hash
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.check_directory(directory)
+        # Replace the file at once so that a partially written trace is never loaded.
+        with tempfile.NamedTemporaryFile(
+            "w", dir=os.path.dirname(path), delete=False, encoding="utf-8"
+        ) as f:
+            try:
+                with paused_collection():
+                    data = self.to_json()
+                f.write(json.dumps(data, separators=(",", ":")))
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        os.replace(f.name, path)
+
+    @classmethod
+    def load(cls, path: str, source: Optional[str] = None) -> Self:
+        """Load a trace (checking that it was recorded from `source` if given)."""
+        cls.check_directory(os.path.dirname(os.path.abspath(path)))
+        with open(path, encoding="utf-8") as f:
+            cls.check_owner(os.fstat(f.fileno()), path)
+            with paused_collection():
+                try:
+                    data = json.load(f)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+                    raise ValueError(f"Trace {path!r} was saved in an unsupported format.")
+                trace = cls.from_json(data)
+        if source is not None and trace.is_stale(source):
+            raise ValueError(
+                f"Trace {path!r} is out of date "
+                f"(`{trace.filepath}` has changed since the test ran)."
+            )
+        return trace
@@ -0,0 +1,117 @@
+import os.path
+import threading
+from typing import Iterable
+
+import pytest
+
+from . import (
+    Annotations,
+    File,
+    FunctionFinder,
+    ProjectConfig,
+    SavedTrace,
+    Target,
+    TraceDebugger,
+    replay,
+)
+from .debugger_test import trace
+from .difference import Add, Representation
+from .hovers import Hover
+from .observations import LineAnnotation
+from .utils import LineNumber, Position, Serializable
+
+
+def quicksort_target(tmp_path, **config) -> Target:
+    filepath = os.path.join(os.path.dirname(__file__), "tests/quicksort.py")
+    with open(filepath) as f:
+        source = f.read()
+    node = FunctionFinder.find_function(source, LineNumber[1](4))
+    project = ProjectConfig(trace_directory=str(tmp_path), **config)
+    return Target(File(filepath, source), node, project)
+
+
+def hovers(annotations: Annotations) -> Iterable[Hover]:
+    """Tooltips of the parts of the annotations (of every iteration)."""
+    for value in annotations.values():
+        if isinstance(value, dict):
+            yield from hovers(value)
+        elif isinstance(value, LineAnnotation):
+            for parts in value.annotations:
+                for part in parts:
+                    if isinstance(part.hover, Hover):
+                        yield part.hover
+
+
+def test_saved_trace_round_trip(tmp_path):
+    target = quicksort_target(tmp_path)
+    debugger = trace(
+        TraceDebugger, "tests/quicksort.py", 4, "sort", [3, 1, 4, 1, 5], config=target.project
+    )
+    expected = debugger.get_annotations()
+    path = SavedTrace.path(target, "test_sort")
+    SavedTrace.create(target, "test_sort", True, expected, {"partial": False}).save(path)
+
+    result, annotations, metadata = replay(target, "test_sort")
+    assert result
+    assert Serializable.serialize(annotations) == Serializable.serialize(expected)
+    assert metadata["partial"] is False
+    assert "load_trace" in metadata["stats"]["phases"]
+
+
+def test_saved_trace_only_stores_summaries(tmp_path):
+    target = quicksort_target(tmp_path)
+    debugger = trace(TraceDebugger, "tests/quicksort.py", 4, "sort", [2, 1], config=target.project)
+    debugger.observations.add(Position(LineNumber[1](5), 4), Add("lock", threading.Lock()))
+    path = SavedTrace.path(target, "test_sort")
+    SavedTrace.create(target, "test_sort", True, debugger.get_annotations(), {}).save(path)
+
+    loaded = SavedTrace.load(path)
+    assert all(isinstance(hover.value, Representation) for hover in hovers(loaded.annotations))
+    assert any("lock" in hover.value.text for hover in hovers(loaded.annotations))
+
+
+def test_saved_trace_refuses_other_formats(tmp_path):
+    target = quicksort_target(tmp_path)
+    path = SavedTrace.path(target, "test_sort")
+    for content in (b"\x80\x05N.", b'{"version": 1}'):
+        with open(path, "wb") as f:
+            f.write(content)
+        with pytest.raises(ValueError, match="unsupported format"):
+            SavedTrace.load(path)
+
+
+def test_saved_trace_paths(tmp_path):
+    target = quicksort_target(tmp_path)
+    path = SavedTrace.path(target, "test_sort")
+    assert os.path.dirname(path) == str(tmp_path)
+    assert path != SavedTrace.path(target, "test_other")
+    with pytest.raises(FileNotFoundError):
+        replay(target, "test_sort")
+
+
+def test_saved_trace_is_stale(tmp_path):
+    target = quicksort_target(tmp_path)
+    debugger = trace(TraceDebugger, "tests/quicksort.py", 4, "sort", [2, 1], config=target.project)
+    path = SavedTrace.path(target, "test_sort")
+    SavedTrace.create(target, "test_sort", True, debugger.get_annotations(), {}).save(path)
+
+    target.file.source += "\n# Edited\n"
+    loaded = SavedTrace.load(path)
+    assert loaded.is_stale(target.file.source)
+    with pytest.raises(ValueError, match="out of date"):
+        replay(target, "test_sort")
+
+
+def test_saved_trace_refuses_shared_directories(tmp_path):
+    target = quicksort_target(tmp_path)
+    debugger = trace(TraceDebugger, "tests/quicksort.py", 4, "sort", [2, 1], config=target.project)
+    path = SavedTrace.path(target, "test_sort")
+    SavedTrace.create(target, "test_sort", True, debugger.get_annotations(), {}).save(path)
+
+    os.chmod(tmp_path, 0o777)
+    with pytest.raises(PermissionError):
+        replay(target, "test_sort")
+    with pytest.raises(PermissionError):
+        SavedTrace.create(target, "test_sort", True, debugger.get_annotations(), {}).save(path)
+    os.chmod(tmp_path, 0o700)
+    replay(target, "test_sort")
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from typing import Callable, ClassVar
+
+from .capture import IMMUTABLE_TYPES
+
+
+class Snapshot:
+    """Copies of variables that are only recopied when the variables may have changed."""
+
+    # Containers whose items are copied separately (so unchanged items are shared between copies).
+    SHARED_TYPES: ClassVar[frozenset[type]] = frozenset({list, dict})
+    # Types of items that are worth sharing.
+    MUTABLE_TYPES: ClassVar[frozenset[type]] = frozenset({list, dict, set})
+
+    def __init__(self, copy: Callable[[any], any]):
+        self._copy = copy
+        # The variables when they were last copied (to detect rebinding).
+        self._variables: dict[str, any] = {}
+        self.copies: dict[str, any] = {}
+
+    def update(self, variables: dict[str, any]) -> dict[str, any]:
+        """Update the snapshot with the current variables and return their copies."""
+        copies = {}
+        for name, value in variables.items():
+            if name in self.copies and self.is_unchanged(
+                value, self._variables[name], self.copies[name]
+            ):
+                # Reuse the old copy (this also makes the difference check an identity check).
+                copies[name] = self.copies[name]
+            elif name in self.copies:
+                copies[name] = self.recopy(value, self.copies[name], set())
+            else:
+                copies[name] = self._copy(value)
+        self._variables = dict(variables)
+        self.copies = copies
+        return copies
+
+    def recopy(self, value: any, previous_copy: any, active: set[int]) -> any:
+        """
+        Copy a value that has changed, reusing the copies of the items that are unchanged.
+        This makes unchanged parts of containers identical in the differences (and avoids copying).
+        """
+        if not self.is_shareable(value, previous_copy) or id(value) in active:
+            return self._copy(value)
+        active.add(id(value))
+        if type(value) is dict:
+            copy = {}
+            for key, item in value.items():
+                copy[key] = self.recopy_item(item, previous_copy, key, active)
+        else:
+            copy = [
+                self.recopy_item(item, previous_copy, index, active)
+                for index, item in enumerate(value)
+            ]
+        active.remove(id(value))
+        return copy
+
+    def recopy_item(self, item: any, previous_copy: any, key: any, active: set[int]) -> any:
+        if type(previous_copy) is dict:
+            if key not in previous_copy:
+                return self._copy(item)
+        elif key >= len(previous_copy):
+            return self._copy(item)
+        previous_item = previous_copy[key]
+        if self.is_unchanged(item, previous_item, previous_item):
+            return previous_item
+        return self.recopy(item, previous_item, active)
+
+    @classmethod
+    def is_shareable(cls, value: any, previous_copy: any) -> bool:
+        """Check whether a container contains other containers that may be shared."""
+        if type(value) not in cls.SHARED_TYPES or type(previous_copy) is not type(value):
+            return False
+        items = previous_copy.values() if type(previous_copy) is dict else previous_copy
+        return type(next(iter(items), None)) in cls.MUTABLE_TYPES
+
+    @classmethod
+    def is_unchanged(cls, value: any, previous_value: any, previous_copy: any) -> bool:
+        """Decide whether `value` is unchanged since `previous_value` was copied to `previous_copy`."""
+        if value is previous_value and type(value) in IMMUTABLE_TYPES:
+            return True
+        if type(value) is not type(previous_copy):
+            return False
+        try:
+            # Comparing is much cheaper than copying (and does not allocate).
+            return bool(value == previous_copy)
+        except Exception:
+            return False
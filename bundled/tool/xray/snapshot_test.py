@@ -0,0 +1,106 @@
+import copy
+from typing import Callable
+
+import pytest
+
+from . import Snapshot
+from .conftest import GenericClass
+from .difference import Original
+
+
+class Unequal:
+    """Object that cannot be compared (like a numpy array)."""
+
+    def __eq__(self, other: object) -> bool:
+        raise ValueError("Comparison is ambiguous.")
+
+
+def test_snapshot_reuses_unchanged_copies():
+    snapshot = Snapshot(copy.deepcopy)
+    array = [1, 2, 3]
+    dictionary = {"a": [1]}
+    first = snapshot.update(dict(array=array, dictionary=dictionary, x=1))
+    second = snapshot.update(dict(array=array, dictionary=dictionary, x=1))
+    assert first["array"] is second["array"]
+    assert first["dictionary"] is second["dictionary"]
+    assert first["array"] is not array
+
+
+@pytest.mark.parametrize(
+    "before,mutate",
+    [
+        ([1, 2, 3], lambda x: x.append(4)),
+        ([1, 2, 3], lambda x: x.__setitem__(0, 4)),
+        ({"a": [1]}, lambda x: x["a"].append(2)),
+        ({1, 2}, lambda x: x.discard(1)),
+        (GenericClass(a=[1]), lambda x: x.a.append(2)),
+    ],
+)
+def test_snapshot_recopies_mutated_variables(before: any, mutate: Callable[[any], None]):
+    snapshot = Snapshot(copy.deepcopy)
+    first = snapshot.update(dict(x=before))
+    expected = copy.deepcopy(before)
+    mutate(before)
+    second = snapshot.update(dict(x=before))
+    assert first["x"] == expected
+    assert second["x"] == before
+    assert second["x"] is not before
+
+
+def test_snapshot_recopies_rebound_variables():
+    snapshot = Snapshot(copy.deepcopy)
+    snapshot.update(dict(x=[1], y=1))
+    copies = snapshot.update(dict(x=(1,), y="1"))
+    assert copies == dict(x=(1,), y="1")
+
+
+def test_snapshot_handles_incomparable_variables():
+    snapshot = Snapshot(copy.deepcopy)
+    value = Unequal()
+    first = snapshot.update(dict(x=value))
+    second = snapshot.update(dict(x=value))
+    assert first["x"] is not second["x"]
+
+
+def test_snapshot_handles_uncopyable_variables():
+    def copy_(value: any) -> any:
+        return Original(value)
+
+    snapshot = Snapshot(copy_)
+    value = object()
+    first = snapshot.update(dict(x=value))
+    second = snapshot.update(dict(x=value))
+    assert first["x"] == second["x"] == Original(value)
+
+
+def test_snapshot_drops_deleted_variables():
+    snapshot = Snapshot(copy.deepcopy)
+    snapshot.update(dict(x=1, y=2))
+    assert snapshot.update(dict(y=2)) == dict(y=2)
+
+
+def test_snapshot_shares_unchanged_items():
+    snapshot = Snapshot(copy.deepcopy)
+    value = {"a": [1], "b": {"c": [2], "d": [3]}, "e": [4]}
+    first = snapshot.update(dict(x=value))["x"]
+    value["b"]["c"].append(5)
+    del value["e"]
+    value["f"] = [6]
+    second = snapshot.update(dict(x=value))["x"]
+    assert second == value
+    assert second["a"] is first["a"]
+    assert second["b"]["d"] is first["b"]["d"]
+    assert second["b"]["c"] is not value["b"]["c"]
+    assert second["f"] is not value["f"]
+    assert first == {"a": [1], "b": {"c": [2], "d": [3]}, "e": [4]}
+
+
+def test_snapshot_shares_recursive_items():
+    snapshot = Snapshot(copy.deepcopy)
+    value = [[1]]
+    value.append(value)
+    first = snapshot.update(dict(x=value))["x"]
+    value[0].append(2)
+    second = snapshot.update(dict(x=value))["x"]
+    assert second[0] == [1, 2]
+    assert first[0] == [1]
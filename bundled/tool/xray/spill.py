@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import pickle
+import struct
+import tempfile
+from typing import Callable, ClassVar, Iterable
+
+from .difference import NoDifference, Observation, Representation
+
+
+class SpillFile:
+    """Append-only temporary file of observations (which are read back in order)."""
+
+    # Length of each record (before the pickled observation).
+    HEADER: ClassVar[struct.Struct] = struct.Struct("<I")
+
+    def __init__(self):
+        # The file is deleted when it is closed.
+        self._file = tempfile.TemporaryFile()
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def write(self, observations: Iterable[Observation]) -> None:
+        """Append observations to the file."""
+        self._file.seek(0, 2)
+        for observation in observations:
+            data = self.dumps(observation)
+            self._file.write(self.HEADER.pack(len(data)) + data)
+            self._count += 1
+
+    @staticmethod
+    def dumps(observation: Observation) -> bytes:
+        """Pickle an observation (storing values that cannot be pickled as summaries)."""
+        try:
+            return pickle.dumps(observation, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            ...
+        try:
+            summary = observation.map_values(Representation.summarize)
+            return pickle.dumps(summary, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Observations that still cannot be pickled are lost.
+            return pickle.dumps(NoDifference(), protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def loads(data: bytes) -> Observation:
+        """Unpickle an observation."""
+        try:
+            return pickle.loads(data)
+        except Exception:
+            # Values whose types can no longer be loaded are lost.
+            return NoDifference()
+
+    def __iter__(self) -> Iterable[Observation]:
+        """Read the observations back (one at a time)."""
+        for _, observation in self.read(lambda index: True):
+            yield observation
+
+    def read(self, wanted: Callable[[int], bool]) -> Iterable[tuple[int, Observation]]:
+        """Read back the observations with the wanted indices (skipping over the others)."""
+        self._file.flush()
+        position = 0
+        for index in range(self._count):
+            self._file.seek(position)
+            (length,) = self.HEADER.unpack(self._file.read(self.HEADER.size))
+            position += self.HEADER.size + length
+            if wanted(index):
+                yield index, self.loads(self._file.read(length))
+
+    def close(self) -> None:
+        self._file.close()
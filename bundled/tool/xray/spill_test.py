@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+from .difference import Add, Edit, NoDifference, Representation
+from .spill import SpillFile
+
+
+def test_spill_file_round_trip():
+    observations = [Edit("a", 1, 2), Add("b", [1, 2, 3]), NoDifference()]
+    spill = SpillFile()
+    spill.write(observations[:2])
+    assert list(spill) == observations[:2]
+    # Writing after reading appends to the file.
+    spill.write(observations[2:])
+    assert len(spill) == 3
+    assert list(spill) == observations
+    spill.close()
+
+
+def test_spill_file_skips_unwanted_observations(monkeypatch):
+    spill = SpillFile()
+    spill.write([Add("a", i) for i in range(5)])
+    loaded = []
+    monkeypatch.setattr(
+        SpillFile, "loads", staticmethod(lambda data: loaded.append(data) or Add("a", 0))
+    )
+    assert [index for index, _ in spill.read(lambda index: index % 2 == 1)] == [1, 3]
+    assert len(loaded) == 2
+    spill.close()
+
+
+@pytest.mark.parametrize("value", [threading.Lock(), lambda: None])
+def test_spill_file_summarizes_unpicklable_values(value):
+    spill = SpillFile()
+    spill.write([Add("a", value)])
+    [observation] = spill
+    assert isinstance(observation.value, Representation)
+    spill.close()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import json
+import os.path
+import time
+from collections import defaultdict
+from typing import ClassVar, Iterator, Optional, Self
+
+from .annotation import Metadata
+
+
+class Stats:
+    """
+    Time spent in each phase of annotating and counts of the work done (for finding regressions).
+    Phases can be nested (so times include any phases inside them).
+    """
+
+    _current: ClassVar[contextvars.ContextVar[Optional[Stats]]] = contextvars.ContextVar(
+        "stats", default=None
+    )
+
+    def __init__(self):
+        self.phases: dict[str, float] = defaultdict(float)
+        self.counters: dict[str, int] = defaultdict(int)
+        self._tokens: list[contextvars.Token] = []
+
+    @classmethod
+    def current(cls) -> Stats:
+        """The stats being collected (or new stats that are not reported)."""
+        stats = cls._current.get()
+        if stats is None:
+            return cls()
+        return stats
+
+    def __enter__(self) -> Self:
+        """Collect stats in this context (and thread)."""
+        self._tokens.append(self._current.set(self))
+        return self
+
+    def __exit__(self, *exc_info: any) -> None:
+        self._current.reset(self._tokens.pop())
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Add the time taken in this context to a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """Add time to a phase (for timing code that runs too often for a context manager)."""
+        self.phases[name] += seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def to_json(self) -> Metadata:
+        return {"phases": dict(self.phases), "counters": dict(self.counters)}
+
+    def log(self, filepath: str, **fields: any) -> None:
+        """Append the stats (and any extra fields) to a JSONL file."""
+        directory = os.path.dirname(os.path.abspath(filepath))
+        os.makedirs(directory, exist_ok=True)
+        record = {"time": time.time(), **fields, **self.to_json()}
+        with open(filepath, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
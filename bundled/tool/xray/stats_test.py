@@ -0,0 +1,69 @@
+import json
+import os.path
+
+import pytest
+
+from . import ProjectConfig, Stats, TraceDebugger
+from .debugger_test import trace
+
+
+def test_stats_phases_and_counters():
+    stats = Stats()
+    with stats.phase("outer"):
+        with stats.phase("inner"):
+            ...
+    with stats.phase("inner"):
+        ...
+    stats.count("things")
+    stats.count("things", 2)
+    stats.add_time("extra", 1.5)
+
+    result = stats.to_json()
+    assert result["counters"] == {"things": 3}
+    assert set(result["phases"]) == {"outer", "inner", "extra"}
+    assert result["phases"]["extra"] == 1.5
+    assert all(time >= 0 for time in result["phases"].values())
+
+
+def test_stats_context():
+    outer = Stats.current()
+    with Stats() as stats:
+        assert Stats.current() is stats
+        with Stats.current() as inner:
+            assert inner is stats
+        assert Stats.current() is stats
+    assert Stats.current() is not stats
+    assert Stats.current() is not outer
+
+
+def test_stats_log(tmp_path):
+    filepath = os.path.join(tmp_path, "logs", "stats.jsonl")
+    stats = Stats()
+    stats.count("things")
+    stats.log(filepath, test="test")
+    stats.log(filepath, test="test")
+    with open(filepath) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 2
+    assert records[0]["test"] == "test"
+    assert records[0]["counters"] == {"things": 1}
+
+
+@pytest.mark.parametrize("detailed", [False, True])
+def test_debugger_stats(tmp_path, detailed):
+    config = ProjectConfig(stats_log=str(tmp_path / "stats.jsonl") if detailed else None)
+    with Stats() as stats:
+        debugger = trace(
+            TraceDebugger, "tests/quicksort.py", 4, "sort", [3, 1, 4, 1, 5, 9, 2, 6], config=config
+        )
+        debugger.get_annotations()
+    counters = stats.to_json()["counters"]
+    assert counters["snapshots"] > 0
+    assert counters["copies"] > 0
+    assert counters["observations"] == len(debugger.observations)
+    assert {"annotations", "read"} <= set(stats.phases)
+    # Each copy and difference is only measured when the stats are logged.
+    assert ("copied_bytes" in counters) == detailed
+    assert ({"copy", "difference"} <= set(stats.phases)) == detailed
+    if detailed:
+        assert counters["copied_bytes"] > 0
@@ -5,12 +5,16 @@ from typing import Literal, Optional
 
 import pytest
 
-from .annotation import Annotations
-from .debugger import Debugger
+from .debugger import Tracer
+from .stats import Stats
 
 
 class TestFilter:
-    def __init__(self, test_name: Optional[str] = None, debugger: Optional[Debugger] = None):
+    def __init__(
+        self,
+        test_name: Optional[str] = None,
+        debugger: Optional[Tracer] = None,
+    ):
         if test_name is None:
             self.test_name = None
         else:
@@ -51,14 +55,22 @@ class TestFilter:
         plugin.collect_tests()
         return plugin.tests
 
+    @pytest.hookimpl(wrapper=True)
+    def pytest_collection(self, session: pytest.Session):
+        with Stats.current().phase("collection"):
+            return (yield)
+
     @pytest.hookimpl(wrapper=True, tryfirst=True)
     def pytest_runtest_call(self, item: pytest.Item):
         if self.debugger is not None:
             self.debugger.set_trace()
-        result = yield
-        if self.debugger is not None:
-            self.debugger.set_quit()
-        return result
+        try:
+            with Stats.current().phase("tracing"):
+                return (yield)
+        finally:
+            # Stop tracing even if the test fails (or is aborted).
+            if self.debugger is not None:
+                self.debugger.set_quit()
 
     def pytest_runtest_logreport(self, report: pytest.TestReport):
         if report.when == "call":
@@ -72,7 +84,8 @@ class TestFilter:
         pytest.main("--ignore=xray".split(), plugins=[self])
 
     @classmethod
-    def run_test(cls, debugger: Debugger, test_name: str) -> tuple[bool, Annotations]:
+    def run_test(cls, debugger: Tracer, test_name: str) -> Optional[bool]:
+        """Run a test with the debugger attached and return whether it passed."""
         plugin = cls(test_name=test_name, debugger=debugger)
         plugin.collect_and_run_test()
-        return plugin.status, debugger.get_annotations()
+        return plugin.status
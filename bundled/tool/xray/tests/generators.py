@@ -0,0 +1,16 @@
+def steps(n):
+    total = 0
+    for i in range(n):
+        total += i
+        yield total
+    return total
+
+
+def run_steps(n):
+    return list(steps(n))
+
+
+def close_steps(n):
+    generator = steps(n)
+    next(generator)
+    generator.close()
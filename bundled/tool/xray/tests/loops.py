@@ -0,0 +1,31 @@
+def spin():
+    i = 0
+    while True:
+        i += 1
+
+
+def step(i):
+    return i + 1
+
+
+def call_steps(n):
+    for i in range(n):
+        step(i)
+
+
+def spin_after_step():
+    step(0)
+    i = 0
+    while True:
+        i += 1
+
+
+def identity(i):
+    return i
+
+
+def spin_calling_step():
+    step(0)
+    i = 0
+    while True:
+        i = identity(i)
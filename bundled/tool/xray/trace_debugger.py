@@ -0,0 +1,66 @@
+import sys
+from typing import Callable, Optional
+
+from .debugger import GENERATOR_AND_COROUTINE_FLAGS, Debugger
+
+
+class TraceDebugger(Debugger):
+    """Debugger that uses `sys.settrace` but only traces lines of frames that can be the target."""
+
+    def set_trace(self) -> None:
+        # Cache of whether to trace code objects (keyed by id as code equality ignores filenames).
+        self._code_cache: dict[int, tuple["code", bool]] = {}
+        self.start_watchdog(self.interrupt)
+        sys.settrace(self.trace_call)
+
+    def set_quit(self) -> None:
+        sys.settrace(None)
+        self.stop_watchdog()
+
+    def should_trace(self, code) -> bool:
+        """Check (with caching) whether frames of this code need line events."""
+        try:
+            _, should_trace = self._code_cache[id(code)]
+        except KeyError:
+            should_trace = self.may_contain_target(code)
+            self._code_cache[id(code)] = (code, should_trace)
+        return should_trace
+
+    def trace_call(self, frame, event: str, argument: any) -> Optional[Callable]:
+        """Global trace function (only called for "call" events)."""
+        if self.finished:
+            # All calls have been recorded so no other frame is relevant.
+            return None
+        if not self.should_trace(frame.f_code):
+            return None
+        self.user_call(frame, None)
+        return self.trace_frame
+
+    def interrupt(self, frame) -> None:
+        """Trace the lines of the running frames (called by the watchdog at the deadline)."""
+        while frame is not None:
+            frame.f_trace = self.trace_deadline
+            frame = frame.f_back
+
+    def trace_deadline(self, frame, event: str, argument: any) -> Optional[Callable]:
+        """Local trace function of the frames that run at the deadline."""
+        self.check_deadline()
+        return self.trace_deadline
+
+    def trace_frame(self, frame, event: str, argument: any) -> Optional[Callable]:
+        """Local trace function for frames that can be the target."""
+        match event:
+            case "line":
+                self.user_line(frame)
+            case "return":
+                self.user_return(frame, argument)
+            case "exception":
+                # Skip the internal `StopIteration` from `yield from` (like `bdb`).
+                exception, _, traceback = argument
+                if not (
+                    frame.f_code.co_flags & GENERATOR_AND_COROUTINE_FLAGS
+                    and exception is StopIteration
+                    and traceback is None
+                ):
+                    self.user_exception(frame, argument)
+        return self.trace_frame
@@ -1,3 +1,4 @@
+from .bounded_repr import BoundedRepr
 from .config import Config
 from .line_number import LineNumber
 from .position import Position
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import collections
+import reprlib
+import sys
+from typing import Callable, ClassVar, Iterable, Optional
+
+
+class LimitedRepr(reprlib.Repr):
+    """Representation with limits on the number of items and the length (for any other types)."""
+
+    def __init__(self, max_length: int):
+        super().__init__()
+        self.maxtuple = self.maxlist = self.maxarray = self.maxdeque = max_length
+        self.maxset = self.maxfrozenset = self.maxdict = max_length
+        # Shortened representations keep the first `max_length` characters and the last one.
+        self.maxstring = self.maxother = self.maxlong = 2 * max_length + 3
+
+
+class BoundedRepr:
+    """
+    Representation that stops once it is longer than a limit (so huge values are cheap to show).
+    Long representations start with the first `max_length` characters of the full representation
+    and end with its last character (such as the closing bracket).
+    Objects with their own `__repr__` are still represented in full before they are shortened.
+    Representations of values that cannot change are cached until the cache is cleared.
+    """
+
+    MAX_CACHE_SIZE: ClassVar[int] = 10_000
+    # Types whose values cannot change (and whose representations can be long).
+    CACHED_TYPES: ClassVar[frozenset[type]] = frozenset({str, bytes, int})
+
+    class Full(Exception):
+        """Raised when the representation reaches the limit."""
+
+    # Brackets of the containers that are represented item by item (including subclasses that do
+    # not override `__repr__`).
+    BRACKETS: ClassVar[dict[type, tuple[str, str]]] = {
+        list: ("[", "]"),
+        tuple: ("(", ")"),
+        set: ("{", "}"),
+        frozenset: ("{", "}"),
+        dict: ("{", "}"),
+        collections.deque: ("[", "]"),
+        collections.defaultdict: ("{", "}"),
+        collections.Counter: ("{", "}"),
+        # Represented as a list of pairs before Python 3.12.
+        collections.OrderedDict: ("{", "}") if sys.version_info >= (3, 12) else ("[", "]"),
+    }
+    # Containers whose representation starts with the name of the type (such as `deque([])`).
+    NAMED: ClassVar[frozenset[type]] = frozenset(
+        {
+            frozenset,
+            collections.deque,
+            collections.defaultdict,
+            collections.Counter,
+            collections.OrderedDict,
+        }
+    )
+    # Containers that are represented by their type (such as `set()`) when they are empty.
+    EMPTY_NAMED: ClassVar[frozenset[type]] = frozenset(
+        {set, frozenset, collections.Counter, collections.OrderedDict}
+    )
+    # Mappings whose items are represented as tuples.
+    TUPLE_ITEMS: ClassVar[frozenset[type]] = frozenset(
+        {collections.OrderedDict} if sys.version_info < (3, 12) else ()
+    )
+    _CONTAINERS: ClassVar[dict[Callable, type]] = {base.__repr__: base for base in BRACKETS}
+
+    def __init__(self, max_length: int):
+        self.max_length = max_length
+        # Map from ids to the value (to keep the id valid) and its representation.
+        self._cache: dict[int, tuple[any, str]] = {}
+        # Representation of the types that are not represented item by item.
+        self._limited_repr = LimitedRepr(max_length)
+
+    def repr(self, value: any) -> str:
+        if type(value) not in self.CACHED_TYPES:
+            # Other values (such as objects that could not be copied) may change.
+            return self.bounded_repr(value)
+        try:
+            cached_value, text = self._cache[id(value)]
+            if cached_value is value:
+                return text
+        except KeyError:
+            ...
+        text = self.bounded_repr(value)
+        if len(self._cache) >= self.MAX_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[id(value)] = (value, text)
+        return text
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def bounded_repr(self, value: any) -> str:
+        """Represent a value without caching."""
+        parts: list[str] = []
+        length = 0
+
+        def write(text: str) -> None:
+            nonlocal length
+            parts.append(text)
+            length += len(text)
+            if length > self.max_length:
+                raise self.Full()
+
+        try:
+            self.write_repr(value, write, set())
+        except self.Full:
+            text = "".join(parts)
+            return text[: self.max_length + 1] + self.last_character(value, text)
+        return "".join(parts)
+
+    def last_character(self, value: any, text: str) -> str:
+        """Last character of the full representation of a value (whose start is `text`)."""
+        if type(value) in (str, bytes):
+            return self.quote(value)
+        brackets = self.brackets(value)
+        if brackets is not None and len(value) > 0:
+            return brackets[1][-1]
+        # Other values are written at once.
+        return text[-1]
+
+    def brackets(self, value: any) -> Optional[tuple[str, str]]:
+        """Brackets around the items of a container (`None` if it is not represented item by item)."""
+        base = self._CONTAINERS.get(type(value).__repr__)
+        if base is None:
+            return None
+        opening, closing = self.BRACKETS[base]
+        name = type(value).__name__
+        if base in self.NAMED or (base is set and type(value) is not set):
+            opening, closing = f"{name}({opening}", f"{closing})"
+        if base is collections.defaultdict:
+            opening = f"{name}({self._limited_repr.repr(value.default_factory)}, {{"
+        elif base is collections.deque and value.maxlen is not None:
+            closing = f"], maxlen={value.maxlen})"
+        return opening, closing
+
+    def items(self, value: any) -> Iterable[any]:
+        """Items of a container in the order they are represented (pairs for mappings)."""
+        if isinstance(value, collections.Counter):
+            # Only the most common items can fit.
+            return value.most_common(self.max_length)
+        if isinstance(value, dict):
+            return value.items()
+        return value
+
+    @staticmethod
+    def quote(value: str | bytes) -> str:
+        """Quote that `repr` uses for a string (without representing it)."""
+        single, double = ("'", '"') if isinstance(value, str) else (b"'", b'"')
+        return '"' if single in value and double not in value else "'"
+
+    def write_repr(self, value: any, write: Callable[[str], None], active: set[int]) -> None:
+        """Write the representation of a value in parts (until `write` raises `Full`)."""
+        if type(value) in (str, bytes):
+            if len(value) > self.max_length:
+                # Represent enough of the value to reach the limit.
+                single, double = ("'", '"') if isinstance(value, str) else (b"'", b'"')
+                # Add a quote that makes `repr` use the same quotes as for the full value.
+                head = value[: self.max_length + 1] + (
+                    single if self.quote(value) == '"' else double
+                )
+                write(repr(head))
+            write(repr(value))
+            return
+        brackets = self.brackets(value)
+        if brackets is None:
+            write(self._limited_repr.repr(value))
+            return
+        base = self._CONTAINERS[type(value).__repr__]
+        if len(value) == 0 and base in self.EMPTY_NAMED:
+            write(repr(value))
+            return
+        opening, closing = brackets
+        if id(value) in active:
+            # Recursive reference.
+            write(f"{opening}...{closing}")
+            return
+        active.add(id(value))
+        write(opening)
+        pairs = isinstance(value, dict) and base not in self.TUPLE_ITEMS
+        for i, item in enumerate(self.items(value)):
+            if i > 0:
+                write(", ")
+            if pairs:
+                key, item = item
+                self.write_repr(key, write, active)
+                write(": ")
+            self.write_repr(item, write, active)
+        if type(value) is tuple and len(value) == 1:
+            write(",")
+        write(closing)
+        active.discard(id(value))
@@ -0,0 +1,84 @@
+import array
+import collections
+from typing import Any
+
+import pytest
+
+from . import BoundedRepr
+
+
+class LongRepr:
+    def __repr__(self) -> str:
+        return "LongRepr(" + "x" * 1000 + ")"
+
+
+class Items(dict):
+    """Subclass that is represented like `dict`."""
+
+
+class Steps(collections.deque):
+    """Subclass that is represented like `deque` (with its own name)."""
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        1,
+        "a" * 10,
+        "a" * 1000,
+        "it's" * 100,
+        b"\x00" * 1000,
+        [],
+        set(),
+        (1,),
+        frozenset({1}),
+        list(range(1000)),
+        [[i] * 100 for i in range(100)],
+        {i: str(i) * 100 for i in range(100)},
+        LongRepr(),
+        collections.deque(range(1000)),
+        10**200,
+        collections.deque(range(1000), maxlen=5),
+        collections.defaultdict(list, {i: [i] for i in range(100)}),
+        collections.OrderedDict((i, str(i)) for i in range(100)),
+        collections.OrderedDict(),
+        collections.Counter("mississippi" * 100),
+        collections.Counter(),
+        Items({i: i for i in range(100)}),
+        Steps(range(100)),
+    ],
+)
+@pytest.mark.parametrize("max_length", [1, 10, 50])
+def test_bounded_repr(value: Any, max_length: int):
+    full = repr(value)
+    representation = BoundedRepr(max_length).repr(value)
+    if len(full) <= max_length:
+        assert representation == full
+    else:
+        assert len(representation) <= max_length + 2
+        assert representation[:max_length] == full[:max_length]
+        assert representation[-1] == full[-1]
+
+
+def test_bounded_repr_cache():
+    bounded_repr = BoundedRepr(10)
+    text = "a" * 100
+    assert bounded_repr.repr(text) is bounded_repr.repr(text)
+    assert len(bounded_repr._cache) == 1
+    # Values that can change are represented again.
+    value = [1, 2, 3]
+    assert bounded_repr.repr(value) == "[1, 2, 3]"
+    value.append(4)
+    assert bounded_repr.repr(value) == "[1, 2, 3, 4]"
+    assert len(bounded_repr._cache) == 1
+    bounded_repr.clear()
+    assert len(bounded_repr._cache) == 0
+
+
+def test_bounded_repr_limits_other_types():
+    # Items of containers that are not represented item by item are limited (like `reprlib`).
+    representation = BoundedRepr(10).repr(array.array("i", range(1_000_000)))
+    assert representation == "array('i', )"
+    # Subclasses of the containers are represented item by item.
+    representation = BoundedRepr(10).repr(Steps(range(1_000_000)))
+    assert representation == "Steps([0, 1)"
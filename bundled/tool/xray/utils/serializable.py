@@ -12,6 +12,8 @@ class Serializable:
             ...
         if isinstance(object, dict):
             return {key: cls.serialize(value) for key, value in object.items()}
+        if isinstance(object, list):
+            return [cls.serialize(value) for value in object]
         try:
             return {key: cls.serialize(value) for key, value in vars(object).items()}
         except TypeError:
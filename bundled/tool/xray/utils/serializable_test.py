@@ -41,3 +41,9 @@ def test_serialize_non_serializable():
     obj = [1, 2, 3]
     expected_output = [1, 2, 3]
     assert Serializable.serialize(obj) == expected_output
+
+
+def test_serialize_list():
+    obj = [SimpleSerializable(1, 2), [SimpleSerializable(3, 4)]]
+    expected_output = [{"x": 1, "y": 2}, [{"x": 3, "y": 4}]]
+    assert Serializable.serialize(obj) == expected_output
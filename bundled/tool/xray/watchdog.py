@@ -0,0 +1,42 @@
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+
+class Watchdog:
+    """
+    Interrupt the thread that started the watchdog once a deadline passes (from another thread).
+    `interrupt` is called with the frame that the thread is running (so that the tracing backend
+    can make it check the deadline even if the code is not traced).
+    """
+
+    def __init__(self, deadline: float, interrupt: Callable[["frame"], None]):
+        self.deadline = deadline
+        self._interrupt = interrupt
+        self._thread_id: Optional[int] = None
+        self._timer: Optional[threading.Timer] = None
+        # Prevents interrupting after the watchdog is stopped.
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start waiting for the deadline (in the thread that will be interrupted)."""
+        self._thread_id = threading.get_ident()
+        self._timer = threading.Timer(max(self.deadline - time.monotonic(), 0), self.fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def fire(self) -> None:
+        """Interrupt the thread (called by the timer at the deadline)."""
+        with self._lock:
+            if self._timer is None:
+                return
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self._interrupt(frame)
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
@@ -0,0 +1,32 @@
+import threading
+import time
+
+from .watchdog import Watchdog
+
+
+def test_watchdog_interrupts_running_frame():
+    interrupted = threading.Event()
+    names = []
+
+    def interrupt(frame) -> None:
+        while frame is not None:
+            names.append(frame.f_code.co_name)
+            frame = frame.f_back
+        interrupted.set()
+
+    watchdog = Watchdog(time.monotonic() + 0.05, interrupt)
+    watchdog.start()
+    # Busy wait (the frame of this test is running at the deadline).
+    while not interrupted.is_set():
+        ...
+    watchdog.stop()
+    assert "test_watchdog_interrupts_running_frame" in names
+
+
+def test_watchdog_stopped_before_deadline():
+    frames = []
+    watchdog = Watchdog(time.monotonic() + 0.05, frames.append)
+    watchdog.start()
+    watchdog.stop()
+    time.sleep(0.1)
+    assert frames == []
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import itertools
+from typing import ClassVar, Optional
+
+from .annotation import Annotations
+
+# Entries of a block (timeslices and the number of iterations elided before them) in order.
+Entries = list[tuple[str, any]]
+
+
+class Windows:
+    """
+    Iterations of the blocks of the last annotations, which are sent a window at a time.
+    Each block is first sent with its first iterations and a `pending_` entry (with a handle and the
+    number of iterations left), which is replaced by the next window when the user asks for it.
+    At least one iteration of each block is sent (so that the lines of the block are known).
+    """
+
+    WINDOW_SIZE: ClassVar[int] = 20  # Number of iterations of each block sent at once.
+    BLOCK_KEY: ClassVar[str] = "block_"
+    ELIDED_KEY: ClassVar[str] = "elided_"
+    PENDING_KEY: ClassVar[str] = "pending_"
+
+    # Distinguishes handles from different annotations.
+    _generations: ClassVar[itertools.count] = itertools.count()
+
+    def __init__(self, window_size: Optional[int] = None):
+        self._generation = next(self._generations)
+        self.window_size = self.WINDOW_SIZE if window_size is None else window_size
+        if self.window_size < 1:
+            raise ValueError(f"Window size must be positive (not {self.window_size}).")
+        # Entries of the blocks that were not sent at once.
+        self._blocks: list[Entries] = []
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def skeleton(self, timeslice: Annotations) -> Annotations:
+        """Copy the annotations with only the first window of iterations of each block."""
+        return {
+            key: self.window(list(value.items())) if key.startswith(self.BLOCK_KEY) else value
+            for key, value in timeslice.items()
+        }
+
+    def window(
+        self,
+        entries: Entries,
+        start: int = 0,
+        size: Optional[int] = None,
+        handle: Optional[str] = None,
+    ) -> dict[str, any]:
+        """Skeleton of the next `size` iterations of a block (from entry `start`)."""
+        if size is None:
+            size = self.window_size
+        if size < 1:
+            raise ValueError(f"Window size must be positive (not {size}).")
+        window = {}
+        count = 0
+        index = start
+        while index < len(entries) and count < size:
+            key, value = entries[index]
+            if key.startswith(self.ELIDED_KEY):
+                window[key] = value
+            else:
+                window[key] = self.skeleton(value)
+                count += 1
+            index += 1
+        if index < len(entries):
+            if handle is None:
+                handle = f"{self._generation}:{len(self._blocks)}"
+                self._blocks.append(entries)
+            window[f"{self.PENDING_KEY}{index}"] = {
+                "handle": handle,
+                "start": index,
+                "count": sum(not key.startswith(self.ELIDED_KEY) for key, _ in entries[index:]),
+            }
+        return window
+
+    def fetch(self, handle: str, start: int, size: Optional[int] = None) -> dict[str, any]:
+        """Skeleton of the iterations (from entry `start`) of the block with this handle."""
+        generation, _, index = handle.partition(":")
+        try:
+            if int(generation) != self._generation:
+                raise ValueError()
+            entries = self._blocks[int(index)]
+        except (ValueError, IndexError):
+            raise KeyError(f"Unknown block {handle!r} (the annotations may have been replaced).")
+        if not 0 <= start < len(entries):
+            raise ValueError(f"Entry {start} does not exist (there are {len(entries)} entries).")
+        return self.window(entries, start, size, handle)
@@ -0,0 +1,83 @@
+import pytest
+
+from .windows import Windows
+
+
+def block(n: int, elided: dict[int, int] = {}) -> dict[str, any]:
+    """Block with `n` iterations (each with a line) and the iterations elided before some of them."""
+    entries = {}
+    for time in range(1, n + 1):
+        if time in elided:
+            entries[f"elided_{time}"] = elided[time]
+        entries[f"timestamp_{time}"] = {"line_1": time}
+    return entries
+
+
+def test_small_blocks_are_sent_at_once():
+    annotations = {"line_0": 0, "block_0": block(3)}
+    windows = Windows(window_size=3)
+    assert windows.skeleton(annotations) == annotations
+    assert len(windows) == 0
+
+
+def test_windows():
+    annotations = {"block_0": block(5, elided={4: 10})}
+    windows = Windows(window_size=2)
+    skeleton = windows.skeleton(annotations)
+    pending = {"handle": skeleton["block_0"]["pending_2"]["handle"], "start": 2, "count": 3}
+    assert skeleton == {"block_0": {**block(2), "pending_2": pending}}
+    assert len(windows) == 1
+
+    # Elided iterations are sent with the iteration after them.
+    window = windows.fetch(pending["handle"], 2)
+    assert window == {
+        "timestamp_3": {"line_1": 3},
+        "elided_4": 10,
+        "timestamp_4": {"line_1": 4},
+        "pending_5": {**pending, "start": 5, "count": 1},
+    }
+    assert windows.fetch(pending["handle"], 5) == {"timestamp_5": {"line_1": 5}}
+    assert windows.fetch(pending["handle"], 2, size=1) == {
+        "timestamp_3": {"line_1": 3},
+        "pending_3": {**pending, "start": 3, "count": 2},
+    }
+
+
+def test_nested_windows():
+    inner = block(3)
+    annotations = {"block_0": {"timestamp_1": {"block_1": inner}, "timestamp_2": {}}}
+    windows = Windows(window_size=1)
+    skeleton = windows.skeleton(annotations)
+    outer_pending = skeleton["block_0"].pop("pending_1")
+    inner_pending = skeleton["block_0"]["timestamp_1"]["block_1"].pop("pending_1")
+    assert skeleton == {"block_0": {"timestamp_1": {"block_1": block(1)}}}
+    assert outer_pending["handle"] != inner_pending["handle"]
+    assert windows.fetch(outer_pending["handle"], 1) == {"timestamp_2": {}}
+
+
+@pytest.mark.parametrize("window_size", [0, -1])
+def test_empty_windows(window_size: int):
+    with pytest.raises(ValueError):
+        Windows(window_size)
+    windows = Windows(window_size=1)
+    handle = windows.skeleton({"block_0": block(2)})["block_0"]["pending_1"]["handle"]
+    with pytest.raises(ValueError):
+        windows.fetch(handle, 1, size=window_size)
+
+
+@pytest.mark.parametrize("handle", ["", "x", "0", "0:0:0"])
+def test_unknown_windows(handle: str):
+    windows = Windows()
+    with pytest.raises(KeyError):
+        windows.fetch(handle, 0)
+
+
+def test_stale_windows():
+    old_windows = Windows(window_size=1)
+    handle = old_windows.skeleton({"block_0": block(2)})["block_0"]["pending_1"]["handle"]
+    new_windows = Windows(window_size=1)
+    new_windows.skeleton({"block_0": block(2)})
+    with pytest.raises(KeyError):
+        new_windows.fetch(handle, 1)
+    with pytest.raises(ValueError):
+        old_windows.fetch(handle, 2)
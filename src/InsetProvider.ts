@@ -1,15 +1,25 @@
 import * as vscode from 'vscode';
 import { JSDOM } from 'jsdom';
-import { traceLog } from './common/log/logging';
+import { traceError, traceLog } from './common/log/logging';
+import { loadServerDefaults } from './common/setup';
 
 type AnnotationResult = {
     result: boolean;
     annotations: Annotations;
+    metadata?: { [key: string]: unknown };
 };
 
 type AnnotationPart = {
     text: string;
+    // Preview of the tooltip (the full tooltip is fetched with the handle when the user hovers).
     hover: string | undefined;
+    handle?: string;
+};
+
+type HoverPage = {
+    text: string;
+    page: number;
+    pages: number;
 };
 
 type Annotation = AnnotationPart[];
@@ -31,7 +41,16 @@ type LineAnnotation = {
 };
 
 type Block = {
-    [timeslice: string]: TimeSlice;
+    // Timeslices are keyed by `timestamp_` (or `call_` for separate calls), the number of skipped iterations by
+    // `elided_` and the iterations that have not been sent yet by `pending_`.
+    [timeslice: string]: TimeSlice | number | Pending;
+};
+
+// Iterations of a block that are fetched from the server (starting at entry `start` of the block).
+type Pending = {
+    handle: string;
+    start: number;
+    count: number;
 };
 
 type Line = {
@@ -55,7 +74,43 @@ export class AnnotationInsetProvider implements vscode.Disposable {
     static readonly timestampKey = 'timestamp_';
     static readonly lineKey = 'line_';
     static readonly blockKey = 'block_';
+    static readonly elidedKey = 'elided_';
+    static readonly pendingKey = 'pending_';
     private nextBlockId: number = 0;
+    // Blocks with iterations that have not been fetched (by handle).
+    private pendingBlocks: { [handle: string]: Block } = {};
+    // Fetch the full tooltips when hovering (and the next page when clicking) and more iterations when clicking.
+    static readonly hoverScript = `<script>
+const vscode = acquireVsCodeApi();
+const pages = {};
+const request = (element, page) => {
+    pages[element.dataset.handle] = page;
+    vscode.postMessage({ handle: element.dataset.handle, page: page });
+};
+document.addEventListener('mouseover', (event) => {
+    const element = event.target.closest('[data-handle]');
+    if (element && !(element.dataset.handle in pages)) {
+        request(element, 0);
+    }
+});
+document.addEventListener('click', (event) => {
+    const element = event.target.closest('[data-pages]');
+    if (element) {
+        request(element, (pages[element.dataset.handle] + 1) % Number(element.dataset.pages));
+    }
+    const pending = event.target.closest('[data-window]');
+    if (pending) {
+        vscode.postMessage({ window: pending.dataset.window, start: Number(pending.dataset.start) });
+    }
+});
+window.addEventListener('message', (event) => {
+    const hover = event.data;
+    for (const element of document.querySelectorAll(\`[data-handle="\${hover.handle}"]\`)) {
+        element.title = hover.pages > 1 ? \`\${hover.text}\\n(page \${hover.page + 1} of \${hover.pages}, click for the next page)\` : hover.text;
+        element.dataset.pages = hover.pages;
+    }
+});
+</script>`;
 
     constructor() {}
     dispose() {
@@ -65,7 +120,9 @@ export class AnnotationInsetProvider implements vscode.Disposable {
     private _onInsetRefreshRequest(data: AnnotationResult) {
         const result = data.result;
         const window = vscode.window;
-        if (result === true) {
+        if (data.metadata?.partial === true) {
+            window.showWarningMessage('Time limit reached (annotations are incomplete).');
+        } else if (result === true) {
             window.showInformationMessage('Test passed.');
         } else if (result === false) {
             window.showErrorMessage('Test failed.');
@@ -73,6 +130,7 @@ export class AnnotationInsetProvider implements vscode.Disposable {
             window.showWarningMessage('Test not run.');
         }
         this.annotations = data.annotations;
+        this.pendingBlocks = {};
         this.updateInsets();
     }
 
@@ -143,6 +201,16 @@ export class AnnotationInsetProvider implements vscode.Disposable {
         // Create inset.
         const height = 1;
         const inset = vscode.window.createWebviewTextEditorInset(editor, line.position.line, height);
+        inset.webview.options = { enableScripts: true };
+        inset.webview.onDidReceiveMessage(
+            (message: { handle: string; page: number } | { window: string; start: number }) => {
+                if ('window' in message) {
+                    this.resolveWindow(message.window, message.start);
+                } else {
+                    this.resolveHover(inset, message.handle, message.page);
+                }
+            },
+        );
 
         // Get the current editor font size + family.
         const editorConfig = vscode.workspace.getConfiguration('editor');
@@ -155,17 +223,71 @@ export class AnnotationInsetProvider implements vscode.Disposable {
         )}</span><span style="position:absolute;white-space:nowrap">`;
         // Create the HTML.
         const lineHTML = this.removeDuplicateBlocks(line.html);
-        inset.webview.html = style + spaceElement + lineHTML;
+        inset.webview.html = style + spaceElement + lineHTML + AnnotationInsetProvider.hoverScript;
         return inset;
     }
+    /**
+     * Fetch a page of a tooltip from the server and send it to the inset.
+     */
+    private async resolveHover(inset: Inset, handle: string, page: number): Promise<void> {
+        const serverId = loadServerDefaults().module;
+        try {
+            const hover = await vscode.commands.executeCommand<HoverPage>(`${serverId}.hover`, {
+                handle: handle,
+                page: page,
+            });
+            inset.webview.postMessage({ handle: handle, ...hover });
+        } catch (error) {
+            // The annotations may have been replaced.
+            traceError('Unable to fetch tooltip:', error);
+        }
+    }
+
+    /**
+     * Fetch the next iterations of a block from the server and show them.
+     */
+    private async resolveWindow(handle: string, start: number): Promise<void> {
+        const serverId = loadServerDefaults().module;
+        const block = this.pendingBlocks[handle];
+        const key = AnnotationInsetProvider.pendingKey + start;
+        if (!block || !(key in block)) {
+            // The iterations have already been fetched.
+            return;
+        }
+        try {
+            const window = await vscode.commands.executeCommand<Block>(`${serverId}.window`, {
+                handle: handle,
+                start: start,
+            });
+            if (this.pendingBlocks[handle] !== block || !(key in block)) {
+                return;
+            }
+            // Replace the pending iterations (which are always last) with the window.
+            delete block[key];
+            Object.assign(block, window);
+            this.updateInsets();
+        } catch (error) {
+            // The annotations may have been replaced.
+            traceError('Unable to fetch iterations:', error);
+        }
+    }
 
     private renderBlock(block: Block, depth: number): LineRender {
         let lines: LineRender = {};
-        let blockHTML = '';
-        for (const [_, timeslice] of Object.entries(block)) {
-            // Render each timeslice.
-            const newLines = this.renderTimeslice(timeslice, depth);
-            let timesliceHTML = '';
+        // Render each timeslice (elided iterations are rendered once all lines are known).
+        const columns: (LineRender | number | Pending)[] = [];
+        for (const [key, timeslice] of Object.entries(block)) {
+            if (key.startsWith(AnnotationInsetProvider.elidedKey)) {
+                columns.push(timeslice as number);
+                continue;
+            }
+            if (key.startsWith(AnnotationInsetProvider.pendingKey)) {
+                const pending = timeslice as Pending;
+                this.pendingBlocks[pending.handle] = block;
+                columns.push(pending);
+                continue;
+            }
+            const newLines = this.renderTimeslice(timeslice as TimeSlice, depth);
             for (const [key, value] of Object.entries(newLines)) {
                 const lineno = Number(key);
                 const line = value as Line;
@@ -177,13 +299,38 @@ export class AnnotationInsetProvider implements vscode.Disposable {
                         position: line.position,
                     };
                 }
-
-                // Add a prefix.
-                const prefix = this.textToHTML('|'.repeat(depth) + ' ');
-                timesliceHTML += `<span class="line line_${lineno}"><span style="margin-left:.1em">${prefix}</span>${line.html}</span>`;
                 // Update the length.
                 lines[lineno].length += line.length;
             }
+            columns.push(newLines);
+        }
+        const prefix = this.textToHTML('|'.repeat(depth) + ' ');
+        let blockHTML = '';
+        for (const column of columns) {
+            let timesliceHTML = '';
+            if (typeof column === 'number') {
+                // Show the number of skipped iterations on every line of the block.
+                const text = `\u22ef${column}`;
+                for (const lineno of Object.keys(lines)) {
+                    timesliceHTML += `<span class="line line_${lineno}"><span style="margin-left:.1em">${prefix}</span><span title="${column} iterations skipped">${text}</span></span>`;
+                    lines[Number(lineno)].length += text.length;
+                }
+            } else if ('handle' in column) {
+                // Show the number of iterations that can be fetched on every line of the block.
+                const pending = column as Pending;
+                const text = `\u22ef${pending.count}\u2192`;
+                const handle = this.textToHTML(pending.handle);
+                const attributes = `data-window="${handle}" data-start="${pending.start}"`;
+                for (const lineno of Object.keys(lines)) {
+                    timesliceHTML += `<span class="line line_${lineno}"><span style="margin-left:.1em">${prefix}</span><span style="cursor:pointer" title="${pending.count} more iterations (click to show)" ${attributes}>${text}</span></span>`;
+                    lines[Number(lineno)].length += text.length;
+                }
+            } else {
+                for (const [lineno, line] of Object.entries(column as LineRender)) {
+                    // Add a prefix.
+                    timesliceHTML += `<span class="line line_${lineno}"><span style="margin-left:.1em">${prefix}</span>${line.html}</span>`;
+                }
+            }
             blockHTML += `<div class=block>${timesliceHTML}</div>`;
         }
         const blockId = this.nextBlockId++;
@@ -223,6 +370,10 @@ export class AnnotationInsetProvider implements vscode.Disposable {
                     // Add a tooltip if there is hover text.
                     hoverHTML = ` title="${this.textToHTML(annotationPart.hover)}"`;
                 }
+                if (annotationPart.handle) {
+                    // Fetch the full tooltip when hovering.
+                    hoverHTML += ` data-handle="${this.textToHTML(annotationPart.handle)}"`;
+                }
                 annotationHTML += `<span${hoverHTML}>${this.textToHTML(annotationPart.text)}</span>`;
                 length += annotationPart.text.length;
             }